@@ -0,0 +1,204 @@
+import hashlib
+import json
+from bson.objectid import ObjectId
+from flask import Blueprint, Response, current_app, request, url_for
+import database
+import reports
+import services
+from documents import parcel_form_data, course_form_data, form_version, document_version
+from export import json_default
+from filters import (COURIER_FILTER_FIELDS, COURIER_LIST_PROJECTION, build_courier_query,
+                     COURSE_FILTER_FIELDS, COURSE_LIST_PROJECTION, build_course_query, get_filter_values)
+from importer import normalize_row
+from pagination import paginate, get_per_page
+from tracking import normalize_tracking_number
+from validation import validate_courier_data, validate_course_data
+
+# orjson (если установлен) сериализует ответы в несколько раз быстрее json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# Ресурсы API: коллекция, уникальное поле для поиска, фильтры списка и запись через services.py
+RESOURCES = {
+    'parcels': {
+        'kind': 'courier',
+        'collection': lambda: database.courier_collection,
+        'key': 'tracking_number',
+        'filter_fields': COURIER_FILTER_FIELDS,
+        'build_query': build_courier_query,
+        'projection': COURIER_LIST_PROJECTION,
+        'validate': validate_courier_data,
+        'form_data': parcel_form_data,
+        'create': services.create_parcel,
+        'update': services.update_parcel,
+        'delete': services.delete_parcel
+    },
+    'courses': {
+        'kind': 'courses',
+        'collection': lambda: database.courses_collection,
+        'key': 'course_code',
+        'filter_fields': COURSE_FILTER_FIELDS,
+        'build_query': build_course_query,
+        'projection': COURSE_LIST_PROJECTION,
+        'validate': validate_course_data,
+        'form_data': course_form_data,
+        'create': services.create_course,
+        'update': services.update_course,
+        'delete': services.delete_course
+    }
+}
+
+def dumps(data):
+    """JSON в байтах: ObjectId - строкой, datetime - в формате ISO 8601"""
+    if orjson is not None:
+        return orjson.dumps(data, default=json_default)
+    return json.dumps(data, default=json_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def json_response(data, status=200, headers=None):
+    """Ответ JSON. У GET-ответов есть ETag: повтор с If-None-Match получит 304 без тела"""
+    response = Response(dumps(data), status=status, headers=headers, mimetype='application/json')
+    if request.method == 'GET' and status == 200:
+        response.set_etag(hashlib.md5(response.get_data()).hexdigest())
+        response.make_conditional(request)
+    return response
+
+def json_error(message, status, **extra):
+    return json_response({'error': message, **extra}, status)
+
+def get_resource(name):
+    resource = RESOURCES.get(name)
+    if resource is None:
+        return None, json_error('Неизвестный ресурс', 404)
+    return resource, None
+
+def find_document(resource, key):
+    """Документ по ObjectId или по трек-номеру/коду курса"""
+    if ObjectId.is_valid(key):
+        return resource['collection']().find_one({'_id': ObjectId(key)})
+    return resource['collection']().find_one({resource['key']: key.strip().upper()})
+
+def get_form():
+    """Тело запроса (JSON-объект с полями формы) в виде данных формы или None"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return None
+    return normalize_row(data)
+
+def invalidate(resource, document):
+    """Сброс кэша отчетов и кэша отслеживания после записи"""
+    current_app.extensions['report_cache'].invalidate(resource['kind'])
+    if resource['kind'] == 'courier':
+        current_app.extensions['tracking_cache'].invalidate(document.get('tracking_number'))
+
+@api.route('/<resource_name>')
+def list_documents(resource_name):
+    resource, error = get_resource(resource_name)
+    if error:
+        return error
+    filters = get_filter_values(request.args, resource['filter_fields'])
+    page = paginate(resource['collection'](),
+                    resource['build_query'](filters),
+                    projection=resource['projection'],
+                    after=request.args.get('after'),
+                    before=request.args.get('before'),
+                    per_page=get_per_page(request.args.get('per_page')))
+    return json_response(page)
+
+@api.route('/<resource_name>/<key>')
+def get_document(resource_name, key):
+    resource, error = get_resource(resource_name)
+    if error:
+        return error
+    document = find_document(resource, key)
+    if document is None:
+        return json_error('Документ не найден', 404)
+    return json_response(document)
+
+@api.route('/<resource_name>', methods=['POST'])
+def create_document(resource_name):
+    resource, error = get_resource(resource_name)
+    if error:
+        return error
+    form = get_form()
+    if form is None:
+        return json_error('Тело запроса должно быть JSON-объектом', 400)
+    validation_result = resource['validate'](form)
+    if not validation_result['valid']:
+        return json_response({'errors': validation_result['errors']}, 422)
+    try:
+        document = resource['create'](resource['collection'](), form)
+    except KeyError as e:
+        return json_response({'errors': [f'Не заполнено поле {e.args[0]}']}, 422)
+    invalidate(resource, document)
+    location = url_for('api.get_document', resource_name=resource_name, key=str(document['_id']))
+    return json_response(document, 201, headers={'Location': location})
+
+# PUT - все поля формы, PATCH - только изменяемые (остальные берутся из документа).
+# Поле version защищает от перезаписи чужих изменений (409, если документ уже изменен),
+# ошибки проверки полей - 422.
+@api.route('/<resource_name>/<key>', methods=['PUT', 'PATCH'])
+def update_document(resource_name, key):
+    resource, error = get_resource(resource_name)
+    if error:
+        return error
+    document = find_document(resource, key)
+    if document is None:
+        return json_error('Документ не найден', 404)
+    form = get_form()
+    if form is None:
+        return json_error('Тело запроса должно быть JSON-объектом', 400)
+    if request.method == 'PATCH':
+        form = {**normalize_row(resource['form_data'](document)), **form}
+
+    validation_result = resource['validate'](form)
+    if not validation_result['valid']:
+        return json_response({'errors': validation_result['errors']}, 422)
+    try:
+        changes = resource['update'](resource['collection'](), document, form, form_version(form, document))
+    except KeyError as e:
+        return json_response({'errors': [f'Не заполнено поле {e.args[0]}']}, 422)
+    if changes is None:
+        current = resource['collection']().find_one({'_id': document['_id']}, {'version': 1})
+        return json_error('Документ изменен другим пользователем', 409, version=document_version(current))
+    if changes:
+        invalidate(resource, document)
+        document = resource['collection']().find_one({'_id': document['_id']})
+    return json_response(document)
+
+@api.route('/<resource_name>/<key>', methods=['DELETE'])
+def delete_document(resource_name, key):
+    resource, error = get_resource(resource_name)
+    if error:
+        return error
+    document = find_document(resource, key)
+    if document is None or resource['delete'](resource['collection'](), document['_id']) is None:
+        return json_error('Документ не найден', 404)
+    invalidate(resource, document)
+    return Response(status=204)
+
+# Состояние посылки по трек-номеру (данные те же, что на странице /track/<tracking_number>)
+@api.route('/track/<tracking_number>')
+def track_parcel(tracking_number):
+    normalized = normalize_tracking_number(tracking_number)
+    parcel = current_app.extensions['tracking_cache'].get(database.courier_collection, normalized) if normalized else None
+    if parcel is None:
+        return json_error('Посылка не найдена', 404)
+    return json_response(parcel)
+
+def report_collections():
+    return {'courier': database.courier_collection, 'courses': database.courses_collection}
+
+@api.route('/reports')
+def all_reports():
+    return json_response(services.all_reports(current_app.extensions['report_cache'], report_collections()))
+
+@api.route('/reports/<report_type>/<report_name>')
+def single_report(report_type, report_name):
+    if (report_type, report_name) not in reports.REPORTS:
+        return json_error('Неизвестный отчет', 404)
+    return json_response(services.single_report(current_app.extensions['report_cache'], report_collections(),
+                                                report_type, report_name))
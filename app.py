@@ -1,26 +1,173 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, send_file
-from pymongo import MongoClient
+from flask import (Flask, render_template, request, redirect, url_for, flash, send_file,
+                   Response, stream_with_context, abort, jsonify)
 from datetime import datetime, date, timedelta
 import os
 from bson.objectid import ObjectId
 import reports
+import stats
+import indexes
+import services
+import metrics
+import database
+from api import api
+from filters import (COURIER_STATUSES, COURIER_FILTER_FIELDS, COURIER_LIST_PROJECTION, build_courier_query,
+                     COURSE_STATUSES, COURSE_CATEGORIES, COURSE_FILTER_FIELDS, COURSE_LIST_PROJECTION,
+                     build_course_query, get_filter_values)
+from pagination import paginate, get_per_page
+from database import (MONGO_URI, MONGO_DB, CLIENT_OPTIONS, SECONDARY, db, courier_collection, courses_collection,
+                      parse_read_routes)
+from documents import (backfill_name_keys, parcel_name_keys, course_name_keys, parcel_form_data, course_form_data,
+                       form_version, document_version)
 from validation import validate_courier_data, validate_course_data
-from export import export_to_pdf, export_to_docx
+from export import export_to_pdf, export_to_docx, iter_csv, iter_ndjson, get_batch_size, DUMP_COLUMNS
+from cache import ReportCache, ArtifactCache, create_backend
+from jobs import JobQueue, DONE
+from importer import import_rows, read_rows, detect_format, IMPORT_BATCH_SIZE
+from sequences import set_block_size, SEQUENCE_BLOCK_SIZE
+from tracking import TrackingCache, normalize_tracking_number
+from slow_queries import slow_query_log
+from status_updates import update_statuses, summarize, MAX_BULK_ITEMS, UPDATED
 import re
 import io
-import random
-import string
+import csv
+import hashlib
+import click
+import threading
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here-change-in-production'
 
-# Подключение к MongoDB
-client = MongoClient('mongodb://localhost:27017/')
-db = client['documents_db']
+# Подключение к MongoDB и коллекции (database.py). Клиент создается в каждом процессе
+# при первом обращении к базе (после fork - заново), поэтому app можно загружать
+# до запуска воркеров (gunicorn --preload).
+app.config['MONGO_URI'] = MONGO_URI
+app.config['MONGO_DB'] = MONGO_DB
+# Пул и таймауты (MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_WAIT_QUEUE_TIMEOUT_MS,
+# MONGO_READ_PREFERENCE, MONGO_COMPRESSORS=zstd,snappy,zlib и т.д., см. CLIENT_OPTIONS).
+# maxPoolSize ограничивает соединения одного процесса: потоки воркера плюс потоки отчетов
+for key in CLIENT_OPTIONS:
+    app.config[key] = os.environ.get(key)
+# Чтение с вторичных узлов реплики (MONGO_SECONDARY_READS=1): списки, отчеты и экспорт читают
+# с secondaryPreferred с отставанием не больше MONGO_MAX_STALENESS_SECONDS (не меньше 90),
+# остальные маршруты - с основного узла, в том числе просмотр и редактирование документа.
+# MONGO_READ_ROUTES=endpoint=primary|secondary,... меняет режим отдельных маршрутов
+app.config['MONGO_SECONDARY_READS'] = os.environ.get('MONGO_SECONDARY_READS', '0') == '1'
+app.config['MONGO_MAX_STALENESS_SECONDS'] = int(os.environ.get('MONGO_MAX_STALENESS_SECONDS', 90))
+app.config['MONGO_READ_ROUTES'] = {
+    **{endpoint: SECONDARY for endpoint in ('courier_list', 'courses_list', 'show_reports', 'export_pdf', 'export_docx',
+                                            'export_csv', 'export_ndjson', 'api.list_documents', 'api.all_reports',
+                                            'api.single_report', 'create_export_job')},
+    **parse_read_routes(os.environ.get('MONGO_READ_ROUTES'))
+}
+database.init_app(app)
 
-# Коллекции
-courier_collection = db['courier_deliveries']
-courses_collection = db['qualification_courses']
+# Кэш отчетов (REPORT_CACHE_REDIS_URL - общий кэш для нескольких процессов)
+app.config['REPORT_CACHE_TTL'] = int(os.environ.get('REPORT_CACHE_TTL', 60))
+app.config['REPORT_CACHE_SIZE'] = int(os.environ.get('REPORT_CACHE_SIZE', 256))
+app.config['REPORT_CACHE_REDIS_URL'] = os.environ.get('REPORT_CACHE_REDIS_URL')
+
+report_cache = ReportCache(create_backend(app.config['REPORT_CACHE_REDIS_URL'],
+                                          max_size=app.config['REPORT_CACHE_SIZE']),
+                           ttl=app.config['REPORT_CACHE_TTL'])
+app.extensions['report_cache'] = report_cache
+
+# Кэш отслеживания посылок по трек-номеру (в памяти каждого процесса)
+app.config['TRACKING_CACHE_SIZE'] = int(os.environ.get('TRACKING_CACHE_SIZE', 1024))
+app.config['TRACKING_CACHE_TTL'] = int(os.environ.get('TRACKING_CACHE_TTL', 30))
+
+tracking_cache = TrackingCache(max_size=app.config['TRACKING_CACHE_SIZE'], ttl=app.config['TRACKING_CACHE_TTL'])
+app.extensions['tracking_cache'] = tracking_cache
+
+# JSON API (/api/v1) с теми же проверками и записью, что и HTML-страницы
+app.register_blueprint(api)
+
+# Метрики Prometheus (/metrics): время запросов, команд MongoDB, шаблонов и экспорта.
+# METRICS_SERVER_TIMING=1 - заголовок Server-Timing во всех ответах (иначе по X-Server-Timing: 1)
+app.config['METRICS_SERVER_TIMING'] = os.environ.get('METRICS_SERVER_TIMING', '0') == '1'
+metrics.init_app(app)
+
+# Медленные запросы: команды дольше SLOW_QUERY_MS мс получают explain('executionStats'),
+# сводка по формам запросов - /metrics/slow-queries (SLOW_QUERY_STORE=1 - еще и в коллекции slow_queries).
+# SLOW_QUERY_MS=0 - режим выключен
+app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 0))
+app.config['SLOW_QUERY_STORE'] = os.environ.get('SLOW_QUERY_STORE', '0') == '1'
+slow_query_log.configure(db, app.config['SLOW_QUERY_MS'], store=app.config['SLOW_QUERY_STORE'])
+
+@app.route('/metrics/slow-queries')
+def slow_queries():
+    return jsonify({'threshold_ms': slow_query_log.threshold_ms, 'queries': slow_query_log.summaries()})
+
+EXPORT_MIMETYPES = {
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+}
+
+# Кэш готовых файлов PDF/DOCX (EXPORT_CACHE_DIR - хранить файлы на диске).
+# Ключ файла содержит версию данных коллекции, поэтому каталог требует версий, общих для всех
+# процессов и перезапусков (REPORT_CACHE_REDIS_URL): счетчики в памяти у каждого процесса свои
+# и после перезапуска начинаются с 0 - файл старой версии совпал бы с ключом новых данных
+app.config['EXPORT_CACHE_MAX_BYTES'] = int(os.environ.get('EXPORT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+app.config['EXPORT_CACHE_TTL'] = int(os.environ.get('EXPORT_CACHE_TTL', 300))
+app.config['EXPORT_CACHE_DIR'] = os.environ.get('EXPORT_CACHE_DIR')
+
+if app.config['EXPORT_CACHE_DIR'] and not report_cache.backend.shared:
+    raise RuntimeError('Для EXPORT_CACHE_DIR нужен общий кэш отчетов: задайте REPORT_CACHE_REDIS_URL')
+
+export_cache = ArtifactCache(max_bytes=app.config['EXPORT_CACHE_MAX_BYTES'],
+                             ttl=app.config['EXPORT_CACHE_TTL'],
+                             directory=app.config['EXPORT_CACHE_DIR'])
+
+# Фоновый экспорт отчетов целиком (до EXPORT_JOBS_MAX_ROWS строк) в отдельных процессах
+app.config['EXPORT_JOBS_DB'] = os.environ.get('EXPORT_JOBS_DB', os.path.join(app.instance_path, 'export_jobs.sqlite3'))
+app.config['EXPORT_JOBS_DIR'] = os.environ.get('EXPORT_JOBS_DIR', os.path.join(app.instance_path, 'export_jobs'))
+app.config['EXPORT_JOBS_WORKERS'] = int(os.environ.get('EXPORT_JOBS_WORKERS', 2))
+app.config['EXPORT_JOBS_TIMEOUT'] = int(os.environ.get('EXPORT_JOBS_TIMEOUT', 300))
+app.config['EXPORT_JOBS_ATTEMPTS'] = int(os.environ.get('EXPORT_JOBS_ATTEMPTS', 3))
+app.config['EXPORT_JOBS_TTL'] = int(os.environ.get('EXPORT_JOBS_TTL', 3600))
+app.config['EXPORT_JOBS_MAX_ROWS'] = int(os.environ.get('EXPORT_JOBS_MAX_ROWS', 100000))
+# DOCX, в отличие от PDF, собирается в памяти целиком, поэтому его предел меньше
+app.config['EXPORT_JOBS_DOCX_MAX_ROWS'] = int(os.environ.get('EXPORT_JOBS_DOCX_MAX_ROWS', 10000))
+
+def export_job_client_options():
+    """Параметры клиента процесса фонового экспорта (чтение - как у маршрутов экспорта)"""
+    if app.config['MONGO_SECONDARY_READS'] and app.config['MONGO_READ_ROUTES'].get('create_export_job') == SECONDARY:
+        return {'readPreference': 'secondaryPreferred',
+                'maxStalenessSeconds': database.connection.max_staleness_seconds}
+    return {}
+
+# Адрес MongoDB передается процессу экспорта при запуске и не хранится в базе очереди
+os.makedirs(app.instance_path, exist_ok=True)
+export_jobs = JobQueue(app.config['EXPORT_JOBS_DB'], app.config['EXPORT_JOBS_DIR'],
+                       max_workers=app.config['EXPORT_JOBS_WORKERS'],
+                       timeout=app.config['EXPORT_JOBS_TIMEOUT'],
+                       max_attempts=app.config['EXPORT_JOBS_ATTEMPTS'],
+                       result_ttl=app.config['EXPORT_JOBS_TTL'],
+                       worker_params={'mongo_uri': app.config['MONGO_URI'],
+                                      'client_options': export_job_client_options()})
+
+# Трек-номера и коды курсов выдаются из счетчиков блоками по SEQUENCE_BLOCK_SIZE номеров
+app.config['SEQUENCE_BLOCK_SIZE'] = int(os.environ.get('SEQUENCE_BLOCK_SIZE', SEQUENCE_BLOCK_SIZE))
+set_block_size(app.config['SEQUENCE_BLOCK_SIZE'])
+
+# Размер пакета записи при массовом импорте
+app.config['IMPORT_BATCH_SIZE'] = int(os.environ.get('IMPORT_BATCH_SIZE', IMPORT_BATCH_SIZE))
+
+# Индексы создаются при первом запросе каждого процесса (а не только при запуске app.py),
+# чтобы они появлялись и под gunicorn/uwsgi. Повторное создание безопасно.
+app.config['MONGO_AUTO_INDEXES'] = os.environ.get('MONGO_AUTO_INDEXES', '1') == '1'
+indexes_checked = False
+indexes_lock = threading.Lock()
+
+@app.before_request
+def ensure_indexes_once():
+    global indexes_checked
+    if indexes_checked or not app.config['MONGO_AUTO_INDEXES']:
+        return
+    with indexes_lock:
+        if not indexes_checked:
+            for error in indexes.ensure_indexes(db):
+                app.logger.warning('Ошибка создания индекса: %s', error)
+            indexes_checked = True
 
 # Контекстный процессор для передачи данных во все шаблоны
 @app.context_processor
@@ -37,8 +184,17 @@ def index():
 # Список всех посылок
 @app.route('/courier')
 def courier_list():
-    parcels = list(courier_collection.find().sort('created_at', -1))
-    return render_template('courier_list.html', parcels=parcels)
+    filters = get_filter_values(request.args, COURIER_FILTER_FIELDS)
+    query = build_courier_query(filters)
+    page = paginate(courier_collection,
+                    query,
+                    projection=COURIER_LIST_PROJECTION,
+                    after=request.args.get('after'),
+                    before=request.args.get('before'),
+                    per_page=get_per_page(request.args.get('per_page')))
+    summary = reports.courier_summary(courier_collection, query)
+    return render_template('courier_list.html', parcels=page['items'], page=page, filters=filters,
+                           summary=summary, statuses=COURIER_STATUSES)
 
 # Добавление новой посылки
 @app.route('/courier/add', methods=['GET', 'POST'])
@@ -55,57 +211,8 @@ def add_courier():
                                  action='Добавить',
                                  errors=validation_result['errors'])
         
-        # Подготовка данных
-        parcel = {
-            'sender': {
-                'full_name': request.form['sender_name'].strip(),
-                'address': request.form['sender_address'].strip(),
-                'passport': {
-                    'series': request.form['sender_passport_series'].strip(),
-                    'number': request.form['sender_passport_number'].strip(),
-                    'birth_date': request.form['sender_birth_date'],
-                    'gender': request.form['sender_gender']
-                }
-            },
-            'receiver': {
-                'full_name': request.form['receiver_name'].strip(),
-                'address': request.form['receiver_address'].strip(),
-                'passport': {
-                    'series': request.form['receiver_passport_series'].strip(),
-                    'number': request.form['receiver_passport_number'].strip(),
-                    'birth_date': request.form['receiver_birth_date'],
-                    'gender': request.form['receiver_gender']
-                }
-            },
-            'parcel': {
-                'weight': float(request.form['weight']),
-                'dimensions': {
-                    'length': float(request.form['length']),
-                    'width': float(request.form['width']),
-                    'height': float(request.form['height'])
-                },
-                'description': request.form.get('description', '').strip(),
-                'fragile': request.form.get('fragile') == 'on',
-                'insured': request.form.get('insured') == 'on'
-            },
-            'courier': {
-                'name': request.form['courier_name'].strip(),
-                'phone': request.form['courier_phone'].strip(),
-                'vehicle': request.form.get('courier_vehicle', '').strip(),
-                'company': request.form.get('courier_company', '').strip()
-            },
-            'dates': {
-                'dispatch_date': request.form['dispatch_date'],
-                'delivery_date': request.form['delivery_date'],
-                'actual_delivery_date': None
-            },
-            'status': request.form['status'],
-            'created_at': datetime.now(),
-            'tracking_number': generate_tracking_number(),
-            'delivery_cost': float(request.form.get('delivery_cost', 0))
-        }
-        
-        courier_collection.insert_one(parcel)
+        parcel = services.create_parcel(courier_collection, request.form)
+        report_cache.invalidate('courier')
         flash('Посылка успешно добавлена! Трек номер: ' + parcel['tracking_number'], 'success')
         return redirect(url_for('courier_list'))
     
@@ -117,6 +224,10 @@ def edit_courier(id):
     parcel = courier_collection.find_one({'_id': ObjectId(id)})
     
     if request.method == 'POST':
+        if not parcel:
+            flash('Посылка не найдена!', 'danger')
+            return redirect(url_for('courier_list'))
+        
         # Валидация данных
         validation_result = validate_courier_data(request.form)
         
@@ -128,94 +239,26 @@ def edit_courier(id):
                                  action='Редактировать',
                                  errors=validation_result['errors'])
         
-        update_data = {
-            'sender': {
-                'full_name': request.form['sender_name'].strip(),
-                'address': request.form['sender_address'].strip(),
-                'passport': {
-                    'series': request.form['sender_passport_series'].strip(),
-                    'number': request.form['sender_passport_number'].strip(),
-                    'birth_date': request.form['sender_birth_date'],
-                    'gender': request.form['sender_gender']
-                }
-            },
-            'receiver': {
-                'full_name': request.form['receiver_name'].strip(),
-                'address': request.form['receiver_address'].strip(),
-                'passport': {
-                    'series': request.form['receiver_passport_series'].strip(),
-                    'number': request.form['receiver_passport_number'].strip(),
-                    'birth_date': request.form['receiver_birth_date'],
-                    'gender': request.form['receiver_gender']
-                }
-            },
-            'parcel': {
-                'weight': float(request.form['weight']),
-                'dimensions': {
-                    'length': float(request.form['length']),
-                    'width': float(request.form['width']),
-                    'height': float(request.form['height'])
-                },
-                'description': request.form.get('description', '').strip(),
-                'fragile': request.form.get('fragile') == 'on',
-                'insured': request.form.get('insured') == 'on'
-            },
-            'courier': {
-                'name': request.form['courier_name'].strip(),
-                'phone': request.form['courier_phone'].strip(),
-                'vehicle': request.form.get('courier_vehicle', '').strip(),
-                'company': request.form.get('courier_company', '').strip()
-            },
-            'dates': {
-                'dispatch_date': request.form['dispatch_date'],
-                'delivery_date': request.form['delivery_date'],
-                'actual_delivery_date': parcel.get('dates', {}).get('actual_delivery_date')
-            },
-            'status': request.form['status'],
-            'updated_at': datetime.now(),
-            'delivery_cost': float(request.form.get('delivery_cost', 0))
-        }
+        # Записываются только измененные поля и только если посылку не изменили с момента открытия формы
+        changes = services.update_parcel(courier_collection, parcel, request.form, form_version(request.form, parcel))
+        if changes is None:
+            flash('Посылка была изменена другим пользователем. Проверьте данные и сохраните еще раз.', 'danger')
+            current = courier_collection.find_one({'_id': ObjectId(id)}, {'version': 1})
+            return render_template('courier_form.html',
+                                 parcel={**request.form, '_id': id, 'version': document_version(current)},
+                                 action='Редактировать')
+        if not changes:
+            flash('Изменений нет', 'info')
+            return redirect(url_for('courier_list'))
         
-        # Если статус изменился на "Доставлено", устанавливаем фактическую дату доставки
-        if request.form['status'] == 'Доставлено' and parcel.get('status') != 'Доставлено':
-            update_data['dates']['actual_delivery_date'] = datetime.now().strftime('%Y-%m-%d')
-        
-        courier_collection.update_one({'_id': ObjectId(id)}, {'$set': update_data})
+        report_cache.invalidate('courier')
+        tracking_cache.invalidate(parcel['tracking_number'])
         flash('Посылка успешно обновлена!', 'success')
         return redirect(url_for('courier_list'))
     
     # Преобразуем данные для отображения в форме
     if parcel:
-        form_data = {
-            '_id': str(parcel['_id']),
-            'sender_name': parcel['sender']['full_name'],
-            'sender_address': parcel['sender']['address'],
-            'sender_passport_series': parcel['sender']['passport']['series'],
-            'sender_passport_number': parcel['sender']['passport']['number'],
-            'sender_birth_date': parcel['sender']['passport']['birth_date'],
-            'sender_gender': parcel['sender']['passport']['gender'],
-            'receiver_name': parcel['receiver']['full_name'],
-            'receiver_address': parcel['receiver']['address'],
-            'receiver_passport_series': parcel['receiver']['passport']['series'],
-            'receiver_passport_number': parcel['receiver']['passport']['number'],
-            'receiver_birth_date': parcel['receiver']['passport']['birth_date'],
-            'receiver_gender': parcel['receiver']['passport']['gender'],
-            'weight': parcel['parcel']['weight'],
-            'length': parcel['parcel']['dimensions']['length'],
-            'width': parcel['parcel']['dimensions']['width'],
-            'height': parcel['parcel']['dimensions']['height'],
-            'description': parcel['parcel'].get('description', ''),
-            'fragile': parcel['parcel'].get('fragile', False),
-            'insured': parcel['parcel'].get('insured', False),
-            'courier_name': parcel['courier']['name'],
-            'courier_phone': parcel['courier']['phone'],
-            'courier_vehicle': parcel['courier'].get('vehicle', ''),
-            'courier_company': parcel['courier'].get('company', ''),
-            'dispatch_date': parcel['dates']['dispatch_date'],
-            'delivery_date': parcel['dates']['delivery_date'],
-            'delivery_cost': parcel.get('delivery_cost', 0),
-            'status': parcel['status']
-        }
+        form_data = parcel_form_data(parcel)
         return render_template('courier_form.html', parcel=form_data, action='Редактировать')
     
     return render_template('courier_form.html', parcel=parcel, action='Редактировать')
@@ -223,7 +266,10 @@ def edit_courier(id):
 # Удаление посылки
 @app.route('/courier/delete/<id>')
 def delete_courier(id):
-    courier_collection.delete_one({'_id': ObjectId(id)})
+    deleted = services.delete_parcel(courier_collection, ObjectId(id))
+    report_cache.invalidate('courier')
+    if deleted:
+        tracking_cache.invalidate(deleted['tracking_number'])
     flash('Посылка успешно удалена!', 'success')
     return redirect(url_for('courier_list'))
 
@@ -236,13 +282,61 @@ def view_courier(id):
         return redirect(url_for('courier_list'))
     return render_template('courier_view.html', parcel=parcel)
 
+# Массовая смена статуса посылок.
+# Тело запроса - JSON {"items": [трек-номера или id], "status": "..."}, ответ - результат по каждой посылке.
+@app.route('/courier/status', methods=['POST'])
+def update_courier_statuses():
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
+    status = data.get('status')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'Не передан список посылок (items)'}), 400
+    if len(items) > MAX_BULK_ITEMS:
+        return jsonify({'error': f'Не больше {MAX_BULK_ITEMS} посылок в одном запросе'}), 400
+    if status not in COURIER_STATUSES:
+        return jsonify({'error': 'Неизвестный статус', 'statuses': COURIER_STATUSES}), 400
+
+    results = update_statuses(courier_collection, items, status)
+    summary = summarize(results)
+    if summary.get(UPDATED):
+        report_cache.invalidate('courier')
+        tracking_cache.invalidate(*[result['tracking_number'] for result in results if result['result'] == UPDATED])
+    return jsonify({'status': status, 'summary': summary, 'results': results})
+
+# Отслеживание посылки по трек-номеру (страница без паспортных данных и адресов).
+# JSON с теми же данными - /api/v1/track/<tracking_number>.
+@app.route('/track')
+@app.route('/track/<tracking_number>')
+def track_parcel(tracking_number=None):
+    if tracking_number is None:
+        tracking_number = request.args.get('tracking_number')
+        if tracking_number:
+            return redirect(url_for('track_parcel', tracking_number=tracking_number.strip().upper()))
+        return render_template('track.html', tracking_number=None, parcel=None)
+
+    normalized = normalize_tracking_number(tracking_number)
+    parcel = tracking_cache.get(courier_collection, normalized) if normalized else None
+    if parcel is None:
+        return render_template('track.html', tracking_number=tracking_number, parcel=None), 404
+    return render_template('track.html', tracking_number=normalized, parcel=parcel)
+
 # ========== ПОВЫШЕНИЕ КВАЛИФИКАЦИИ ==========
 
 # Список всех курсов
 @app.route('/courses')
 def courses_list():
-    courses = list(courses_collection.find().sort('created_at', -1))
-    return render_template('courses_list.html', courses=courses)
+    filters = get_filter_values(request.args, COURSE_FILTER_FIELDS)
+    query = build_course_query(filters)
+    page = paginate(courses_collection,
+                    query,
+                    projection=COURSE_LIST_PROJECTION,
+                    after=request.args.get('after'),
+                    before=request.args.get('before'),
+                    per_page=get_per_page(request.args.get('per_page')))
+    summary = reports.courses_summary(courses_collection, query)
+    return render_template('courses_list.html', courses=page['items'], page=page,
+                           filters=filters, summary=summary, statuses=COURSE_STATUSES,
+                           categories=COURSE_CATEGORIES)
 
 # Добавление нового курса
 @app.route('/courses/add', methods=['GET', 'POST'])
@@ -259,49 +353,8 @@ def add_course():
                                  action='Добавить',
                                  errors=validation_result['errors'])
         
-        # Получаем до 3 сотрудников
-        employees = []
-        for i in range(1, 4):
-            emp_name = request.form.get(f'employee_{i}_name', '').strip()
-            emp_position = request.form.get(f'employee_{i}_position', '').strip()
-            emp_department = request.form.get(f'employee_{i}_department', '').strip()
-            emp_email = request.form.get(f'employee_{i}_email', '').strip()
-            if emp_name and emp_position:
-                employees.append({
-                    'name': emp_name,
-                    'position': emp_position,
-                    'department': emp_department,
-                    'email': emp_email
-                })
-        
-        course = {
-            'course_name': request.form['course_name'].strip(),
-            'course_code': generate_course_code(),
-            'teacher': {
-                'name': request.form['teacher_name'].strip(),
-                'department': request.form['teacher_department'].strip(),
-                'qualification': request.form.get('teacher_qualification', '').strip(),
-                'email': request.form.get('teacher_email', '').strip(),
-                'phone': request.form.get('teacher_phone', '').strip()
-            },
-            'dates': {
-                'start_date': request.form['start_date'],
-                'end_date': request.form['end_date'],
-                'registration_deadline': request.form.get('registration_deadline', '')
-            },
-            'hours': int(request.form['hours']),
-            'price': float(request.form.get('price', 0)),
-            'location': request.form.get('location', '').strip(),
-            'max_participants': int(request.form.get('max_participants', 30)),
-            'current_participants': 0,
-            'employees': employees,
-            'status': request.form['status'],
-            'description': request.form.get('description', '').strip(),
-            'created_at': datetime.now(),
-            'category': request.form.get('category', 'Общий').strip()
-        }
-        
-        courses_collection.insert_one(course)
+        course = services.create_course(courses_collection, request.form)
+        report_cache.invalidate('courses')
         flash('Курс успешно добавлен! Код курса: ' + course['course_code'], 'success')
         return redirect(url_for('courses_list'))
     
@@ -313,6 +366,10 @@ def edit_course(id):
     course = courses_collection.find_one({'_id': ObjectId(id)})
     
     if request.method == 'POST':
+        if not course:
+            flash('Курс не найден!', 'danger')
+            return redirect(url_for('courses_list'))
+        
         # Валидация данных
         validation_result = validate_course_data(request.form)
         
@@ -324,78 +381,24 @@ def edit_course(id):
                                  action='Редактировать',
                                  errors=validation_result['errors'])
         
-        employees = []
-        for i in range(1, 4):
-            emp_name = request.form.get(f'employee_{i}_name', '').strip()
-            emp_position = request.form.get(f'employee_{i}_position', '').strip()
-            emp_department = request.form.get(f'employee_{i}_department', '').strip()
-            emp_email = request.form.get(f'employee_{i}_email', '').strip()
-            if emp_name and emp_position:
-                employees.append({
-                    'name': emp_name,
-                    'position': emp_position,
-                    'department': emp_department,
-                    'email': emp_email
-                })
+        changes = services.update_course(courses_collection, course, request.form, form_version(request.form, course))
+        if changes is None:
+            flash('Курс был изменен другим пользователем. Проверьте данные и сохраните еще раз.', 'danger')
+            current = courses_collection.find_one({'_id': ObjectId(id)}, {'version': 1})
+            return render_template('courses_form.html',
+                                 course={**request.form, '_id': id, 'version': document_version(current)},
+                                 action='Редактировать')
+        if not changes:
+            flash('Изменений нет', 'info')
+            return redirect(url_for('courses_list'))
         
-        update_data = {
-            'course_name': request.form['course_name'].strip(),
-            'teacher': {
-                'name': request.form['teacher_name'].strip(),
-                'department': request.form['teacher_department'].strip(),
-                'qualification': request.form.get('teacher_qualification', '').strip(),
-                'email': request.form.get('teacher_email', '').strip(),
-                'phone': request.form.get('teacher_phone', '').strip()
-            },
-            'dates': {
-                'start_date': request.form['start_date'],
-                'end_date': request.form['end_date'],
-                'registration_deadline': request.form.get('registration_deadline', '')
-            },
-            'hours': int(request.form['hours']),
-            'price': float(request.form.get('price', 0)),
-            'location': request.form.get('location', '').strip(),
-            'max_participants': int(request.form.get('max_participants', 30)),
-            'current_participants': course.get('current_participants', 0),
-            'employees': employees,
-            'status': request.form['status'],
-            'description': request.form.get('description', '').strip(),
-            'updated_at': datetime.now(),
-            'category': request.form.get('category', 'Общий').strip()
-        }
-        
-        courses_collection.update_one({'_id': ObjectId(id)}, {'$set': update_data})
+        report_cache.invalidate('courses')
         flash('Курс успешно обновлен!', 'success')
         return redirect(url_for('courses_list'))
     
     # Преобразуем данные для отображения в форме
     if course:
-        form_data = {
-            '_id': str(course['_id']),
-            'course_name': course['course_name'],
-            'teacher_name': course['teacher']['name'],
-            'teacher_department': course['teacher']['department'],
-            'teacher_qualification': course['teacher'].get('qualification', ''),
-            'teacher_email': course['teacher'].get('email', ''),
-            'teacher_phone': course['teacher'].get('phone', ''),
-            'start_date': course['dates']['start_date'],
-            'end_date': course['dates']['end_date'],
-            'registration_deadline': course['dates'].get('registration_deadline', ''),
-            'hours': course['hours'],
-            'price': course.get('price', 0),
-            'location': course.get('location', ''),
-            'max_participants': course.get('max_participants', 30),
-            'status': course['status'],
-            'description': course.get('description', ''),
-            'category': course.get('category', 'Общий')
-        }
-        
-        # Добавляем данные сотрудников
-        for i, emp in enumerate(course.get('employees', []), 1):
-            form_data[f'employee_{i}_name'] = emp.get('name', '')
-            form_data[f'employee_{i}_position'] = emp.get('position', '')
-            form_data[f'employee_{i}_department'] = emp.get('department', '')
-            form_data[f'employee_{i}_email'] = emp.get('email', '')
+        form_data = course_form_data(course)
         
         return render_template('courses_form.html', course=form_data, action='Редактировать')
     
@@ -404,7 +407,8 @@ def edit_course(id):
 # Удаление курса
 @app.route('/courses/delete/<id>')
 def delete_course(id):
-    courses_collection.delete_one({'_id': ObjectId(id)})
+    services.delete_course(courses_collection, ObjectId(id))
+    report_cache.invalidate('courses')
     flash('Курс успешно удален!', 'success')
     return redirect(url_for('courses_list'))
 
@@ -421,80 +425,279 @@ def view_course(id):
 
 @app.route('/reports')
 def show_reports():
-    reports_data = reports.generate_reports(courier_collection, courses_collection)
+    reports_data = services.all_reports(report_cache, {'courier': courier_collection, 'courses': courses_collection})
     return render_template('reports.html', reports=reports_data)
 
 @app.route('/export/pdf/<report_type>/<report_name>')
 def export_pdf(report_type, report_name):
-    reports_data = reports.generate_reports(courier_collection, courses_collection)
-    
-    if report_type not in ['courier', 'courses']:
+    if (report_type, report_name) not in reports.REPORTS:
         flash('Неверный тип отчета', 'danger')
         return redirect(url_for('show_reports'))
     
-    pdf_data = export_to_pdf(reports_data, report_type, report_name)
+    pdf_data = render_export('pdf', report_type, report_name, export_to_pdf)
     
     if pdf_data:
         filename = f'report_{report_type}_{report_name}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
-        return send_file(
-            io.BytesIO(pdf_data),
-            download_name=filename,
-            mimetype='application/pdf',
-            as_attachment=True
-        )
+        return send_export_file(pdf_data, filename, EXPORT_MIMETYPES['pdf'])
     else:
         flash('Ошибка при создании PDF', 'danger')
         return redirect(url_for('show_reports'))
 
 @app.route('/export/docx/<report_type>/<report_name>')
 def export_docx(report_type, report_name):
-    reports_data = reports.generate_reports(courier_collection, courses_collection)
-    
-    if report_type not in ['courier', 'courses']:
+    if (report_type, report_name) not in reports.REPORTS:
         flash('Неверный тип отчета', 'danger')
         return redirect(url_for('show_reports'))
     
-    docx_data = export_to_docx(reports_data, report_type, report_name)
+    docx_data = render_export('docx', report_type, report_name, export_to_docx)
     
     if docx_data:
         filename = f'report_{report_type}_{report_name}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.docx'
-        return send_file(
-            io.BytesIO(docx_data),
-            download_name=filename,
-            mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-            as_attachment=True
-        )
+        return send_export_file(docx_data, filename, EXPORT_MIMETYPES['docx'])
     else:
         flash('Ошибка при создании DOCX', 'danger')
         return redirect(url_for('show_reports'))
 
+# Фоновый экспорт: POST создает задачу, статус и файл доступны по ссылкам из ответа
+@app.route('/export/jobs', methods=['POST'])
+def create_export_job():
+    params = request.get_json(silent=True) or request.form
+    export_format = params.get('format', 'pdf')
+    report_type = params.get('report_type')
+    report_name = params.get('report_name')
+    if export_format not in EXPORT_MIMETYPES or (report_type, report_name) not in reports.REPORTS:
+        return jsonify({'error': 'Неверный формат или тип отчета'}), 400
+
+    max_rows = app.config['EXPORT_JOBS_DOCX_MAX_ROWS' if export_format == 'docx' else 'EXPORT_JOBS_MAX_ROWS']
+    try:
+        max_rows = min(int(params.get('max_rows') or max_rows), max_rows)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Неверное число строк'}), 400
+
+    job_id = export_jobs.submit({
+        'format': export_format,
+        'report_type': report_type,
+        'report_name': report_name,
+        'max_rows': max(1, max_rows),
+        'database': db.name
+    })
+    status_url = url_for('export_job_status', job_id=job_id)
+    return jsonify({'id': job_id, 'status': 'queued', 'status_url': status_url}), 202, {'Location': status_url}
+
+@app.route('/export/jobs/<job_id>')
+def export_job_status(job_id):
+    job = export_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Задача не найдена'}), 404
+    result = {
+        'id': job['id'],
+        'status': job['status'],
+        'attempts': job['attempts'],
+        'error': job['error'],
+        'report_type': job['params']['report_type'],
+        'report_name': job['params']['report_name'],
+        'format': job['params']['format']
+    }
+    if job['status'] == DONE:
+        result['download_url'] = url_for('download_export_job', job_id=job_id)
+    return jsonify(result)
+
+@app.route('/export/jobs/<job_id>/download')
+def download_export_job(job_id):
+    job = export_jobs.get(job_id)
+    if job is None or job['status'] != DONE:
+        abort(404)
+    params = job['params']
+    with open(export_jobs.result_path(job_id), 'rb') as f:
+        data = f.read()
+    filename = f"report_{params['report_type']}_{params['report_name']}_full.{params['format']}"
+    return send_export_file(data, filename, EXPORT_MIMETYPES[params['format']])
+
+# Полная выгрузка коллекции с фильтрами списка (для сверки данных).
+# Документы читаются из курсора пакетами по batch_size и сразу отдаются клиенту,
+# поэтому память не зависит от размера коллекции.
+@app.route('/export/csv/<collection_name>')
+def export_csv(collection_name):
+    collection, query = get_dump_source(collection_name)
+    rows = iter_csv(collection, query, DUMP_COLUMNS[collection_name],
+                    get_batch_size(request.args.get('batch_size')))
+    return stream_dump(rows, collection_name, 'csv', 'text/csv; charset=utf-8')
+
+@app.route('/export/ndjson/<collection_name>')
+def export_ndjson(collection_name):
+    collection, query = get_dump_source(collection_name)
+    rows = iter_ndjson(collection, query, get_batch_size(request.args.get('batch_size')))
+    return stream_dump(rows, collection_name, 'ndjson', 'application/x-ndjson; charset=utf-8')
+
+# ========== МАССОВЫЙ ИМПОРТ ==========
+
+# Загрузка файла CSV/NDJSON (поле file), поля строк совпадают с полями форм добавления.
+# Ответ - отчет с числом добавленных документов и ошибками по номерам строк.
+@app.route('/import/<collection_name>', methods=['POST'])
+def import_documents(collection_name):
+    collection = get_import_collection(collection_name)
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({'error': 'Не передан файл'}), 400
+    file_format = detect_format(upload.filename, request.form.get('format'))
+    if file_format is None:
+        return jsonify({'error': 'Поддерживаются файлы CSV и NDJSON'}), 400
+
+    stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+    report = import_rows(collection, collection_name, read_rows(stream, file_format),
+                         batch_size=get_batch_size(request.form.get('batch_size', app.config['IMPORT_BATCH_SIZE'])))
+    if report.inserted:
+        report_cache.invalidate(collection_name)
+    return jsonify(report.to_dict())
+
 # ========== ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ==========
 
-def generate_tracking_number():
-    """Генерация уникального трек-номера"""
-    timestamp = datetime.now().strftime('%Y%m%d')
-    random_part = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
-    return f"TRK{timestamp}{random_part}"
-
-def generate_course_code():
-    """Генерация уникального кода курса"""
-    timestamp = datetime.now().strftime('%y%m')
-    random_part = ''.join(random.choices(string.ascii_uppercase, k=3))
-    return f"COURSE{timestamp}{random_part}"
-
-# Кастомные фильтры для Jinja2
-@app.template_filter('sum_employees')
-def sum_employees_filter(courses):
-    """Суммирует количество сотрудников во всех курсах"""
-    total = 0
-    for course in courses:
-        total += len(course.get('employees', []))
-    return total
+def get_import_collection(collection_name):
+    """Коллекция для импорта (404 для неизвестной коллекции)"""
+    if collection_name == 'courier':
+        return courier_collection
+    if collection_name == 'courses':
+        return courses_collection
+    abort(404)
+
+def get_dump_source(collection_name):
+    """Коллекция и запрос по фильтрам списка для выгрузки (404 для неизвестной коллекции)"""
+    if collection_name == 'courier':
+        filters = get_filter_values(request.args, COURIER_FILTER_FIELDS)
+        return courier_collection, build_courier_query(filters)
+    if collection_name == 'courses':
+        filters = get_filter_values(request.args, COURSE_FILTER_FIELDS)
+        return courses_collection, build_course_query(filters)
+    abort(404)
+
+def stream_dump(rows, collection_name, extension, content_type):
+    """Потоковый ответ с выгрузкой"""
+    filename = f'{collection_name}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extension}'
+    return Response(stream_with_context(rows), content_type=content_type,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+def render_export(export_format, report_type, report_name, render):
+    """Готовый файл экспорта из кэша или новый рендер отчета.
+
+    Ключ кэша содержит версию данных коллекции, поэтому после любой записи
+    в коллекцию файл будет построен заново.
+    """
+    key = f'{export_format}:{report_type}:{report_name}:v{report_cache.data_version(report_type)}'
+    data = export_cache.get(key)
+    if data is None:
+        reports_data = generate_single_report(report_type, report_name)
+        with metrics.timer('export_render_duration_seconds', 'export', format=export_format,
+                           report=f'{report_type}/{report_name}'):
+            data = render(reports_data, report_type, report_name)
+        if data:
+            export_cache.put(key, data)
+    return data
+
+def send_export_file(data, filename, mimetype):
+    """Отправка файла экспорта с ETag (повторный запрос с If-None-Match получит 304)"""
+    return send_file(
+        io.BytesIO(data),
+        download_name=filename,
+        mimetype=mimetype,
+        as_attachment=True,
+        etag=hashlib.md5(data).hexdigest(),
+        conditional=True
+    )
+
+def generate_single_report(report_type, report_name):
+    """Расчет только одного отчета для экспорта (None для неизвестного отчета)"""
+    return services.single_report(report_cache, {'courier': courier_collection, 'courses': courses_collection},
+                                  report_type, report_name)
+
+# ========== КОМАНДЫ CLI ==========
+
+@app.cli.command('stats-rebuild')
+def stats_rebuild_command():
+    """Пересчет предрасчитанной статистики с нуля"""
+    counts = stats.rebuild_stats(db)
+    for name, count in counts.items():
+        click.echo(f'{name}: {count}')
+
+@app.cli.command('stats-check')
+def stats_check_command():
+    """Проверка согласованности предрасчитанной статистики"""
+    problems = stats.check_stats(db)
+    for problem in problems:
+        click.echo(problem)
+    if problems:
+        raise SystemExit(1)
+    click.echo('Статистика согласована')
+
+@app.cli.command('search-backfill')
+@click.option('--batch-size', default=1000, help='Размер пакета обновлений')
+def search_backfill_command(batch_size):
+    """Заполнение ключей поиска по ФИО у документов, созданных до их появления"""
+    parcels = backfill_name_keys(courier_collection, 'sender.name_key', parcel_name_keys, batch_size)
+    courses = backfill_name_keys(courses_collection, 'teacher.name_key', course_name_keys, batch_size)
+    click.echo(f'Посылок обновлено: {parcels}, курсов обновлено: {courses}')
+
+@app.cli.command('import')
+@click.argument('collection_name', type=click.Choice(['courier', 'courses']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'ndjson']), help='Формат (по умолчанию по расширению)')
+@click.option('--batch-size', default=IMPORT_BATCH_SIZE, help='Размер пакета записи')
+@click.option('--errors', 'errors_path', type=click.Path(dir_okay=False), help='CSV-файл для всех ошибок по строкам')
+def import_command(collection_name, path, file_format, batch_size, errors_path):
+    """Массовый импорт посылок или курсов из CSV/NDJSON"""
+    file_format = detect_format(path, file_format)
+    if file_format is None:
+        raise click.BadParameter('Поддерживаются файлы CSV и NDJSON', param_hint='path')
+    collection = courier_collection if collection_name == 'courier' else courses_collection
+
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        report = import_rows(collection, collection_name, read_rows(f, file_format),
+                             batch_size=batch_size, max_errors=None if errors_path else 20)
+    if report.inserted:
+        report_cache.invalidate(collection_name)
+        if not report_cache.backend.shared:
+            click.echo('Внимание: кэш отчетов хранится в памяти каждого процесса, работающий сервер '
+                       f"покажет новые данные в отчетах через {app.config['REPORT_CACHE_TTL']} с "
+                       '(общий сброс кэша - REPORT_CACHE_REDIS_URL)')
+
+    if errors_path:
+        with open(errors_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['row', 'errors'])
+            for error in report.errors:
+                writer.writerow([error['row'], '; '.join(error['errors'])])
+    else:
+        for error in report.errors:
+            click.echo(f"Строка {error['row']}: {'; '.join(error['errors'])}")
+
+    result = report.to_dict()
+    click.echo(f"Строк: {result['total']}, добавлено: {result['inserted']}, ошибок: {result['error_count']}, "
+               f"время: {result['seconds']} с, строк/с: {result['rows_per_sec']}")
+
+@app.cli.command('indexes-ensure')
+def indexes_ensure_command():
+    """Создание индексов из реестра indexes.py"""
+    errors = indexes.ensure_indexes(db)
+    for error in errors:
+        click.echo(error)
+    if errors:
+        raise SystemExit(1)
+    click.echo('Индексы созданы')
+
+@app.cli.command('indexes-check')
+def indexes_check_command():
+    """Отчет об отсутствующих, лишних и неиспользуемых индексах"""
+    for collection_name, result in indexes.check_indexes(db).items():
+        click.echo(collection_name)
+        click.echo(f"  отсутствуют: {', '.join(result['missing']) or '-'}")
+        click.echo(f"  вне реестра: {', '.join(result['extra']) or '-'}")
+        click.echo(f"  не используются: {', '.join(result['unused']) or '-'}")
 
 # ========== ОШИБКИ ==========
 
 @app.errorhandler(404)
 def page_not_found(e):
+    if request.path.startswith(api.url_prefix + '/'):
+        return jsonify({'error': 'Не найдено'}), 404
     return render_template('404.html'), 404
 
 @app.errorhandler(500)
@@ -502,13 +705,4 @@ def internal_server_error(e):
     return render_template('500.html'), 500
 
 if __name__ == '__main__':
-    # Создаем индексы для ускорения поиска
-    courier_collection.create_index([('tracking_number', 1)], unique=True)
-    courier_collection.create_index([('status', 1)])
-    courier_collection.create_index([('dates.dispatch_date', -1)])
-    
-    courses_collection.create_index([('course_code', 1)], unique=True)
-    courses_collection.create_index([('status', 1)])
-    courses_collection.create_index([('dates.start_date', -1)])
-    
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,60 @@
+"""Процессорное время одного экспорта отчета в PDF и DOCX.
+
+cold - оформление строится заново при каждом экспорте (как до появления
+RenderContext), warm - общий контекст процесса (get_render_context).
+Для DOCX cold дополнительно включает сохранение шаблона в байты.
+MongoDB не нужна: используется синтетический отчет на 20 строк.
+
+    python benchmarks/bench_export_cpu.py --repeat 50
+Результат выводится в формате JSON.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import export
+
+def reports_data(rows):
+    parcels = [{
+        'tracking_number': f'TRK20260101{i:08d}',
+        'sender': {'full_name': f'Иванов Иван {i}'},
+        'receiver': {'full_name': f'Петрова Анна {i}'},
+        'parcel': {'weight': 5.5 + i},
+        'status': 'В пути',
+        'dates': {'dispatch_date': '2026-01-01'}
+    } for i in range(rows)]
+    return {'courier_reports': {'heavy_parcels': parcels}}
+
+def measure(render, data, repeat, cold):
+    """Среднее процессорное время одного экспорта (мс)"""
+    fonts_registered = export.get_render_context().fonts_registered
+    total = 0
+    for _ in range(repeat):
+        started = time.process_time()
+        context = export.RenderContext(fonts_registered) if cold else None
+        render(data, 'courier', 'heavy_parcels', context=context)
+        total += time.process_time() - started
+    return round(total / repeat * 1000, 2)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--rows', type=int, default=20)
+    args = parser.parse_args()
+
+    data = reports_data(args.rows)
+    result = {}
+    for name, render in (('pdf', export.export_to_pdf), ('docx', export.export_to_docx)):
+        # Первый вызов - прогрев (импорт модулей, регистрация шрифтов)
+        render(data, 'courier', 'heavy_parcels')
+        cold = measure(render, data, args.repeat, cold=True)
+        warm = measure(render, data, args.repeat, cold=False)
+        result[name] = {'cold_ms': cold, 'warm_ms': warm, 'saved_ms': round(cold - warm, 2)}
+    print(json.dumps(result, indent=2))
+
+if __name__ == '__main__':
+    main()
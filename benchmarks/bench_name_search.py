@@ -0,0 +1,77 @@
+"""Сравнение поиска по ФИО: $regex без якоря и с флагом i против префикса по name_key.
+
+Запуск (отдельная база, по умолчанию documents_bench):
+    MONGO_URI=mongodb://localhost:27017/ python benchmarks/bench_name_search.py --parcels 1000000
+Результат выводится в формате JSON.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo import MongoClient, IndexModel, ASCENDING
+from documents import normalize_name, prefix_query
+
+LAST_NAMES = ['Иванов', 'Петров', 'Сидоров', 'Ёлкин', 'Смирнов', 'Кузнецов', 'Попов', 'Соколов',
+              'Лебедев', 'Козлов', 'Новиков', 'Морозов', 'Волков', 'Алексеев', 'Фёдоров', 'Орлов']
+FIRST_NAMES = ['Иван', 'Пётр', 'Сергей', 'Анна', 'Мария', 'Алексей', 'Ольга', 'Дмитрий']
+
+def random_name(rnd):
+    return f'{rnd.choice(LAST_NAMES)}{rnd.randint(0, 999)} {rnd.choice(FIRST_NAMES)}'
+
+def seed(collection, count, batch_size=10000):
+    """Заполнение коллекции посылками со случайными ФИО отправителя"""
+    rnd = random.Random(42)
+    collection.drop()
+    batch = []
+    for i in range(count):
+        name = random_name(rnd)
+        batch.append({'tracking_number': f'BENCH{i:09d}',
+                      'sender': {'full_name': name, 'name_key': normalize_name(name)}})
+        if len(batch) >= batch_size:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+    collection.create_indexes([IndexModel([('sender.full_name', ASCENDING)]),
+                               IndexModel([('sender.name_key', ASCENDING)])])
+
+def measure(collection, query, repeat):
+    """Медиана времени выполнения запроса (мс) и число найденных документов"""
+    timings = []
+    found = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        found = collection.count_documents(query)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {'median_ms': round(timings[len(timings) // 2], 2), 'found': found}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--parcels', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database', default='documents_bench')
+    parser.add_argument('--name', default='Иванов12')
+    parser.add_argument('--skip-seed', action='store_true')
+    args = parser.parse_args()
+
+    client = MongoClient(os.environ.get('MONGO_URI', 'mongodb://localhost:27017/'))
+    collection = client[args.database]['parcels']
+    if not args.skip_seed:
+        seed(collection, args.parcels)
+
+    result = {
+        'parcels': collection.estimated_document_count(),
+        'regex_unanchored_i': measure(collection, {'sender.full_name': {'$regex': args.name, '$options': 'i'}},
+                                      args.repeat),
+        'prefix_name_key': measure(collection, {'sender.name_key': prefix_query(args.name)}, args.repeat)
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+if __name__ == '__main__':
+    main()
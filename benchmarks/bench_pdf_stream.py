@@ -0,0 +1,92 @@
+"""Скорость и пиковая память PDF-экспорта отчета по посылкам на 1k/10k/100k строк.
+
+Режимы: stream - export_to_pdf_stream (строки из итератора, постраничная
+сборка), list - export_to_pdf с полным списком строк. Каждый замер
+выполняется в отдельном процессе, чтобы пиковая память (ru_maxrss) не
+смешивалась между замерами. MongoDB не нужна: документы генерируются.
+
+    python benchmarks/bench_pdf_stream.py --rows 1000 10000 100000
+Результат выводится в формате JSON.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+STATUSES = ['Принято', 'Обработка', 'В пути', 'В пункте выдачи', 'Доставлено']
+
+def parcels(count):
+    """Синтетические документы отчета heavy_parcels"""
+    for i in range(count):
+        yield {
+            'tracking_number': f'TRK20260101{i:08d}',
+            'sender': {'full_name': f'Иванов Иван {i}'},
+            'receiver': {'full_name': f'Петрова Анна {i}'},
+            'parcel': {'weight': 5.5 + i % 20},
+            'status': STATUSES[i % len(STATUSES)],
+            'dates': {'dispatch_date': '2026-01-01'}
+        }
+
+def measure(mode, rows):
+    """Один замер в текущем процессе"""
+    from export import export_to_pdf, export_to_pdf_stream
+
+    with tempfile.NamedTemporaryFile(suffix='.pdf') as output:
+        started = time.perf_counter()
+        if mode == 'stream':
+            pages = export_to_pdf_stream(parcels(rows), 'courier', 'heavy_parcels', output.name)
+        else:
+            reports_data = {'courier_reports': {'heavy_parcels': list(parcels(rows))}}
+            data = export_to_pdf(reports_data, 'courier', 'heavy_parcels', max_rows=None)
+            output.write(data)
+            output.flush()
+            pages = None
+        seconds = time.perf_counter() - started
+        size = os.path.getsize(output.name)
+
+    result = {
+        'mode': mode,
+        'rows': rows,
+        'seconds': round(seconds, 2),
+        'rows_per_sec': round(rows / seconds),
+        'file_bytes': size,
+        # ru_maxrss в Linux - килобайты
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+    if pages:
+        result['pages'] = pages
+        result['pages_per_sec'] = round(pages / seconds, 1)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--modes', nargs='+', default=['stream', 'list'], choices=['stream', 'list'])
+    parser.add_argument('--list-max-rows', type=int, default=10000,
+                        help='не запускать режим list для больших отчетов (он растет нелинейно)')
+    parser.add_argument('--child', nargs=2, metavar=('MODE', 'ROWS'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child[0], int(args.child[1]))))
+        return
+
+    results = []
+    for rows in args.rows:
+        for mode in args.modes:
+            if mode == 'list' and rows > args.list_max_rows:
+                continue
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode, str(rows)],
+                                    check=True, capture_output=True, text=True).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+if __name__ == '__main__':
+    main()
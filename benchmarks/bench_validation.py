@@ -0,0 +1,116 @@
+"""Скорость валидации форм посылок и курсов (строк/с) в одиночном и пакетном режимах.
+
+single - validate_courier_data / validate_course_data для каждой строки,
+batch - validate_courier_batch / validate_course_batch для всего набора.
+Часть строк содержит ошибки (--invalid - доля таких строк). MongoDB не нужна.
+
+    python benchmarks/bench_validation.py --rows 10000 --repeat 5
+Результат выводится в формате JSON.
+"""
+import argparse
+from datetime import date, timedelta
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import validation
+
+def courier_row(i, day):
+    return {
+        'sender_name': f'Иванов Иван {"А" * (i % 5 + 1)}',
+        'sender_address': 'г. Москва, ул. Ленина, д. 1',
+        'sender_passport_series': '1234',
+        'sender_passport_number': '123456',
+        'sender_birth_date': '1990-01-01',
+        'sender_gender': 'М',
+        'receiver_name': 'Петрова Анна Сергеевна',
+        'receiver_address': 'г. Казань, ул. Мира, д. 2',
+        'receiver_passport_series': '4321',
+        'receiver_passport_number': '654321',
+        'receiver_birth_date': '1985-05-05',
+        'receiver_gender': 'Ж',
+        'weight': str(1 + i % 50),
+        'length': '30', 'width': '20', 'height': '10',
+        'courier_name': 'Сидоров Сидор',
+        'courier_phone': '+79991234567',
+        'dispatch_date': day.isoformat(),
+        'delivery_date': (day + timedelta(days=3)).isoformat(),
+        'status': 'Принято',
+        'delivery_cost': '500'
+    }
+
+def course_row(i, day):
+    return {
+        'course_name': f'Основы Python {i % 10}',
+        'teacher_name': 'Иванов Иван',
+        'teacher_department': 'ИТ',
+        'teacher_email': 'teacher@example.com',
+        'teacher_phone': '89991234567',
+        'start_date': day.isoformat(),
+        'end_date': (day + timedelta(days=30)).isoformat(),
+        'registration_deadline': day.isoformat(),
+        'hours': '72',
+        'price': '15000',
+        'max_participants': '30',
+        'employee_1_name': 'Петров Петр',
+        'employee_1_position': 'Инженер',
+        'employee_1_email': 'petrov@example.com',
+        'status': 'Запланирован'
+    }
+
+# Поля, которые портятся в строках с ошибками
+BROKEN = {
+    'courier': {'weight': '-1', 'sender_passport_series': '12', 'delivery_date': '2000-01-01'},
+    'courses': {'hours': 'много', 'teacher_email': 'no-email', 'employee_1_position': ''}
+}
+
+def make_rows(kind, count, invalid):
+    random.seed(1)
+    day = date.today() + timedelta(days=7)
+    build = courier_row if kind == 'courier' else course_row
+    rows = []
+    for i in range(count):
+        row = build(i, day)
+        if random.random() < invalid:
+            field, value = random.choice(list(BROKEN[kind].items()))
+            row[field] = value
+        rows.append(row)
+    return rows
+
+def measure(run, rows, repeat):
+    """Лучший результат из repeat прогонов (строк/с)"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run(rows)
+        seconds = time.perf_counter() - started
+        best = seconds if best is None else min(best, seconds)
+    return round(len(rows) / best)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--invalid', type=float, default=0.1)
+    args = parser.parse_args()
+
+    modes = {
+        'courier': (validation.validate_courier_data, validation.validate_courier_batch),
+        'courses': (validation.validate_course_data, validation.validate_course_batch)
+    }
+    result = {}
+    for kind, (single, batch) in modes.items():
+        rows = make_rows(kind, args.rows, args.invalid)
+        result[kind] = {
+            'rows': args.rows,
+            'single_rows_per_sec': measure(lambda items: [single(row) for row in items], rows, args.repeat),
+            'batch_rows_per_sec': measure(batch, rows, args.repeat)
+        }
+    print(json.dumps(result, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+"""Набор замеров на 10k/100k/1M документов с результатом в JSON.
+
+Для каждого размера коллекции дозаполняются до N посылок (и N/10 курсов,
+см. seed.py), затем замеряются: страницы списков (через тестовый клиент
+Flask, с фильтрами и второй страницей), generate_reports, каждый формат
+экспорта (PDF, DOCX - без кэшей, CSV, NDJSON - полная выгрузка) и скорость
+проверки форм. Результат - медиана, p95 и минимум по --repeat повторам после
+прогрева; вместе с ним записываются коммит, версии и параметры запуска,
+поэтому файлы разных коммитов можно сравнить (--baseline).
+
+Базы данных:
+    mongod   - MONGO_URI (по умолчанию localhost), база MONGO_DB (documents_bench)
+    inmemory - временный mongod из пакета pymongo-inmemory
+    mongomock - mongomock в памяти процесса (без индексов и планировщика:
+                абсолютные значения не сравнимы с mongod, только между собой)
+
+    python benchmarks/run.py --backend mongod --sizes 10000 100000 1000000 --output results.json
+    python benchmarks/run.py --backend mongomock --sizes 2000 --repeat 3 --baseline results.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import seed
+
+# Отношение числа курсов к числу посылок
+COURSES_RATIO = 10
+# Сколько строк проверяется при замере скорости проверки форм
+VALIDATION_ROWS = 20000
+# Изменение медианы (в разах), начиная с которого сравнение отмечает замер
+REGRESSION_RATIO = 1.2
+
+def connect(backend):
+    """Модуль app и база данных для замеров (клиент подменяется после настройки app)"""
+    os.environ.setdefault('MONGO_DB', 'documents_bench')
+    os.environ.setdefault('MONGO_AUTO_INDEXES', '0')
+    import app as app_module
+    import database
+
+    if backend == 'mongomock':
+        import mongomock
+        database.connection.use_client(mongomock.MongoClient())
+    elif backend == 'inmemory':
+        import pymongo_inmemory
+        database.connection.use_client(pymongo_inmemory.MongoClient())
+    return app_module, database.connection.db
+
+def drop(db):
+    for name in db.list_collection_names():
+        if name in ('courier_deliveries', 'qualification_courses', 'sequences') or name.startswith('stats_') \
+                or name.endswith('_rollup'):
+            db.drop_collection(name)
+
+def measure(run, repeat, warmup=1):
+    """Время выполнения run (мс): медиана, p95, минимум"""
+    for _ in range(warmup):
+        run()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        'median_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+        'min_ms': round(timings[0], 2),
+        'runs': repeat
+    }
+
+def get(client, url):
+    """GET через тестовый клиент с чтением всего тела (потоковые ответы тоже)"""
+    def run():
+        response = client.get(url)
+        assert response.status_code == 200, f'{url}: {response.status_code}'
+        response.get_data()
+        response.close()
+    return run
+
+def export_report(client, app_module, export_format, report_type, report_name):
+    """Экспорт отчета без кэша отчетов и кэша файлов (сброс версии данных коллекции)"""
+    url = f'/export/{export_format}/{report_type}/{report_name}'
+
+    def run():
+        app_module.report_cache.invalidate(report_type)
+        get(client, url)()
+    return run
+
+def benchmarks(app_module, db):
+    """Замеры: имя -> функция без аргументов"""
+    import reports
+    from database import courier_collection, courses_collection
+
+    client = app_module.app.test_client()
+    second_page = client.get('/api/v1/parcels').get_json()['next_cursor'] or ''
+    return {
+        'list_courier': get(client, '/courier'),
+        'list_courier_status': get(client, '/courier?status=В пути'),
+        'list_courier_sender': get(client, '/courier?sender=Иванов'),
+        'list_courier_page2': get(client, f'/courier?after={second_page}'),
+        'list_courses': get(client, '/courses'),
+        'list_courses_category': get(client, '/courses?category=Технический'),
+        'api_parcels': get(client, '/api/v1/parcels?per_page=100'),
+        'generate_reports': lambda: reports.generate_reports(courier_collection, courses_collection),
+        'export_pdf': export_report(client, app_module, 'pdf', 'courier', 'heavy_parcels'),
+        'export_docx': export_report(client, app_module, 'docx', 'courier', 'heavy_parcels'),
+        'export_csv': get(client, '/export/csv/courier'),
+        'export_ndjson': get(client, '/export/ndjson/courier')
+    }
+
+def validation_throughput(rows, repeat, seed_value):
+    """Скорость validate_courier_batch/validate_course_batch (строк в секунду)"""
+    from validation import validate_courier_batch, validate_course_batch
+
+    now = datetime.now()
+    # max_age=0: все строки созданы сегодня и проходят проверку, как данные новой формы
+    courier_rows = [form for _, (form, _, _) in seed.parcel_rows(seed_value, 0, rows, now, max_age=0)]
+    course_rows = [form for _, (form, _) in seed.course_rows(seed_value, 0, rows, now, max_age=0)]
+    result = {}
+    for name, validate, data in (('validate_courier', validate_courier_batch, courier_rows),
+                                 ('validate_courses', validate_course_batch, course_rows)):
+        timing = measure(lambda: validate(data), repeat)
+        timing['rows'] = rows
+        timing['rows_per_second'] = round(rows / (timing['median_ms'] / 1000))
+        result[name] = timing
+    return result
+
+def environment(backend):
+    """Коммит, версии и параметры окружения, с которыми получены результаты"""
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    import flask
+    import pymongo
+    info = {
+        'commit': git('rev-parse', 'HEAD'),
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'flask': flask.__version__,
+        'pymongo': pymongo.version,
+        'backend': backend
+    }
+    if backend != 'mongomock':
+        import database
+        try:
+            info['mongodb'] = database.connection.client.server_info()['version']
+        except Exception:
+            info['mongodb'] = None
+    return info
+
+def compare(results, baseline):
+    """Сравнение медиан с файлом результатов другого коммита (ratio > 1 - медленнее)"""
+    comparison = {}
+    for size, current in results['sizes'].items():
+        previous = baseline.get('sizes', {}).get(size, {})
+        for name, timing in current['benchmarks'].items():
+            if name in previous.get('benchmarks', {}):
+                ratio = timing['median_ms'] / max(previous['benchmarks'][name]['median_ms'], 0.001)
+                comparison.setdefault(size, {})[name] = {
+                    'baseline_ms': previous['benchmarks'][name]['median_ms'],
+                    'median_ms': timing['median_ms'],
+                    'ratio': round(ratio, 2),
+                    'regression': ratio >= REGRESSION_RATIO
+                }
+    return comparison
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', choices=['mongod', 'inmemory', 'mongomock'], default='mongod')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--only', nargs='+', help='только перечисленные замеры')
+    parser.add_argument('--keep', action='store_true', help='не удалять коллекции перед первым заполнением')
+    parser.add_argument('--output', help='файл для результатов (по умолчанию - вывод в консоль)')
+    parser.add_argument('--baseline', help='файл результатов для сравнения')
+    args = parser.parse_args()
+
+    app_module, db = connect(args.backend)
+    if not args.keep:
+        drop(db)
+
+    results = {'environment': environment(args.backend),
+               'parameters': {'repeat': args.repeat, 'seed': args.seed, 'courses_ratio': COURSES_RATIO},
+               'sizes': {}}
+    for size in sorted(args.sizes):
+        print(f'Размер {size}: заполнение...', file=sys.stderr)
+        seeded = seed.seed(db, size, max(size // COURSES_RATIO, 1), args.seed)
+        measured = {}
+        for name, run in benchmarks(app_module, db).items():
+            if args.only and name not in args.only:
+                continue
+            print(f'  {name}', file=sys.stderr)
+            measured[name] = measure(run, args.repeat)
+        if not args.only or any(name.startswith('validate') for name in args.only):
+            measured.update(validation_throughput(min(size, VALIDATION_ROWS), args.repeat, args.seed))
+        results['sizes'][str(size)] = {'seed': seeded, 'benchmarks': measured}
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            results['comparison'] = compare(results, json.load(f))
+
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
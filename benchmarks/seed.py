@@ -0,0 +1,278 @@
+"""Синтетические посылки и курсы для замеров: ФИО, адреса, статусы и даты.
+
+Каждая строка - данные формы, которые проходят validate_courier_data /
+validate_course_data на дату своего создания (created_at распределен по
+последнему году, недавних документов больше). Документы собираются теми же
+build_parcel/build_course, что и при добавлении через форму. Данные
+детерминированы: документ с номером i зависит только от --seed и i, поэтому
+коллекцию можно дозаполнять (10k -> 100k -> 1M) и сравнивать результаты
+между коммитами.
+
+    MONGO_URI=mongodb://localhost:27017/ MONGO_DB=documents_bench python benchmarks/seed.py --parcels 100000 --courses 10000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import indexes
+import stats
+from documents import build_parcel, DELIVERED_STATUS
+from importer import new_course
+from sequences import generate_tracking_number, generate_course_code
+from validation import courier_validator, course_validator
+
+# Документы генерируются блоками: блок с номером n зависит только от seed и n
+BLOCK_SIZE = 1000
+# Размер пакета insert_many
+INSERT_BATCH_SIZE = 10000
+
+LAST_NAMES = ['Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Петров', 'Соколов', 'Михайлов',
+              'Новиков', 'Фёдоров', 'Морозов', 'Волков', 'Алексеев', 'Лебедев', 'Семёнов', 'Егоров',
+              'Павлов', 'Козлов', 'Степанов', 'Николаев', 'Орлов', 'Андреев', 'Макаров', 'Никитин',
+              'Захаров', 'Зайцев', 'Соловьёв', 'Борисов', 'Яковлев', 'Григорьев', 'Романов', 'Воробьёв']
+MALE_NAMES = ['Александр', 'Дмитрий', 'Максим', 'Сергей', 'Андрей', 'Алексей', 'Артём', 'Илья',
+              'Кирилл', 'Михаил', 'Никита', 'Матвей', 'Роман', 'Егор', 'Иван', 'Пётр']
+FEMALE_NAMES = ['Анастасия', 'Мария', 'Анна', 'Виктория', 'Екатерина', 'Наталья', 'Марина', 'Полина',
+                'Дарья', 'Алиса', 'Ксения', 'Елена', 'Ольга', 'Татьяна', 'Ирина', 'Юлия']
+MALE_PATRONYMICS = ['Александрович', 'Дмитриевич', 'Сергеевич', 'Андреевич', 'Алексеевич', 'Иванович',
+                    'Михайлович', 'Петрович', 'Николаевич', 'Владимирович']
+FEMALE_PATRONYMICS = ['Александровна', 'Дмитриевна', 'Сергеевна', 'Андреевна', 'Алексеевна', 'Ивановна',
+                      'Михайловна', 'Петровна', 'Николаевна', 'Владимировна']
+CITIES = ['Москва', 'Санкт-Петербург', 'Новосибирск', 'Екатеринбург', 'Казань', 'Нижний Новгород',
+          'Челябинск', 'Самара', 'Омск', 'Ростов-на-Дону', 'Уфа', 'Красноярск', 'Воронеж', 'Пермь']
+# Вес города в выборке: крупные города встречаются чаще
+CITY_WEIGHTS = [30, 15, 6, 6, 5, 5, 4, 4, 3, 3, 3, 3, 3, 3]
+STREETS = ['Ленина', 'Советская', 'Мира', 'Гагарина', 'Пушкина', 'Садовая', 'Лесная', 'Молодёжная',
+           'Центральная', 'Школьная', 'Набережная', 'Октябрьская', 'Заводская', 'Победы']
+STREET_TYPES = ['ул.', 'пр-т', 'пер.', 'б-р']
+COURIER_COMPANIES = ['СДЭК', 'Boxberry', 'DPD', 'Почта России', 'ПЭК', '']
+VEHICLES = ['Легковой автомобиль', 'Фургон', 'Мотоцикл', 'Велосипед', '']
+DESCRIPTIONS = ['Документы', 'Одежда', 'Электроника', 'Книги', 'Посуда', 'Запчасти', 'Косметика', '']
+
+COURSE_TOPICS = ['Основы Python', 'Анализ данных', 'Управление проектами', 'Деловая переписка',
+                 'Информационная безопасность', 'Охрана труда', 'Бухгалтерский учет', 'Английский язык',
+                 'Переговоры и продажи', 'Администрирование Linux', 'Базы данных MongoDB', 'Тайм-менеджмент']
+COURSE_LEVELS = ['для начинающих', 'продвинутый уровень', 'практикум', 'интенсив']
+DEPARTMENTS = ['ИТ', 'Бухгалтерия', 'Отдел кадров', 'Продажи', 'Логистика', 'Юридический отдел', 'Маркетинг']
+POSITIONS = ['Инженер', 'Аналитик', 'Менеджер', 'Бухгалтер', 'Специалист', 'Руководитель группы', 'Юрист']
+QUALIFICATIONS = ['Кандидат наук', 'Доцент', 'Старший преподаватель', 'Эксперт-практик', '']
+CATEGORIES = ['Общий', 'Технический', 'Гуманитарный', 'Управленческий']
+LOCATIONS = ['Аудитория 101', 'Аудитория 204', 'Конференц-зал', 'Онлайн', '']
+
+def block_random(seed, block, kind):
+    return random.Random(f'{kind}:{seed}:{block}')
+
+def indexed(seed, start, stop, kind, make):
+    """(номер, данные) документов с номерами от start до stop, по блокам BLOCK_SIZE"""
+    for block in range(start // BLOCK_SIZE, (stop + BLOCK_SIZE - 1) // BLOCK_SIZE):
+        rnd = block_random(seed, block, kind)
+        for i in range(block * BLOCK_SIZE, (block + 1) * BLOCK_SIZE):
+            item = make(rnd, i)
+            if start <= i < stop:
+                yield i, item
+            elif i >= stop:
+                return
+
+def person_name(rnd):
+    """ФИО и пол"""
+    gender = rnd.choice('МЖ')
+    last_name = rnd.choice(LAST_NAMES)
+    if gender == 'М':
+        return f'{last_name} {rnd.choice(MALE_NAMES)} {rnd.choice(MALE_PATRONYMICS)}', gender
+    return f'{last_name}а {rnd.choice(FEMALE_NAMES)} {rnd.choice(FEMALE_PATRONYMICS)}', gender
+
+def address(rnd):
+    city = rnd.choices(CITIES, CITY_WEIGHTS)[0]
+    return (f'г. {city}, {rnd.choice(STREET_TYPES)} {rnd.choice(STREETS)}, '
+            f'д. {rnd.randint(1, 150)}, кв. {rnd.randint(1, 300)}')
+
+def phone(rnd):
+    return f'+79{rnd.randint(0, 999999999):09d}'
+
+def created_at(rnd, now, max_age):
+    """Время создания за последние max_age дней, недавние документы встречаются чаще"""
+    return now - timedelta(days=rnd.triangular(0, max_age, 0))
+
+def day(value):
+    return value.strftime('%Y-%m-%d')
+
+def fill_person(form, rnd, prefix, today):
+    name, gender = person_name(rnd)
+    birth = today - timedelta(days=rnd.randint(18 * 365, 80 * 365))
+    form.update({
+        f'{prefix}_name': name,
+        f'{prefix}_address': address(rnd),
+        f'{prefix}_passport_series': f'{rnd.randint(1000, 9999)}',
+        f'{prefix}_passport_number': f'{rnd.randint(0, 999999):06d}',
+        f'{prefix}_birth_date': day(birth),
+        f'{prefix}_gender': gender
+    })
+
+def parcel_status(rnd, age_days):
+    """Статус по возрасту посылки: старые почти все доставлены"""
+    if age_days > 14:
+        return rnd.choices(['Доставлено', 'Отменено', 'В пункте выдачи'], [90, 6, 4])[0]
+    if age_days > 3:
+        return rnd.choices(['Доставлено', 'В пункте выдачи', 'В пути', 'Отменено'], [50, 20, 25, 5])[0]
+    return rnd.choices(['Принято', 'Обработка', 'В пути'], [30, 30, 40])[0]
+
+def parcel_row(rnd, i, now, max_age):
+    """(данные формы посылки, время создания, фактическая дата доставки)"""
+    created = created_at(rnd, now, max_age)
+    today = created.date()
+    dispatch = today + timedelta(days=rnd.randint(0, 2))
+    delivery = dispatch + timedelta(days=rnd.randint(1, 10))
+    courier_name, _ = person_name(rnd)
+    form = {
+        'weight': f'{rnd.lognormvariate(0.7, 0.9):.2f}' if rnd.random() < 0.97 else f'{rnd.uniform(20, 120):.1f}',
+        'length': f'{rnd.randint(5, 120)}',
+        'width': f'{rnd.randint(5, 80)}',
+        'height': f'{rnd.randint(2, 60)}',
+        'description': rnd.choice(DESCRIPTIONS),
+        'fragile': 'on' if rnd.random() < 0.15 else '',
+        'insured': 'on' if rnd.random() < 0.3 else '',
+        'courier_name': courier_name,
+        'courier_phone': phone(rnd),
+        'courier_vehicle': rnd.choice(VEHICLES),
+        'courier_company': rnd.choice(COURIER_COMPANIES),
+        'dispatch_date': day(dispatch),
+        'delivery_date': day(delivery),
+        'delivery_cost': f'{rnd.randint(150, 5000)}',
+        'status': parcel_status(rnd, (now.date() - today).days)
+    }
+    if form['weight'] == '0.00':
+        form['weight'] = '0.01'
+    fill_person(form, rnd, 'sender', today)
+    fill_person(form, rnd, 'receiver', today)
+    actual = None
+    if form['status'] == DELIVERED_STATUS:
+        actual = min(delivery + timedelta(days=rnd.randint(-2, 2)), now.date())
+        actual = day(max(actual, dispatch))
+    return form, created, actual
+
+def course_row(rnd, i, now, max_age):
+    """(данные формы курса, время создания)"""
+    created = created_at(rnd, now, max_age)
+    today = created.date()
+    start = today + timedelta(days=rnd.randint(3, 60))
+    end = start + timedelta(days=rnd.randint(1, 90))
+    teacher_name, _ = person_name(rnd)
+    form = {
+        'course_name': f'{rnd.choice(COURSE_TOPICS)}: {rnd.choice(COURSE_LEVELS)}',
+        'hours': f'{rnd.choice([8, 16, 24, 36, 40, 72, 144])}',
+        'start_date': day(start),
+        'end_date': day(end),
+        'registration_deadline': day(start - timedelta(days=rnd.randint(1, 3))) if rnd.random() < 0.7 else '',
+        'teacher_name': teacher_name,
+        'teacher_department': rnd.choice(DEPARTMENTS),
+        'teacher_qualification': rnd.choice(QUALIFICATIONS),
+        'teacher_email': f'teacher{i}@example.ru' if rnd.random() < 0.6 else '',
+        'teacher_phone': phone(rnd) if rnd.random() < 0.5 else '',
+        'price': f'{rnd.randint(0, 120) * 500}',
+        'location': rnd.choice(LOCATIONS),
+        'max_participants': f'{rnd.choice([10, 15, 20, 30, 50])}',
+        'category': rnd.choice(CATEGORIES),
+        'description': 'Программа курса повышения квалификации',
+        'status': 'Завершен' if end < now.date() else ('В процессе' if start <= now.date() else
+                                                       rnd.choice(['Запланирован', 'Набор'])),
+    }
+    if rnd.random() < 0.03:
+        form['status'] = 'Отменен'
+    for n in range(1, rnd.randint(1, 3) + 1):
+        name, _ = person_name(rnd)
+        form.update({
+            f'employee_{n}_name': name,
+            f'employee_{n}_position': rnd.choice(POSITIONS),
+            f'employee_{n}_department': rnd.choice(DEPARTMENTS),
+            f'employee_{n}_email': f'employee{i}_{n}@example.ru' if rnd.random() < 0.5 else ''
+        })
+    return form, created
+
+def parcel_rows(seed, start, stop, now, max_age=365):
+    """Данные форм посылок с номерами от start до stop (max_age=0 - все созданы сейчас)"""
+    return indexed(seed, start, stop, 'parcel', lambda rnd, i: parcel_row(rnd, i, now, max_age))
+
+def course_rows(seed, start, stop, now, max_age=365):
+    """Данные форм курсов с номерами от start до stop (max_age=0 - все созданы сейчас)"""
+    return indexed(seed, start, stop, 'course', lambda rnd, i: course_row(rnd, i, now, max_age))
+
+def check_row(validator, form, today, i):
+    errors = validator(form, today)
+    if errors:
+        raise ValueError(f'Строка {i} не прошла проверку: {errors}')
+
+def parcel_document(db, i, form, created, actual):
+    check_row(courier_validator, form, created.date(), i)
+    parcel = build_parcel(form, actual)
+    parcel['tracking_number'] = generate_tracking_number(db)
+    parcel['created_at'] = created
+    parcel['updated_at'] = created
+    return parcel
+
+def course_document(db, i, form, created):
+    check_row(course_validator, form, created.date(), i)
+    course = new_course(form)
+    course['current_participants'] = len(course['employees'])
+    course['course_code'] = generate_course_code(db)
+    course['created_at'] = created
+    return course
+
+def insert(collection, documents):
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= INSERT_BATCH_SIZE:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+
+def seed(db, parcels, courses, seed=42, now=None):
+    """Дозаполнение коллекций до parcels посылок и courses курсов.
+
+    Уже сохраненные документы не меняются: генерируются только недостающие
+    номера. Возвращает число добавленных документов и время.
+    """
+    now = now or datetime.combine(date.today(), datetime.min.time()) + timedelta(hours=12)
+    courier_collection = db['courier_deliveries']
+    courses_collection = db['qualification_courses']
+    started = time.perf_counter()
+    indexes.ensure_indexes(db)
+    parcel_start = courier_collection.estimated_document_count()
+    course_start = courses_collection.estimated_document_count()
+    insert(courier_collection, (parcel_document(db, i, *row)
+                                for i, row in parcel_rows(seed, parcel_start, parcels, now)))
+    insert(courses_collection, (course_document(db, i, *row)
+                                for i, row in course_rows(seed, course_start, courses, now)))
+    stats.rebuild_stats(db)
+    return {
+        'parcels_added': max(parcels - parcel_start, 0),
+        'courses_added': max(courses - course_start, 0),
+        'seconds': round(time.perf_counter() - started, 2)
+    }
+
+def main():
+    from pymongo import MongoClient
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--parcels', type=int, default=10000)
+    parser.add_argument('--courses', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--drop', action='store_true', help='удалить коллекции перед заполнением')
+    args = parser.parse_args()
+
+    db = MongoClient(os.environ.get('MONGO_URI', 'mongodb://localhost:27017/'))[
+        os.environ.get('MONGO_DB', 'documents_bench')]
+    if args.drop:
+        for name in ('courier_deliveries', 'qualification_courses', 'sequences'):
+            db.drop_collection(name)
+    print(json.dumps(seed(db, args.parcels, args.courses, args.seed), ensure_ascii=False, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+import hashlib
+import os
+import pickle
+import threading
+import time
+import uuid
+
+class MemoryBackend:
+    """Кэш в памяти процесса: TTL и вытеснение давно не использованных записей (LRU)"""
+
+    # Версии данных видны только этому процессу: запись в другом процессе их не меняет
+    shared = False
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._counters = {}
+        self._locks = {}
+        self._mutex = threading.Lock()
+
+    def get(self, key):
+        with self._mutex:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._mutex:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._mutex:
+            self._data.pop(key, None)
+
+    def get_counter(self, name):
+        with self._mutex:
+            return self._counters.get(name, 0)
+
+    def incr_counter(self, name):
+        # Счетчики хранятся отдельно от записей и не вытесняются
+        with self._mutex:
+            self._counters[name] = self._counters.get(name, 0) + 1
+            return self._counters[name]
+
+    @contextmanager
+    def lock(self, key):
+        with self._mutex:
+            key_lock = self._locks.setdefault(key, threading.Lock())
+        with key_lock:
+            yield
+        with self._mutex:
+            if self._locks.get(key) is key_lock:
+                del self._locks[key]
+
+class RedisBackend:
+    """Общий кэш в Redis для нескольких процессов (подходит и fakeredis для тестов)"""
+
+    shared = True
+
+    def __init__(self, client, prefix='documents:', lock_timeout=30):
+        self.client = client
+        self.prefix = prefix
+        self.lock_timeout = lock_timeout
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=max(1, int(ttl)))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def get_counter(self, name):
+        value = self.client.get(self.prefix + 'counter:' + name)
+        return int(value) if value is not None else 0
+
+    def incr_counter(self, name):
+        return self.client.incr(self.prefix + 'counter:' + name)
+
+    @contextmanager
+    def lock(self, key):
+        # Блокировка через SET NX с временем жизни (без Lua-скриптов)
+        name = self.prefix + 'lock:' + key
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_timeout
+        while not self.client.set(name, token, nx=True, px=int(self.lock_timeout * 1000)):
+            if time.monotonic() > deadline:
+                break
+            time.sleep(0.05)
+        try:
+            yield
+        finally:
+            if self.client.get(name) in (token, token.encode()):
+                self.client.delete(name)
+
+def create_backend(redis_url=None, max_size=256):
+    """Создание хранилища кэша: Redis, если указан адрес, иначе память процесса"""
+    if redis_url:
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('Для кэша в Redis установите пакет redis')
+        return RedisBackend(redis.Redis.from_url(redis_url))
+    return MemoryBackend(max_size=max_size)
+
+class ReportCache:
+    """Кэш результатов отчетов с инвалидацией по коллекциям.
+
+    Каждая коллекция имеет номер версии данных, который увеличивается при
+    каждой записи. Версии входят в ключ записи кэша, поэтому запись в одну
+    коллекцию делает устаревшими только отчеты, которые от нее зависят.
+    """
+
+    def __init__(self, backend, ttl=60):
+        self.backend = backend
+        self.ttl = ttl
+
+    def data_version(self, collection):
+        """Текущая версия данных коллекции"""
+        return self.backend.get_counter('version:' + collection)
+
+    def invalidate(self, collection):
+        """Сброс записей кэша, зависящих от коллекции"""
+        return self.backend.incr_counter('version:' + collection)
+
+    def make_key(self, key, collections):
+        versions = ','.join(f'{name}={self.data_version(name)}' for name in sorted(collections))
+        return f'{key}|{versions}'
+
+    def get_or_compute(self, key, collections, compute):
+        """Значение из кэша или результат compute().
+
+        При одновременных промахах по одному ключу вычисление выполняется
+        один раз: остальные запросы ждут блокировку и берут готовый результат.
+        """
+        full_key = self.make_key(key, collections)
+        value = self.backend.get(full_key)
+        if value is not None:
+            return value
+
+        with self.backend.lock(full_key):
+            value = self.backend.get(full_key)
+            if value is None:
+                value = compute()
+                if value is not None:
+                    self.backend.set(full_key, value, self.ttl)
+        return value
+
+class ArtifactCache:
+    """Кэш готовых файлов экспорта, ограниченный суммарным размером в байтах.
+
+    Хранит файлы в памяти процесса или, если задан directory, на диске.
+    Каталог можно разделить между процессами только вместе с общими
+    версиями данных (ReportCache с RedisBackend): версия входит в ключ файла.
+    При превышении max_bytes вытесняются давно не использованные файлы,
+    файлы старше ttl не выдаются. На диске размер и возраст считаются по
+    всем файлам каталога, в том числе записанным другими процессами.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=300, directory=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.directory = directory
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._mutex = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._evict_directory()
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            entry_key, (size, created_at, data) = self._entries.popitem(last=False)
+            self._total_bytes -= size
+
+    def _evict_directory(self):
+        """Удаление устаревших файлов каталога и давно не использованных сверх max_bytes.
+
+        Время записи файла (mtime) - его возраст, время последней выдачи - atime (см. get).
+        """
+        now = time.time()
+        files = []
+        for entry in os.scandir(self.directory):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if not entry.is_file():
+                continue
+            # Файлы .tmp старше ttl остались от прерванной записи
+            if now - stat.st_mtime > self.ttl:
+                remove_file(entry.path)
+            elif not entry.name.endswith('.tmp'):
+                files.append((stat.st_atime, entry.path, stat.st_size))
+        total_bytes = sum(size for _, _, size in files)
+        for _, path, size in sorted(files):
+            if total_bytes <= self.max_bytes:
+                break
+            remove_file(path)
+            total_bytes -= size
+
+    def get(self, key):
+        """Файл из кэша (bytes) или None"""
+        with self._mutex:
+            if not self.directory:
+                entry = self._entries.get(key)
+                if entry is None:
+                    return None
+                size, created_at, data = entry
+                if time.time() - created_at > self.ttl:
+                    self._total_bytes -= size
+                    del self._entries[key]
+                    return None
+                self._entries.move_to_end(key)
+                return data
+
+        path = self._path(key)
+        try:
+            mtime = os.path.getmtime(path)
+            if time.time() - mtime > self.ttl:
+                return None
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            # Отметка использования для вытеснения (время записи не меняется)
+            os.utime(path, (time.time(), mtime))
+        except FileNotFoundError:
+            pass
+        return data
+
+    def put(self, key, data):
+        """Сохранение файла в кэш"""
+        if len(data) > self.max_bytes:
+            return
+        if self.directory:
+            path = self._path(key)
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            with self._mutex:
+                self._evict_directory()
+            return
+
+        with self._mutex:
+            old = self._entries.pop(key, None)
+            if old:
+                self._total_bytes -= old[0]
+            self._entries[key] = (len(data), time.time(), data)
+            self._total_bytes += len(data)
+            self._evict()
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
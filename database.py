@@ -0,0 +1,296 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+import os
+import threading
+from bson import json_util
+from pymongo import MongoClient
+from pymongo.read_preferences import Primary, SecondaryPreferred
+from metrics import command_listener, pool_listener
+from slow_queries import slow_query_log
+
+# Подключение к MongoDB
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+MONGO_DB = os.environ.get('MONGO_DB', 'documents_db')
+
+# Настройки клиента и пула: ключ app.config (и переменная окружения) -> (параметр MongoClient, тип).
+# Пустые значения не передаются - действуют значения по умолчанию PyMongo
+CLIENT_OPTIONS = {
+    'MONGO_MAX_POOL_SIZE': ('maxPoolSize', int),
+    'MONGO_MIN_POOL_SIZE': ('minPoolSize', int),
+    'MONGO_MAX_IDLE_TIME_MS': ('maxIdleTimeMS', int),
+    'MONGO_MAX_CONNECTING': ('maxConnecting', int),
+    'MONGO_WAIT_QUEUE_TIMEOUT_MS': ('waitQueueTimeoutMS', int),
+    'MONGO_CONNECT_TIMEOUT_MS': ('connectTimeoutMS', int),
+    'MONGO_SOCKET_TIMEOUT_MS': ('socketTimeoutMS', int),
+    'MONGO_SERVER_SELECTION_TIMEOUT_MS': ('serverSelectionTimeoutMS', int),
+    'MONGO_READ_PREFERENCE': ('readPreference', str),
+    # zstd требует пакет zstandard, snappy - python-snappy; недоступные PyMongo пропускает
+    'MONGO_COMPRESSORS': ('compressors', str),
+    'MONGO_APP_NAME': ('appname', str)
+}
+
+# Режимы чтения маршрутов (MONGO_READ_ROUTES в app.py)
+PRIMARY = 'primary'
+SECONDARY = 'secondary'
+READ_MODES = (PRIMARY, SECONDARY)
+
+# Наименьшее допустимое значение maxStalenessSeconds (ограничение MongoDB)
+MIN_MAX_STALENESS_SECONDS = 90
+
+# Методы коллекции, которые выполняются в causal-сессии запроса
+READ_METHODS = {'find', 'find_one', 'aggregate', 'count_documents', 'distinct'}
+WRITE_METHODS = {'insert_one', 'insert_many', 'update_one', 'update_many', 'replace_one', 'delete_one',
+                 'delete_many', 'find_one_and_update', 'find_one_and_delete', 'find_one_and_replace', 'bulk_write'}
+
+# Ключ сессии Flask с временем последней записи пользователя
+CAUSAL_SESSION_KEY = 'mongo_causal'
+
+# Режим чтения и causal-сессия текущего запроса (при включенном чтении с вторичных узлов)
+current_reads = ContextVar('mongo_reads', default=None)
+
+def client_options(config):
+    """Параметры MongoClient из настроек приложения"""
+    options = {}
+    for key, (option, convert) in CLIENT_OPTIONS.items():
+        value = config.get(key)
+        if value not in (None, ''):
+            options[option] = convert(value)
+    return options
+
+def parse_read_routes(value):
+    """Режимы маршрутов из строки 'endpoint=primary,api.list_documents=secondary'"""
+    routes = {}
+    for item in (value or '').split(','):
+        endpoint, _, mode = item.strip().partition('=')
+        if endpoint and mode.strip() in READ_MODES:
+            routes[endpoint] = mode.strip()
+    return routes
+
+class Connection:
+    """MongoClient процесса.
+
+    Клиент создается при первом обращении к базе, а не при импорте, и заново -
+    в дочернем процессе после fork (воркеры gunicorn с --preload): пул
+    соединений и фоновые потоки PyMongo родителя в дочернем процессе не
+    используются.
+    """
+
+    def __init__(self, uri, db_name, **options):
+        self.uri = uri
+        self.db_name = db_name
+        self.options = options
+        self.secondary_reads = False
+        self.max_staleness_seconds = MIN_MAX_STALENESS_SECONDS
+        self._client = None
+        self._db = None
+        self._collections = {}
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def configure(self, uri, db_name, **options):
+        """Новые адрес и параметры. Клиент с прежними параметрами закрывается"""
+        with self._lock:
+            if self._client is not None and self._pid == os.getpid():
+                self._client.close()
+            self.uri = uri
+            self.db_name = db_name
+            self.options = options
+            self._client = None
+
+    def configure_reads(self, secondary_reads, max_staleness_seconds=MIN_MAX_STALENESS_SECONDS):
+        """Чтение маршрутов в режиме SECONDARY с вторичных узлов не старше max_staleness_seconds"""
+        self.secondary_reads = secondary_reads
+        self.max_staleness_seconds = max(max_staleness_seconds, MIN_MAX_STALENESS_SECONDS)
+        self._collections = {}
+
+    def read_preference(self, mode):
+        if mode == SECONDARY:
+            return SecondaryPreferred(max_staleness=self.max_staleness_seconds)
+        return Primary()
+
+    def use_client(self, client):
+        """Готовый клиент вместо создаваемого (например, mongomock для замеров)"""
+        with self._lock:
+            self._client = client
+            self._db = client[self.db_name]
+            self._collections = {}
+            self._pid = os.getpid()
+
+    def _current(self):
+        client = self._client
+        if client is not None and self._pid == os.getpid():
+            return client, self._db
+        with self._lock:
+            if self._client is None or self._pid != os.getpid():
+                # Клиент родительского процесса не закрывается: его соединения принадлежат родителю.
+                # command_listener и pool_listener - метрики команд и пула (metrics.py),
+                # slow_query_log - explain медленных команд (slow_queries.py)
+                self._client = MongoClient(self.uri, event_listeners=[command_listener, slow_query_log, pool_listener],
+                                           **self.options)
+                self._db = self._client[self.db_name]
+                self._collections = {}
+                self._pid = os.getpid()
+            return self._client, self._db
+
+    @property
+    def client(self):
+        return self._current()[0]
+
+    @property
+    def db(self):
+        return self._current()[1]
+
+    def collection(self, name, mode):
+        """Коллекция с предпочтением чтения режима mode (объекты кэшируются на время жизни клиента)"""
+        db = self.db
+        collection = self._collections.get((name, mode))
+        if collection is None:
+            collection = self._collections[(name, mode)] = db[name].with_options(
+                read_preference=self.read_preference(mode))
+        return collection
+
+    def session(self, state):
+        """causal-сессия текущего потока запроса: создается при первом обращении к базе.
+
+        Сессия не потокобезопасна, поэтому у каждого потока запроса (например,
+        потоков отчетов) она своя. Если пользователь уже что-то записал
+        (state['token'] из сессии Flask), время записи передается сессии:
+        чтение с вторичного узла дождется, пока узел применит эту запись
+        (read-your-writes). Так же передается время synced_reads.
+        """
+        thread = threading.get_ident()
+        session = state['sessions'].get(thread)
+        if session is None:
+            session = self.client.start_session(causal_consistency=True)
+            for token in (state['token'], state['synced']):
+                if token:
+                    advance(session, token)
+            state['sessions'][thread] = session
+        return session
+
+def advance(session, token):
+    """Передача сессии времени {'clusterTime': ..., 'operationTime': ...}"""
+    session.advance_cluster_time(token['clusterTime'])
+    session.advance_operation_time(token['operationTime'])
+
+class DatabaseProxy:
+    """База данных процесса: обращения передаются в connection.db"""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    @property
+    def name(self):
+        return self._connection.db_name
+
+    def __getitem__(self, name):
+        return CollectionProxy(self._connection, name)
+
+    def __getattr__(self, attr):
+        return getattr(self._connection.db, attr)
+
+class CollectionProxy:
+    """Коллекция базы процесса (как и DatabaseProxy, ее можно хранить в переменных модулей)"""
+
+    def __init__(self, connection, name):
+        self._connection = connection
+        self.name = name
+
+    def __getattr__(self, attr):
+        state = current_reads.get()
+        if state is None:
+            return getattr(self._connection.db[self.name], attr)
+        value = getattr(self._connection.collection(self.name, state['mode']), attr)
+        if attr in WRITE_METHODS:
+            state['wrote'] = True
+        # У каждого потока запроса своя сессия (Connection.session)
+        if attr in READ_METHODS or attr in WRITE_METHODS:
+            return partial(value, session=self._connection.session(state))
+        return value
+
+connection = Connection(MONGO_URI, MONGO_DB)
+
+@contextmanager
+def synced_reads(name):
+    """Чтение внутри блока (и в потоках, запущенных в нем) не старше основного узла.
+
+    Перед блоком читается один _id коллекции name с основного узла: время
+    этого чтения получают сессии всех потоков запроса, и чтение с вторичного
+    узла дождется, пока узел применит все записи, завершенные до блока.
+    Так результат, который сохраняется в общем кэше под текущей версией
+    данных, не отстает от записи, которая эту версию увеличила, а сами
+    отчеты по-прежнему читаются с вторичного узла.
+    """
+    state = current_reads.get()
+    if state is None or state['mode'] != SECONDARY:
+        yield
+        return
+    session = connection.session(state)
+    connection.collection(name, PRIMARY).find_one({}, {'_id': 1}, session=session)
+    if session.operation_time is not None and session.cluster_time is not None:
+        state['synced'] = {'clusterTime': session.cluster_time, 'operationTime': session.operation_time}
+        for other in list(state['sessions'].values()):
+            if other is not session:
+                advance(other, state['synced'])
+    try:
+        yield
+    finally:
+        state['synced'] = None
+
+def init_app(app):
+    """Адрес, база и параметры пула из app.config (клиент создается при первом обращении).
+
+    При MONGO_SECONDARY_READS маршруты из MONGO_READ_ROUTES с режимом
+    SECONDARY читают с вторичных узлов (secondaryPreferred, отставание не
+    больше MONGO_MAX_STALENESS_SECONDS), остальные - с основного. Обращения
+    запроса к коллекциям в его потоке выполняются в causal-сессии; после
+    записи ее время сохраняется в сессии Flask, и следующие запросы
+    пользователя видят свою запись и на вторичных узлах. Отчеты и экспорт
+    при промахе кэша считаются в synced_reads: так в кэш под новой версией
+    данных не попадает результат отстающего узла.
+    """
+    from flask import request, session
+
+    connection.configure(app.config['MONGO_URI'], app.config['MONGO_DB'], **client_options(app.config))
+    connection.configure_reads(app.config['MONGO_SECONDARY_READS'], app.config['MONGO_MAX_STALENESS_SECONDS'])
+    if not connection.secondary_reads:
+        return
+
+    @app.before_request
+    def start_reads():
+        token = session.get(CAUSAL_SESSION_KEY)
+        current_reads.set({
+            'mode': app.config['MONGO_READ_ROUTES'].get(request.endpoint, PRIMARY),
+            'thread': threading.get_ident(),
+            'token': json_util.loads(token) if token else None,
+            'synced': None,
+            'sessions': {},
+            'wrote': False
+        })
+
+    @app.after_request
+    def save_write_time(response):
+        state = current_reads.get()
+        mongo_session = state['sessions'].get(state['thread']) if state is not None else None
+        if mongo_session is not None and state['wrote']:
+            if mongo_session.operation_time is not None and mongo_session.cluster_time is not None:
+                # Канонический Extended JSON сохраняет типы (keyId подписи - Int64)
+                session[CAUSAL_SESSION_KEY] = json_util.dumps({'operationTime': mongo_session.operation_time,
+                                                               'clusterTime': mongo_session.cluster_time},
+                                                              json_options=json_util.CANONICAL_JSON_OPTIONS)
+        return response
+
+    @app.teardown_request
+    def finish_reads(error=None):
+        state = current_reads.get()
+        if state is not None:
+            for mongo_session in state['sessions'].values():
+                mongo_session.end_session()
+        current_reads.set(None)
+
+db = DatabaseProxy(connection)
+
+# Коллекции
+courier_collection = db['courier_deliveries']
+courses_collection = db['qualification_courses']
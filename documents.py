@@ -0,0 +1,271 @@
+from datetime import datetime
+import re
+from pymongo import UpdateOne
+
+def normalize_name(value):
+    """Ключ для поиска по ФИО: нижний регистр, ё -> е, одиночные пробелы.
+
+    Ключ хранится в документе рядом с ФИО, поэтому поиск по началу ФИО
+    выполняется якорным регулярным выражением по индексу, а не сканированием
+    коллекции регистронезависимым $regex.
+    """
+    value = (value or '').lower().replace('ё', 'е')
+    return re.sub(r'\s+', ' ', value).strip()
+
+def prefix_query(value):
+    """Условие поиска по началу ключа имени (использует индекс)"""
+    return {'$regex': '^' + re.escape(normalize_name(value))}
+
+def build_person(form, prefix):
+    """Отправитель или получатель посылки из данных формы"""
+    full_name = form[f'{prefix}_name'].strip()
+    return {
+        'full_name': full_name,
+        'name_key': normalize_name(full_name),
+        'address': form[f'{prefix}_address'].strip(),
+        'passport': {
+            'series': form[f'{prefix}_passport_series'].strip(),
+            'number': form[f'{prefix}_passport_number'].strip(),
+            'birth_date': form[f'{prefix}_birth_date'],
+            'gender': form[f'{prefix}_gender']
+        }
+    }
+
+def build_parcel(form, actual_delivery_date=None):
+    """Документ посылки из данных формы (без служебных полей created_at, tracking_number)"""
+    courier_name = form['courier_name'].strip()
+    return {
+        'sender': build_person(form, 'sender'),
+        'receiver': build_person(form, 'receiver'),
+        'parcel': {
+            'weight': float(form['weight']),
+            'dimensions': {
+                'length': float(form['length']),
+                'width': float(form['width']),
+                'height': float(form['height'])
+            },
+            'description': form.get('description', '').strip(),
+            'fragile': form.get('fragile') == 'on',
+            'insured': form.get('insured') == 'on'
+        },
+        'courier': {
+            'name': courier_name,
+            'name_key': normalize_name(courier_name),
+            'phone': form['courier_phone'].strip(),
+            'vehicle': form.get('courier_vehicle', '').strip(),
+            'company': form.get('courier_company', '').strip()
+        },
+        'dates': {
+            'dispatch_date': form['dispatch_date'],
+            'delivery_date': form['delivery_date'],
+            'actual_delivery_date': actual_delivery_date
+        },
+        'status': form['status'],
+        'delivery_cost': float(form.get('delivery_cost', 0))
+    }
+
+def parcel_form_data(parcel):
+    """Поля формы редактирования из документа посылки"""
+    return {
+        '_id': str(parcel['_id']),
+        'sender_name': parcel['sender']['full_name'],
+        'sender_address': parcel['sender']['address'],
+        'sender_passport_series': parcel['sender']['passport']['series'],
+        'sender_passport_number': parcel['sender']['passport']['number'],
+        'sender_birth_date': parcel['sender']['passport']['birth_date'],
+        'sender_gender': parcel['sender']['passport']['gender'],
+        'receiver_name': parcel['receiver']['full_name'],
+        'receiver_address': parcel['receiver']['address'],
+        'receiver_passport_series': parcel['receiver']['passport']['series'],
+        'receiver_passport_number': parcel['receiver']['passport']['number'],
+        'receiver_birth_date': parcel['receiver']['passport']['birth_date'],
+        'receiver_gender': parcel['receiver']['passport']['gender'],
+        'weight': parcel['parcel']['weight'],
+        'length': parcel['parcel']['dimensions']['length'],
+        'width': parcel['parcel']['dimensions']['width'],
+        'height': parcel['parcel']['dimensions']['height'],
+        'description': parcel['parcel'].get('description', ''),
+        'fragile': parcel['parcel'].get('fragile', False),
+        'insured': parcel['parcel'].get('insured', False),
+        'courier_name': parcel['courier']['name'],
+        'courier_phone': parcel['courier']['phone'],
+        'courier_vehicle': parcel['courier'].get('vehicle', ''),
+        'courier_company': parcel['courier'].get('company', ''),
+        'dispatch_date': parcel['dates']['dispatch_date'],
+        'delivery_date': parcel['dates']['delivery_date'],
+        'delivery_cost': parcel.get('delivery_cost', 0),
+        'status': parcel['status'],
+        'version': document_version(parcel)
+    }
+
+def course_form_data(course):
+    """Поля формы редактирования из документа курса"""
+    form_data = {
+        '_id': str(course['_id']),
+        'course_name': course['course_name'],
+        'teacher_name': course['teacher']['name'],
+        'teacher_department': course['teacher']['department'],
+        'teacher_qualification': course['teacher'].get('qualification', ''),
+        'teacher_email': course['teacher'].get('email', ''),
+        'teacher_phone': course['teacher'].get('phone', ''),
+        'start_date': course['dates']['start_date'],
+        'end_date': course['dates']['end_date'],
+        'registration_deadline': course['dates'].get('registration_deadline', ''),
+        'hours': course['hours'],
+        'price': course.get('price', 0),
+        'location': course.get('location', ''),
+        'max_participants': course.get('max_participants', 30),
+        'status': course['status'],
+        'description': course.get('description', ''),
+        'category': course.get('category', 'Общий'),
+        'version': document_version(course)
+    }
+
+    # Данные сотрудников
+    for i, emp in enumerate(course.get('employees', []), 1):
+        form_data[f'employee_{i}_name'] = emp.get('name', '')
+        form_data[f'employee_{i}_position'] = emp.get('position', '')
+        form_data[f'employee_{i}_department'] = emp.get('department', '')
+        form_data[f'employee_{i}_email'] = emp.get('email', '')
+    return form_data
+
+# Статус, при переходе в который проставляется фактическая дата доставки
+DELIVERED_STATUS = 'Доставлено'
+
+def actual_delivery_date(parcel, status):
+    """Фактическая дата доставки посылки после смены статуса на status"""
+    if status == DELIVERED_STATUS and parcel.get('status') != DELIVERED_STATUS:
+        return datetime.now().strftime('%Y-%m-%d')
+    return (parcel.get('dates') or {}).get('actual_delivery_date')
+
+def build_employees(form):
+    """До 3 сотрудников из данных формы"""
+    employees = []
+    for i in range(1, 4):
+        emp_name = form.get(f'employee_{i}_name', '').strip()
+        emp_position = form.get(f'employee_{i}_position', '').strip()
+        emp_department = form.get(f'employee_{i}_department', '').strip()
+        emp_email = form.get(f'employee_{i}_email', '').strip()
+        if emp_name and emp_position:
+            employees.append({
+                'name': emp_name,
+                'name_key': normalize_name(emp_name),
+                'position': emp_position,
+                'department': emp_department,
+                'email': emp_email
+            })
+    return employees
+
+def build_course(form):
+    """Документ курса из данных формы (без служебных полей course_code, created_at)"""
+    teacher_name = form['teacher_name'].strip()
+    return {
+        'course_name': form['course_name'].strip(),
+        'teacher': {
+            'name': teacher_name,
+            'name_key': normalize_name(teacher_name),
+            'department': form['teacher_department'].strip(),
+            'qualification': form.get('teacher_qualification', '').strip(),
+            'email': form.get('teacher_email', '').strip(),
+            'phone': form.get('teacher_phone', '').strip()
+        },
+        'dates': {
+            'start_date': form['start_date'],
+            'end_date': form['end_date'],
+            'registration_deadline': form.get('registration_deadline', '')
+        },
+        'hours': int(form['hours']),
+        'price': float(form.get('price', 0)),
+        'location': form.get('location', '').strip(),
+        'max_participants': int(form.get('max_participants', 30)),
+        'employees': build_employees(form),
+        'status': form['status'],
+        'description': form.get('description', '').strip(),
+        'category': form.get('category', 'Общий').strip()
+    }
+
+def parcel_name_keys(parcel):
+    """Ключи имен посылки для документов, сохраненных до их появления"""
+    keys = {}
+    for field, name_field in (('sender', 'full_name'), ('receiver', 'full_name'), ('courier', 'name')):
+        if isinstance(parcel.get(field), dict):
+            keys[f'{field}.name_key'] = normalize_name(parcel[field].get(name_field))
+    return keys
+
+def course_name_keys(course):
+    """Ключи имен курса для документов, сохраненных до их появления"""
+    keys = {}
+    if isinstance(course.get('teacher'), dict):
+        keys['teacher.name_key'] = normalize_name(course['teacher'].get('name'))
+    for i, employee in enumerate(course.get('employees', [])):
+        keys[f'employees.{i}.name_key'] = normalize_name(employee.get('name'))
+    return keys
+
+def backfill_name_keys(collection, missing_field, name_keys, batch_size=1000):
+    """Заполнение ключей имен у документов, где их еще нет. Возвращает число обновленных документов"""
+    updated = 0
+    batch = []
+    for document in collection.find({missing_field: {'$exists': False}}):
+        batch.append(UpdateOne({'_id': document['_id']}, {'$set': name_keys(document)}))
+        if len(batch) >= batch_size:
+            updated += collection.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    if batch:
+        updated += collection.bulk_write(batch, ordered=False).modified_count
+    return updated
+
+# Поле версии документа для оптимистической блокировки при редактировании
+VERSION_FIELD = 'version'
+
+def document_version(document):
+    """Версия документа (у документов, сохраненных до появления версий, - 0)"""
+    return (document or {}).get(VERSION_FIELD, 0)
+
+def version_query(version):
+    """Условие на версию документа для фильтра обновления"""
+    if version == 0:
+        return {'$in': [0, None]}
+    return version
+
+def changed_fields(document, update, prefix=''):
+    """Измененные поля update относительно document: {путь через точку: новое значение}.
+
+    Вложенные словари сравниваются по полям, списки и остальные значения -
+    целиком. Поля, которых нет в update, не считаются измененными.
+    """
+    changes = {}
+    for field, value in update.items():
+        path = prefix + field
+        if field not in document:
+            changes[path] = value
+        elif isinstance(value, dict) and isinstance(document[field], dict):
+            changes.update(changed_fields(document[field], value, path + '.'))
+        elif value != document[field]:
+            changes[path] = value
+    return changes
+
+def update_changed_fields(collection, document, update, version):
+    """Запись только измененных полей документа с проверкой версии.
+
+    version - версия документа, которую видел пользователь. Возвращает
+    записанные изменения ({} - изменений нет, запись не выполнялась) или
+    None, если документ за это время изменен другим пользователем.
+    """
+    if document_version(document) != version:
+        return None
+    changes = changed_fields(document, update)
+    if not changes:
+        return changes
+    changes['updated_at'] = datetime.now()
+    result = collection.update_one({'_id': document['_id'], VERSION_FIELD: version_query(version)},
+                                   {'$set': changes, '$inc': {VERSION_FIELD: 1}})
+    if result.matched_count == 0:
+        return None
+    return changes
+
+def form_version(form, document):
+    """Версия документа из скрытого поля формы (без поля - текущая версия документа)"""
+    try:
+        return int(form['version'])
+    except (KeyError, TypeError, ValueError):
+        return document_version(document)
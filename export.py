@@ -1,8 +1,8 @@
-from io import BytesIO
+from io import BytesIO, StringIO
 from datetime import datetime
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4, letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Flowable
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch, cm
 from reportlab.pdfgen import canvas
@@ -14,6 +14,16 @@ from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.enum.table import WD_TABLE_ALIGNMENT
 from docx.enum.style import WD_STYLE_TYPE
 import os
+import csv
+import json
+import threading
+from functools import cached_property
+from itertools import islice
+
+# Число строк в таблице отчета при обычном экспорте (фоновый экспорт jobs.py
+# может выгружать отчет целиком) и в таблице упрощенного PDF
+TABLE_ROWS = 20
+SIMPLE_TABLE_ROWS = 10
 
 # Регистрируем шрифты для поддержки кириллицы
 def register_fonts():
@@ -21,6 +31,7 @@ def register_fonts():
     try:
         # Попробуем найти стандартные шрифты с кириллицей
         font_paths = [
+            os.environ.get('EXPORT_FONT_PATH', ''),  # Явно заданный шрифт (без перебора путей)
             'C:/Windows/Fonts/arial.ttf',  # Windows
             'C:/Windows/Fonts/times.ttf',
             '/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf',  # Linux
@@ -43,82 +54,145 @@ def register_fonts():
     except:
         return False
 
-# Регистрируем шрифты при импорте модуля
-fonts_registered = register_fonts()
+def pdf_document(output, context):
+    """Шаблон PDF-документа A4 (output - буфер или путь к файлу)"""
+    if context.fonts_registered:
+        return SimpleDocTemplate(output, pagesize=A4,
+                                 rightMargin=72, leftMargin=72,
+                                 topMargin=72, bottomMargin=72,
+                                 fontName='Arial')
+    return SimpleDocTemplate(output, pagesize=A4,
+                             rightMargin=72, leftMargin=72,
+                             topMargin=72, bottomMargin=72)
+
+def pdf_styles(fonts_registered):
+    """Стили заголовка, подзаголовка и текста отчета"""
+    styles = getSampleStyleSheet()
+
+    # Создаем кастомные стили с учетом кириллицы
+    if fonts_registered:
+        title_style = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontName='Arial-Bold',
+            fontSize=16,
+            spaceAfter=30,
+            alignment=1,  # Center
+            textColor=colors.HexColor('#2C3E50')
+        )
+
+        subtitle_style = ParagraphStyle(
+            'CustomSubtitle',
+            parent=styles['Heading2'],
+            fontName='Arial-Bold',
+            fontSize=12,
+            spaceAfter=20,
+            textColor=colors.HexColor('#34495E')
+        )
+
+        normal_style = ParagraphStyle(
+            'CustomNormal',
+            parent=styles['Normal'],
+            fontName='Arial',
+            fontSize=10,
+            spaceAfter=10
+        )
+    else:
+        # Используем стандартные шрифты если Arial не доступен
+        title_style = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=16,
+            spaceAfter=30,
+            alignment=1,
+            textColor=colors.HexColor('#2C3E50')
+        )
+
+        subtitle_style = ParagraphStyle(
+            'CustomSubtitle',
+            parent=styles['Heading2'],
+            fontSize=12,
+            spaceAfter=20,
+            textColor=colors.HexColor('#34495E')
+        )
+
+        normal_style = ParagraphStyle(
+            'CustomNormal',
+            parent=styles['Normal'],
+            fontSize=10,
+            spaceAfter=10
+        )
+
+    return title_style, subtitle_style, normal_style
+
+def data_table_style(fonts_registered):
+    """Стиль таблицы данных отчета"""
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3498DB')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold' if not fonts_registered else 'Arial-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#F8F9FA')),
+        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#DEE2E6')),
+        ('FONTSIZE', (0, 1), (-1, -1), 9),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F2F2F2')]),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica' if not fonts_registered else 'Arial'),
+    ])
 
-def export_to_pdf(reports_data, report_type, report_name):
+def docx_template():
+    """Пустой DOCX-документ с настроенными стилями (байты)"""
+    doc = Document()
+    style = doc.styles['Normal']
+    style.font.name = 'Times New Roman'
+    style.font.size = Pt(11)
+    buffer = BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+class RenderContext:
+    """Оформление экспорта: стили PDF, стиль таблицы и шаблон DOCX.
+
+    Объекты только читаются при построении документов, поэтому один
+    контекст используется всеми запросами процесса (get_render_context).
+    """
+
+    def __init__(self, fonts_registered):
+        self.fonts_registered = fonts_registered
+        self.title_style, self.subtitle_style, self.normal_style = pdf_styles(fonts_registered)
+        self.table_style = data_table_style(fonts_registered)
+
+    @cached_property
+    def docx_template(self):
+        # Строится при первом экспорте в DOCX
+        return docx_template()
+
+render_context = None
+render_context_lock = threading.Lock()
+
+def get_render_context():
+    """Контекст оформления процесса: шрифты регистрируются и стили строятся при первом экспорте"""
+    global render_context
+    if render_context is None:
+        with render_context_lock:
+            if render_context is None:
+                render_context = RenderContext(register_fonts())
+    return render_context
+
+def export_to_pdf(reports_data, report_type, report_name, max_rows=TABLE_ROWS, context=None):
     """Экспорт отчета в PDF"""
     try:
+        context = context or get_render_context()
         buffer = BytesIO()
         
         # Создаем документ с указанием шрифта по умолчанию
-        if fonts_registered:
-            doc = SimpleDocTemplate(buffer, pagesize=A4, 
-                                  rightMargin=72, leftMargin=72,
-                                  topMargin=72, bottomMargin=72,
-                                  fontName='Arial')
-        else:
-            doc = SimpleDocTemplate(buffer, pagesize=A4, 
-                                  rightMargin=72, leftMargin=72,
-                                  topMargin=72, bottomMargin=72)
+        doc = pdf_document(buffer, context)
         
         elements = []
         
-        styles = getSampleStyleSheet()
-        
-        # Создаем кастомные стили с учетом кириллицы
-        if fonts_registered:
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontName='Arial-Bold',
-                fontSize=16,
-                spaceAfter=30,
-                alignment=1,  # Center
-                textColor=colors.HexColor('#2C3E50')
-            )
-            
-            subtitle_style = ParagraphStyle(
-                'CustomSubtitle',
-                parent=styles['Heading2'],
-                fontName='Arial-Bold',
-                fontSize=12,
-                spaceAfter=20,
-                textColor=colors.HexColor('#34495E')
-            )
-            
-            normal_style = ParagraphStyle(
-                'CustomNormal',
-                parent=styles['Normal'],
-                fontName='Arial',
-                fontSize=10,
-                spaceAfter=10
-            )
-        else:
-            # Используем стандартные шрифты если Arial не доступен
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=16,
-                spaceAfter=30,
-                alignment=1,
-                textColor=colors.HexColor('#2C3E50')
-            )
-            
-            subtitle_style = ParagraphStyle(
-                'CustomSubtitle',
-                parent=styles['Heading2'],
-                fontSize=12,
-                spaceAfter=20,
-                textColor=colors.HexColor('#34495E')
-            )
-            
-            normal_style = ParagraphStyle(
-                'CustomNormal',
-                parent=styles['Normal'],
-                fontSize=10,
-                spaceAfter=10
-            )
+        title_style, subtitle_style, normal_style = context.title_style, context.subtitle_style, context.normal_style
         
         # Заголовок отчета
         title = f"ОТЧЕТ: {get_report_title(report_type, report_name)}"
@@ -130,32 +204,13 @@ def export_to_pdf(reports_data, report_type, report_name):
         elements.append(Spacer(1, 20))
         
         # Данные отчета
-        if report_type == 'courier':
-            data_table = prepare_courier_table(reports_data, report_name)
-        else:
-            data_table = prepare_course_table(reports_data, report_name)
+        data_table = prepare_report_table(reports_data, report_type, report_name, max_rows=max_rows)
         
         if data_table:
             # Создаем таблицу с данными
             table = Table(data_table, colWidths=[doc.width/len(data_table[0])] * len(data_table[0]))
             
-            # Стили для таблицы
-            table_style = TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3498DB')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold' if not fonts_registered else 'Arial-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#F8F9FA')),
-                ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#DEE2E6')),
-                ('FONTSIZE', (0, 1), (-1, -1), 9),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F2F2F2')]),
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica' if not fonts_registered else 'Arial'),
-            ])
-            
-            table.setStyle(table_style)
+            table.setStyle(context.table_style)
             elements.append(table)
             elements.append(Spacer(1, 30))
             
@@ -179,7 +234,9 @@ def export_to_pdf(reports_data, report_type, report_name):
         except Exception as build_error:
             print(f"Ошибка при сборке PDF: {build_error}")
             # Попробуем альтернативный метод с простым текстом
-            return export_to_pdf_simple(reports_data, report_type, report_name)
+            # (при обычном экспорте упрощенный PDF показывает меньше строк)
+            simple_rows = SIMPLE_TABLE_ROWS if max_rows == TABLE_ROWS else max_rows
+            return export_to_pdf_simple(reports_data, report_type, report_name, simple_rows)
         
         buffer.seek(0)
         return buffer.getvalue()
@@ -187,7 +244,7 @@ def export_to_pdf(reports_data, report_type, report_name):
         print(f"Ошибка при генерации PDF: {e}")
         return None
 
-def export_to_pdf_simple(reports_data, report_type, report_name):
+def export_to_pdf_simple(reports_data, report_type, report_name, max_rows=SIMPLE_TABLE_ROWS):
     """Простой экспорт PDF (запасной вариант)"""
     try:
         buffer = BytesIO()
@@ -207,10 +264,7 @@ def export_to_pdf_simple(reports_data, report_type, report_name):
         
         # Данные
         y_position = 730
-        if report_type == 'courier':
-            data = prepare_courier_table_simple(reports_data, report_name)
-        else:
-            data = prepare_course_table_simple(reports_data, report_name)
+        data = prepare_report_table(reports_data, report_type, report_name, simple=True, max_rows=max_rows)
         
         if data:
             c.setFont("Helvetica-Bold", 10)
@@ -221,8 +275,8 @@ def export_to_pdf_simple(reports_data, report_type, report_name):
             y_position -= 20
             c.setFont("Helvetica", 9)
             
-            # Данные (ограничиваем количество строк)
-            for row in data[1:20]:  # Максимум 20 строк
+            # Данные (количество строк ограничено в prepare_report_table)
+            for row in data[1:]:
                 if y_position < 50:
                     c.showPage()
                     y_position = 750
@@ -232,6 +286,15 @@ def export_to_pdf_simple(reports_data, report_type, report_name):
                     cell_text = str(cell)[:15]  # Обрезаем длинный текст
                     c.drawString(100 + i * 100, y_position, cell_text)
                 y_position -= 15
+
+            # Сообщаем, если показаны не все строки отчета
+            total_rows = len(get_report_data(reports_data, report_type, report_name) or [])
+            if len(data) - 1 < total_rows:
+                if y_position < 50:
+                    c.showPage()
+                    y_position = 750
+                c.setFont("Helvetica", 9)
+                c.drawString(100, y_position - 5, f"Показано строк: {len(data) - 1} из {total_rows}")
         
         c.save()
         buffer.seek(0)
@@ -240,70 +303,170 @@ def export_to_pdf_simple(reports_data, report_type, report_name):
         print(f"Ошибка при генерации простого PDF: {e}")
         return None
 
-def prepare_courier_table_simple(reports_data, report_name):
-    """Простая подготовка таблицы для курьерской доставки"""
-    if report_name not in reports_data['courier_reports']:
-        return None
-    
-    data = reports_data['courier_reports'][report_name]
-    
-    if not data:
-        return [['Нет данных']]
-    
-    if report_name == 'courier_stats':
-        return [
-            ['Курьер', 'Кол-во', 'Вес (кг)'],
-            *[[str(item.get('_id', 'Не указан'))[:10], 
-               str(item.get('count', 0)),
-               f"{item.get('total_weight', 0):.1f}"] for item in data[:10]]
-        ]
-    elif report_name == 'heavy_parcels':
-        return [
-            ['Отправитель', 'Получатель', 'Вес'],
-            *[[str(item['sender']['full_name'])[:10],
-               str(item['receiver']['full_name'])[:10],
-               f"{item['parcel']['weight']:.1f}"] for item in data[:10]]
-        ]
-    
-    return [['Данные недоступны']]
+# ---------- Потоковый PDF для больших отчетов ----------
 
-def prepare_course_table_simple(reports_data, report_name):
-    """Простая подготовка таблицы для курсов"""
-    if report_name not in reports_data['courses_reports']:
-        return None
-    
-    data = reports_data['courses_reports'][report_name]
-    
-    if not data:
-        return [['Нет данных']]
-    
-    if report_name == 'department_stats':
-        return [
-            ['Отдел', 'Сотрудники', 'Курсы'],
-            *[[str(item.get('department', 'Не указан'))[:10],
-               str(item.get('employee_count', 0)),
-               str(item.get('course_count', 0))] for item in data[:10]]
-        ]
-    elif report_name in ['upcoming_courses', 'long_courses']:
-        return [
-            ['Курс', 'Преподаватель', 'Часы'],
-            *[[str(item['course_name'])[:10],
-               str(item['teacher']['name'])[:10],
-               str(item['hours'])] for item in data[:10]]
-        ]
-    
-    return [['Данные недоступны']]
+# Количество документов отчета, которые читаются из курсора за раз
+PDF_STREAM_BATCH_SIZE = 500
+
+def chunked(items, size):
+    """Элементы итератора списками по size штук"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+class FlowableStream(list):
+    """Список flowables для doc.build, который пополняется из генератора.
+
+    Элементы запрашиваются у генератора только тогда, когда они нужны
+    сборщику документа, поэтому весь документ в памяти не хранится.
+    """
+
+    def __init__(self, source):
+        super().__init__()
+        self._source = iter(source)
+        self._exhausted = False
+
+    def _fill(self, size):
+        while list.__len__(self) < size and not self._exhausted:
+            try:
+                self.append(next(self._source))
+            except StopIteration:
+                self._exhausted = True
+
+    def __len__(self):
+        self._fill(1)
+        return list.__len__(self)
+
+    def __getitem__(self, index):
+        self._fill(index + 1 if isinstance(index, int) and index >= 0 else 1)
+        return list.__getitem__(self, index)
+
+class TableStream(Flowable):
+    """Таблица, строки которой берутся из итератора по мере заполнения страниц.
+
+    Для каждой страницы создается отдельная таблица с заголовком и таким
+    числом строк, которое помещается на странице.
+    """
+
+    def __init__(self, header, rows, col_widths, style):
+        super().__init__()
+        self.header = header
+        self.rows = iter(rows)
+        self.col_widths = col_widths
+        self.style = style
+        self.pending = next(self.rows, None)
+        self.header_height = None
+        self.row_height = None
+
+    def _measure(self, width, height):
+        # Ячейки - короткие строки без переноса, поэтому все строки одной высоты
+        one_row = Table([self.header, self.pending], colWidths=self.col_widths, style=self.style)
+        two_rows = Table([self.header, self.pending, self.pending], colWidths=self.col_widths, style=self.style)
+        one_height = one_row.wrap(width, height)[1]
+        self.row_height = two_rows.wrap(width, height)[1] - one_height
+        self.header_height = one_height - self.row_height
+
+    def wrap(self, availWidth, availHeight):
+        if self.pending is None:
+            return 0, 0
+        # Таблица всегда "не помещается" целиком и размещается через split
+        return availWidth, availHeight + 1
+
+    def split(self, availWidth, availHeight):
+        if self.pending is None:
+            return []
+        if self.row_height is None:
+            self._measure(availWidth, availHeight)
+        count = int((availHeight - self.header_height) / self.row_height - 0.01)
+        if count < 1:
+            return []
+
+        rows = [self.pending, *islice(self.rows, count - 1)]
+        self.pending = next(self.rows, None)
+        # Признак "не поместилось на прошлой странице" сбрасываем, раз часть размещена
+        self.__dict__.pop('_postponed', None)
+
+        table = Table([self.header] + rows, colWidths=self.col_widths, repeatRows=1, style=self.style)
+        return [table, self] if self.pending is not None else [table]
+
+    def draw(self):
+        pass
+
+class ReportRows:
+    """Строки таблицы отчета из документов с накоплением итогов для статистики"""
+
+    def __init__(self, documents, report_type, report_name, batch_size=PDF_STREAM_BATCH_SIZE):
+        self.documents = documents
+        self.report_type = report_type
+        self.report_name = report_name
+        self.batch_size = batch_size
+        self.table = REPORT_EXPORTS.get((report_type, report_name), {}).get('table')
+        self.totals = get_report_totals(report_type, report_name, [])
+
+    def header(self):
+        return self.table([])[0]
+
+    def __iter__(self):
+        for batch in chunked(self.documents, self.batch_size):
+            self.totals = get_report_totals(self.report_type, self.report_name, batch, self.totals)
+            yield from self.table(batch)[1:]
+
+def export_to_pdf_stream(documents, report_type, report_name, output, batch_size=PDF_STREAM_BATCH_SIZE,
+                         context=None):
+    """Экспорт отчета в PDF без ограничения числа строк.
+
+    documents - документы отчета (например, курсор MongoDB), они читаются
+    пакетами по batch_size по мере заполнения страниц. output - путь
+    к файлу или буфер. Возвращает число страниц.
+    """
+    context = context or get_render_context()
+    doc = pdf_document(output, context)
+    title_style, subtitle_style, normal_style = context.title_style, context.subtitle_style, context.normal_style
+    rows = ReportRows(documents, report_type, report_name, batch_size)
+
+    def flowables():
+        yield Paragraph(f"ОТЧЕТ: {get_report_title(report_type, report_name)}", title_style)
+        yield Paragraph(f"<b>Дата генерации:</b> {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}", normal_style)
+        yield Paragraph(f"<b>Тип отчета:</b> {report_type.upper()}", normal_style)
+        yield Spacer(1, 20)
+
+        table = None
+        if rows.table is not None:
+            header = rows.header()
+            table = TableStream(header, rows, [doc.width / len(header)] * len(header), context.table_style)
+        if table is None or table.pending is None:
+            yield Paragraph("<b>Нет данных для отображения</b>", normal_style)
+            return
+
+        yield table
+        yield Spacer(1, 30)
+
+        # Генератор продолжается только после размещения всех строк таблицы,
+        # поэтому итоги к этому моменту посчитаны по всему отчету
+        yield Paragraph("<b>СТАТИСТИКА</b>", subtitle_style)
+        for stat in format_statistics(report_type, report_name, rows.totals):
+            stat_escaped = stat.replace('°', 'градусов').replace('±', '+-')
+            yield Paragraph(f"• {stat_escaped}", normal_style)
+
+        yield Spacer(1, 50)
+        yield Paragraph("___________________________", normal_style)
+        yield Paragraph("<i>Генератор отчетов</i>", normal_style)
+
+    doc.build(FlowableStream(flowables()))
+    return doc.page
 
 # Остальные функции оставляем без изменений...
-def export_to_docx(reports_data, report_type, report_name):
+def export_to_docx(reports_data, report_type, report_name, max_rows=TABLE_ROWS, context=None):
     """Экспорт отчета в DOCX"""
     try:
-        doc = Document()
-        
-        # Настройка стилей
-        style = doc.styles['Normal']
-        style.font.name = 'Times New Roman'
-        style.font.size = Pt(11)
+        context = context or get_render_context()
+        # Документ из шаблона с уже настроенными стилями
+        doc = Document(BytesIO(context.docx_template))
         
         # Заголовок
         title = doc.add_heading(f'ОТЧЕТ: {get_report_title(report_type, report_name)}', 0)
@@ -315,10 +478,7 @@ def export_to_docx(reports_data, report_type, report_name):
         doc.add_paragraph()
         
         # Данные отчета
-        if report_type == 'courier':
-            data = prepare_courier_table(reports_data, report_name)
-        else:
-            data = prepare_course_table(reports_data, report_name)
+        data = prepare_report_table(reports_data, report_type, report_name, max_rows=max_rows)
         
         if data:
             # Создаем таблицу
@@ -360,158 +520,405 @@ def export_to_docx(reports_data, report_type, report_name):
         print(f"Ошибка при генерации DOCX: {e}")
         return None
 
+# Реестр экспорта: (тип отчета, имя отчета) -> заголовок, подготовка таблиц и статистика.
+# Ключи совпадают с реестром отчетов reports.REPORTS.
+REPORT_EXPORTS = {}
+
+# Раздел reports_data для каждого типа отчета
+REPORT_SECTIONS = {
+    'courier': 'courier_reports',
+    'courses': 'courses_reports'
+}
+
+def register_export(report_type, report_name, title, table=None, simple_table=None,
+                    totals=None, statistics=None):
+    """Регистрация заголовка, таблиц и статистики отчета для экспорта.
+
+    totals(data) считает итоги по части строк (итоги частей складываются,
+    поэтому их можно накапливать при потоковой выгрузке), statistics(totals)
+    превращает итоги в строки раздела статистики.
+    """
+    REPORT_EXPORTS[(report_type, report_name)] = {
+        'title': title,
+        'table': table,
+        'simple_table': simple_table,
+        'totals': totals,
+        'statistics': statistics
+    }
+
 def get_report_title(report_type, report_name):
     """Получение заголовка отчета"""
-    titles = {
-        'courier': {
-            'heavy_parcels': 'Тяжелые посылки (>5 кг)',
-            'in_transit': 'Посылки в пути',
-            'last_week': 'Посылки за последнюю неделю',
-            'by_sender': 'Посылки по отправителям',
-            'courier_stats': 'Статистика по курьерам',
-            'all': 'Все посылки'
-        },
-        'courses': {
-            'upcoming_courses': 'Предстоящие курсы',
-            'long_courses': 'Длительные курсы (>40 часов)',
-            'by_teacher': 'Курсы по преподавателям',
-            'full_courses': 'Курсы с полными группами',
-            'department_stats': 'Статистика по отделам',
-            'all': 'Все курсы'
-        }
-    }
-    return titles.get(report_type, {}).get(report_name, 'Общий отчет')
+    entry = REPORT_EXPORTS.get((report_type, report_name))
+    return entry['title'] if entry else 'Общий отчет'
 
-def prepare_courier_table(reports_data, report_name):
-    """Подготовка таблицы данных для курьерской доставки"""
-    if report_name not in reports_data['courier_reports']:
-        return None
-    
-    data = reports_data['courier_reports'][report_name]
-    
-    if not data:
-        return [['Нет данных для отображения']]
-    
-    if report_name == 'courier_stats':
-        return [
-            ['Курьер', 'Количество посылок', 'Общий вес (кг)', 'Средний вес'],
-            *[[str(item.get('_id', 'Не указан'))[:20], 
-               str(item.get('count', 0)), 
-               f"{item.get('total_weight', 0):.2f}",
-               f"{item.get('total_weight', 0)/item.get('count', 1):.2f}" if item.get('count', 0) > 0 else "0.00"] 
-              for item in data]
-        ]
-    elif report_name == 'heavy_parcels':
-        return [
-            ['Трек №', 'Отправитель', 'Получатель', 'Вес (кг)', 'Статус', 'Дата отправки'],
-            *[[item.get('tracking_number', 'N/A'),
-               str(item['sender']['full_name'])[:15],
-               str(item['receiver']['full_name'])[:15],
-               f"{item['parcel']['weight']:.2f}",
-               item['status'],
-               item['dates']['dispatch_date']] for item in data[:20]]
-        ]
-    elif report_name == 'in_transit':
-        return [
-            ['Трек №', 'Отправитель', 'Получатель', 'Курьер', 'Ожидаемая дата', 'Стоимость'],
-            *[[item.get('tracking_number', 'N/A'),
-               str(item['sender']['full_name'])[:12],
-               str(item['receiver']['full_name'])[:12],
-               str(item['courier']['name'])[:12],
-               item['dates']['delivery_date'],
-               f"{item.get('delivery_cost', 0):.2f} руб."] for item in data[:20]]
-        ]
-    elif report_name == 'last_week':
-        return [
-            ['Трек №', 'Отправитель', 'Статус', 'Дата отправки', 'Дата получения', 'Вес (кг)'],
-            *[[item.get('tracking_number', 'N/A'),
-               str(item['sender']['full_name'])[:15],
-               item['status'],
-               item['dates']['dispatch_date'],
-               item['dates'].get('actual_delivery_date', 'Не доставлено'),
-               f"{item['parcel']['weight']:.2f}"] for item in data[:20]]
-        ]
-    
-    return None
+def get_report_data(reports_data, report_type, report_name):
+    """Данные отчета из reports_data (None, если отчета нет)"""
+    section = reports_data.get(REPORT_SECTIONS.get(report_type), {})
+    return section.get(report_name)
+
+def prepare_report_table(reports_data, report_type, report_name, simple=False, max_rows=TABLE_ROWS):
+    """Подготовка таблицы данных отчета (simple=True - для упрощенного PDF).
 
-def prepare_course_table(reports_data, report_name):
-    """Подготовка таблицы данных для курсов"""
-    if report_name not in reports_data['courses_reports']:
+    max_rows - число строк таблицы (None - все строки отчета).
+    """
+    data = get_report_data(reports_data, report_type, report_name)
+    if data is None:
         return None
-    
-    data = reports_data['courses_reports'][report_name]
-    
+
     if not data:
-        return [['Нет данных для отображения']]
-    
-    if report_name == 'department_stats':
-        return [
-            ['Отдел', 'Количество сотрудников', 'Количество курсов', 'Среднее кол-во сотрудников'],
-            *[[str(item.get('department', 'Не указан'))[:20], 
-               str(item.get('employee_count', 0)), 
-               str(item.get('course_count', 0)),
-               f"{item.get('employee_count', 0)/item.get('course_count', 1):.1f}" if item.get('course_count', 0) > 0 else "0.0"] 
-              for item in data]
-        ]
-    elif report_name in ['upcoming_courses', 'long_courses', 'full_courses']:
-        return [
-            ['Код курса', 'Название курса', 'Преподаватель', 'Даты', 'Часы', 'Стоимость', 'Участников'],
-            *[[item.get('course_code', 'N/A'),
-               str(item['course_name'])[:20],
-               str(item['teacher']['name'])[:15],
-               f"{item['dates']['start_date']} - {item['dates']['end_date']}",
-               str(item['hours']),
-               f"{item.get('price', 0):.2f} руб.",
-               str(len(item.get('employees', [])))] for item in data[:20]]
-        ]
-    
-    return None
+        return [['Нет данных']] if simple else [['Нет данных для отображения']]
+
+    entry = REPORT_EXPORTS.get((report_type, report_name), {})
+    prepare = entry.get('simple_table' if simple else 'table')
+    if prepare is None:
+        return [['Данные недоступны']] if simple else None
+    return prepare(data[:max_rows] if max_rows else data)
 
 def get_report_statistics(reports_data, report_type, report_name):
     """Получение статистики по отчету"""
-    stats = []
-    
-    if report_type == 'courier':
-        data = reports_data['courier_reports'].get(report_name, [])
-        if report_name == 'courier_stats':
-            total_parcels = sum(item.get('count', 0) for item in data)
-            total_weight = sum(item.get('total_weight', 0) for item in data)
-            avg_weight = total_weight / total_parcels if total_parcels > 0 else 0
-            stats.extend([
-                f"Всего курьеров: {len(data)}",
-                f"Общее количество посылок: {total_parcels}",
-                f"Общий вес всех посылок: {total_weight:.2f} кг",
-                f"Средний вес посылки: {avg_weight:.2f} кг"
-            ])
-        else:
-            stats.append(f"Количество записей: {len(data)}")
-            if data:
-                total_weight = sum(item.get('parcel', {}).get('weight', 0) for item in data)
-                stats.append(f"Общий вес: {total_weight:.2f} кг")
-    
-    elif report_type == 'courses':
-        data = reports_data['courses_reports'].get(report_name, [])
-        if report_name == 'department_stats':
-            total_employees = sum(item.get('employee_count', 0) for item in data)
-            total_courses = sum(item.get('course_count', 0) for item in data)
-            avg_employees = total_employees / len(data) if data else 0
-            stats.extend([
-                f"Всего отделов: {len(data)}",
-                f"Общее количество сотрудников: {total_employees}",
-                f"Общее количество курсов: {total_courses}",
-                f"Среднее количество сотрудников на отдел: {avg_employees:.1f}"
-            ])
-        else:
-            stats.append(f"Количество курсов: {len(data)}")
-            if data:
-                total_hours = sum(item.get('hours', 0) for item in data)
-                total_participants = sum(len(item.get('employees', [])) for item in data)
-                total_price = sum(item.get('price', 0) for item in data)
-                stats.extend([
-                    f"Общее количество часов: {total_hours}",
-                    f"Общее количество участников: {total_participants}",
-                    f"Общая стоимость всех курсов: {total_price:.2f} руб.",
-                    f"Средняя стоимость курса: {total_price/len(data):.2f} руб." if data else "0.00 руб."
-                ])
-    
-    return stats
\ No newline at end of file
+    data = get_report_data(reports_data, report_type, report_name) or []
+    return format_statistics(report_type, report_name, get_report_totals(report_type, report_name, data))
+
+def get_report_totals(report_type, report_name, data, totals=None):
+    """Итоги строк data, добавленные к уже накопленным totals"""
+    entry = REPORT_EXPORTS.get((report_type, report_name), {})
+    if entry.get('totals') is None:
+        return totals
+    chunk_totals = entry['totals'](data)
+    if totals is None:
+        return chunk_totals
+    return {field: totals[field] + value for field, value in chunk_totals.items()}
+
+def format_statistics(report_type, report_name, totals):
+    """Строки раздела статистики по итогам отчета"""
+    entry = REPORT_EXPORTS.get((report_type, report_name), {})
+    statistics = entry.get('statistics')
+    return statistics(totals) if statistics and totals is not None else []
+
+# ---------- Таблицы отчетов по курьерской доставке ----------
+
+def courier_stats_table(data):
+    """Таблица статистики по курьерам"""
+    return [
+        ['Курьер', 'Количество посылок', 'Общий вес (кг)', 'Средний вес'],
+        *[[str(item.get('_id', 'Не указан'))[:20], 
+           str(item.get('count', 0)), 
+           f"{item.get('total_weight', 0):.2f}",
+           f"{item.get('total_weight', 0)/item.get('count', 1):.2f}" if item.get('count', 0) > 0 else "0.00"] 
+          for item in data]
+    ]
+
+def courier_stats_table_simple(data):
+    """Упрощенная таблица статистики по курьерам"""
+    return [
+        ['Курьер', 'Кол-во', 'Вес (кг)'],
+        *[[str(item.get('_id', 'Не указан'))[:10], 
+           str(item.get('count', 0)),
+           f"{item.get('total_weight', 0):.1f}"] for item in data]
+    ]
+
+def heavy_parcels_table(data):
+    """Таблица тяжелых посылок"""
+    return [
+        ['Трек №', 'Отправитель', 'Получатель', 'Вес (кг)', 'Статус', 'Дата отправки'],
+        *[[item.get('tracking_number', 'N/A'),
+           str(item['sender']['full_name'])[:15],
+           str(item['receiver']['full_name'])[:15],
+           f"{item['parcel']['weight']:.2f}",
+           item['status'],
+           item['dates']['dispatch_date']] for item in data]
+    ]
+
+def heavy_parcels_table_simple(data):
+    """Упрощенная таблица тяжелых посылок"""
+    return [
+        ['Отправитель', 'Получатель', 'Вес'],
+        *[[str(item['sender']['full_name'])[:10],
+           str(item['receiver']['full_name'])[:10],
+           f"{item['parcel']['weight']:.1f}"] for item in data]
+    ]
+
+def in_transit_table(data):
+    """Таблица посылок в пути"""
+    return [
+        ['Трек №', 'Отправитель', 'Получатель', 'Курьер', 'Ожидаемая дата', 'Стоимость'],
+        *[[item.get('tracking_number', 'N/A'),
+           str(item['sender']['full_name'])[:12],
+           str(item['receiver']['full_name'])[:12],
+           str(item['courier']['name'])[:12],
+           item['dates']['delivery_date'],
+           f"{item.get('delivery_cost', 0):.2f} руб."] for item in data]
+    ]
+
+def last_week_table(data):
+    """Таблица посылок за последнюю неделю"""
+    return [
+        ['Трек №', 'Отправитель', 'Статус', 'Дата отправки', 'Дата получения', 'Вес (кг)'],
+        *[[item.get('tracking_number', 'N/A'),
+           str(item['sender']['full_name'])[:15],
+           item['status'],
+           item['dates']['dispatch_date'],
+           item['dates'].get('actual_delivery_date', 'Не доставлено'),
+           f"{item['parcel']['weight']:.2f}"] for item in data]
+    ]
+
+def courier_stats_totals(data):
+    """Итоги отчета по курьерам"""
+    return {
+        'rows': len(data),
+        'parcels': sum(item.get('count', 0) for item in data),
+        'weight': sum(item.get('total_weight', 0) for item in data)
+    }
+
+def courier_stats_statistics(totals):
+    """Статистика отчета по курьерам"""
+    avg_weight = totals['weight'] / totals['parcels'] if totals['parcels'] > 0 else 0
+    return [
+        f"Всего курьеров: {totals['rows']}",
+        f"Общее количество посылок: {totals['parcels']}",
+        f"Общий вес всех посылок: {totals['weight']:.2f} кг",
+        f"Средний вес посылки: {avg_weight:.2f} кг"
+    ]
+
+def parcels_totals(data):
+    """Итоги отчета по списку посылок"""
+    return {
+        'rows': len(data),
+        'weight': sum(item.get('parcel', {}).get('weight', 0) for item in data)
+    }
+
+def parcels_statistics(totals):
+    """Статистика отчета по списку посылок"""
+    stats = [f"Количество записей: {totals['rows']}"]
+    if totals['rows']:
+        stats.append(f"Общий вес: {totals['weight']:.2f} кг")
+    return stats
+
+# ---------- Таблицы отчетов по курсам ----------
+
+def department_stats_table(data):
+    """Таблица статистики по отделам"""
+    return [
+        ['Отдел', 'Количество сотрудников', 'Количество курсов', 'Среднее кол-во сотрудников'],
+        *[[str(item.get('department', 'Не указан'))[:20], 
+           str(item.get('employee_count', 0)), 
+           str(item.get('course_count', 0)),
+           f"{item.get('employee_count', 0)/item.get('course_count', 1):.1f}" if item.get('course_count', 0) > 0 else "0.0"] 
+          for item in data]
+    ]
+
+def department_stats_table_simple(data):
+    """Упрощенная таблица статистики по отделам"""
+    return [
+        ['Отдел', 'Сотрудники', 'Курсы'],
+        *[[str(item.get('department', 'Не указан'))[:10],
+           str(item.get('employee_count', 0)),
+           str(item.get('course_count', 0))] for item in data]
+    ]
+
+def courses_table(data):
+    """Таблица списка курсов"""
+    return [
+        ['Код курса', 'Название курса', 'Преподаватель', 'Даты', 'Часы', 'Стоимость', 'Участников'],
+        *[[item.get('course_code', 'N/A'),
+           str(item['course_name'])[:20],
+           str(item['teacher']['name'])[:15],
+           f"{item['dates']['start_date']} - {item['dates']['end_date']}",
+           str(item['hours']),
+           f"{item.get('price', 0):.2f} руб.",
+           str(len(item.get('employees', [])))] for item in data]
+    ]
+
+def courses_table_simple(data):
+    """Упрощенная таблица списка курсов"""
+    return [
+        ['Курс', 'Преподаватель', 'Часы'],
+        *[[str(item['course_name'])[:10],
+           str(item['teacher']['name'])[:10],
+           str(item['hours'])] for item in data]
+    ]
+
+def department_stats_totals(data):
+    """Итоги отчета по отделам"""
+    return {
+        'rows': len(data),
+        'employees': sum(item.get('employee_count', 0) for item in data),
+        'courses': sum(item.get('course_count', 0) for item in data)
+    }
+
+def department_stats_statistics(totals):
+    """Статистика отчета по отделам"""
+    avg_employees = totals['employees'] / totals['rows'] if totals['rows'] else 0
+    return [
+        f"Всего отделов: {totals['rows']}",
+        f"Общее количество сотрудников: {totals['employees']}",
+        f"Общее количество курсов: {totals['courses']}",
+        f"Среднее количество сотрудников на отдел: {avg_employees:.1f}"
+    ]
+
+def courses_totals(data):
+    """Итоги отчета по списку курсов"""
+    return {
+        'rows': len(data),
+        'hours': sum(item.get('hours', 0) for item in data),
+        'participants': sum(len(item.get('employees', [])) for item in data),
+        'price': sum(item.get('price', 0) for item in data)
+    }
+
+def courses_statistics(totals):
+    """Статистика отчета по списку курсов"""
+    stats = [f"Количество курсов: {totals['rows']}"]
+    if totals['rows']:
+        stats.extend([
+            f"Общее количество часов: {totals['hours']}",
+            f"Общее количество участников: {totals['participants']}",
+            f"Общая стоимость всех курсов: {totals['price']:.2f} руб.",
+            f"Средняя стоимость курса: {totals['price']/totals['rows']:.2f} руб."
+        ])
+    return stats
+
+# ---------- Регистрация отчетов ----------
+
+register_export('courier', 'heavy_parcels', 'Тяжелые посылки (>5 кг)',
+                table=heavy_parcels_table, simple_table=heavy_parcels_table_simple,
+                totals=parcels_totals, statistics=parcels_statistics)
+register_export('courier', 'in_transit', 'Посылки в пути',
+                table=in_transit_table, totals=parcels_totals, statistics=parcels_statistics)
+register_export('courier', 'last_week', 'Посылки за последнюю неделю',
+                table=last_week_table, totals=parcels_totals, statistics=parcels_statistics)
+register_export('courier', 'by_sender', 'Посылки по отправителям',
+                totals=parcels_totals, statistics=parcels_statistics)
+register_export('courier', 'courier_stats', 'Статистика по курьерам',
+                table=courier_stats_table, simple_table=courier_stats_table_simple,
+                totals=courier_stats_totals, statistics=courier_stats_statistics)
+register_export('courier', 'all', 'Все посылки',
+                totals=parcels_totals, statistics=parcels_statistics)
+
+register_export('courses', 'upcoming_courses', 'Предстоящие курсы',
+                table=courses_table, simple_table=courses_table_simple,
+                totals=courses_totals, statistics=courses_statistics)
+register_export('courses', 'long_courses', 'Длительные курсы (>40 часов)',
+                table=courses_table, simple_table=courses_table_simple,
+                totals=courses_totals, statistics=courses_statistics)
+register_export('courses', 'by_teacher', 'Курсы по преподавателям',
+                totals=courses_totals, statistics=courses_statistics)
+register_export('courses', 'full_courses', 'Курсы с полными группами',
+                table=courses_table, totals=courses_totals, statistics=courses_statistics)
+register_export('courses', 'department_stats', 'Статистика по отделам',
+                table=department_stats_table, simple_table=department_stats_table_simple,
+                totals=department_stats_totals, statistics=department_stats_statistics)
+register_export('courses', 'all', 'Все курсы',
+                totals=courses_totals, statistics=courses_statistics)
+
+# ---------- Потоковая выгрузка коллекций (CSV/NDJSON) ----------
+
+# Размер пакета документов, которые читаются из курсора и отдаются клиенту за раз
+DUMP_BATCH_SIZE = 1000
+MAX_DUMP_BATCH_SIZE = 10000
+
+def get_path(document, path):
+    """Значение вложенного поля по пути через точку ('sender.full_name')"""
+    value = document
+    for part in path.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+def employee_names(document):
+    return '; '.join(employee.get('name', '') for employee in document.get('employees', []))
+
+# Колонки CSV: (заголовок, путь к полю или функция от документа)
+DUMP_COLUMNS = {
+    'courier': [
+        ('Трек-номер', 'tracking_number'),
+        ('Статус', 'status'),
+        ('Отправитель', 'sender.full_name'),
+        ('Адрес отправителя', 'sender.address'),
+        ('Получатель', 'receiver.full_name'),
+        ('Адрес получателя', 'receiver.address'),
+        ('Вес (кг)', 'parcel.weight'),
+        ('Длина', 'parcel.dimensions.length'),
+        ('Ширина', 'parcel.dimensions.width'),
+        ('Высота', 'parcel.dimensions.height'),
+        ('Описание', 'parcel.description'),
+        ('Хрупкое', 'parcel.fragile'),
+        ('Застраховано', 'parcel.insured'),
+        ('Курьер', 'courier.name'),
+        ('Телефон курьера', 'courier.phone'),
+        ('Компания', 'courier.company'),
+        ('Дата отправки', 'dates.dispatch_date'),
+        ('Дата доставки', 'dates.delivery_date'),
+        ('Фактическая доставка', 'dates.actual_delivery_date'),
+        ('Стоимость', 'delivery_cost'),
+        ('Создано', 'created_at')
+    ],
+    'courses': [
+        ('Код', 'course_code'),
+        ('Название', 'course_name'),
+        ('Статус', 'status'),
+        ('Категория', 'category'),
+        ('Преподаватель', 'teacher.name'),
+        ('Кафедра', 'teacher.department'),
+        ('Начало', 'dates.start_date'),
+        ('Окончание', 'dates.end_date'),
+        ('Дедлайн регистрации', 'dates.registration_deadline'),
+        ('Часы', 'hours'),
+        ('Стоимость', 'price'),
+        ('Место', 'location'),
+        ('Макс. участников', 'max_participants'),
+        ('Сотрудники', employee_names),
+        ('Создано', 'created_at')
+    ]
+}
+
+def dump_value(value):
+    """Значение поля для CSV/JSON (ObjectId и даты - строкой)"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if value is None:
+        return ''
+    return value
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def get_batch_size(value):
+    """Размер пакета из параметра запроса (в допустимых пределах)"""
+    try:
+        batch_size = int(value)
+    except (TypeError, ValueError):
+        return DUMP_BATCH_SIZE
+    return max(1, min(batch_size, MAX_DUMP_BATCH_SIZE))
+
+def iter_batches(collection, query, batch_size):
+    """Документы коллекции пакетами; в памяти одновременно не больше одного пакета"""
+    cursor = collection.find(query, sort=[('_id', 1)], batch_size=batch_size)
+    try:
+        yield from chunked(cursor, batch_size)
+    finally:
+        # Клиент мог прервать загрузку - курсор на сервере закрываем сразу
+        cursor.close()
+
+def iter_csv(collection, query, columns, batch_size=DUMP_BATCH_SIZE):
+    """Выгрузка в CSV по частям: заголовок, затем по одному куску текста на пакет"""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([header for header, field in columns])
+    yield buffer.getvalue()
+
+    for batch in iter_batches(collection, query, batch_size):
+        buffer.seek(0)
+        buffer.truncate()
+        for document in batch:
+            writer.writerow([dump_value(field(document) if callable(field) else get_path(document, field))
+                             for header, field in columns])
+        yield buffer.getvalue()
+
+def iter_ndjson(collection, query, batch_size=DUMP_BATCH_SIZE):
+    """Выгрузка документов целиком, по одному JSON-объекту в строке"""
+    for batch in iter_batches(collection, query, batch_size):
+        yield ''.join(json.dumps(document, ensure_ascii=False, default=json_default) + '\n'
+                      for document in batch)
@@ -0,0 +1,116 @@
+from datetime import datetime
+import re
+from documents import prefix_query
+
+# Статусы, которые можно выбрать в фильтре списка посылок
+COURIER_STATUSES = ['Принято', 'Обработка', 'В пути', 'В пункте выдачи', 'Доставлено', 'Отменено']
+
+# Параметры фильтра списка посылок (совпадают с полями формы в courier_list.html)
+COURIER_FILTER_FIELDS = ['status', 'sender', 'receiver', 'tracking', 'date_from', 'date_to']
+
+# Поля, которые выводятся в таблице списка посылок
+COURIER_LIST_PROJECTION = {
+    'tracking_number': 1,
+    'sender.full_name': 1,
+    'sender.address': 1,
+    'receiver.full_name': 1,
+    'receiver.address': 1,
+    'parcel.weight': 1,
+    'courier.name': 1,
+    'dates.dispatch_date': 1,
+    'status': 1,
+    'created_at': 1
+}
+
+def get_filter_values(args, fields):
+    """Непустые значения фильтров из параметров запроса"""
+    values = {}
+    for field in fields:
+        value = args.get(field, '').strip()
+        if value:
+            values[field] = value
+    return values
+
+def parse_date(value):
+    """Проверка даты в формате YYYY-MM-DD (даты в документах хранятся строками)"""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
+
+def date_range(date_from, date_to):
+    """Условие для диапазона дат (пустой словарь, если границы не заданы)"""
+    condition = {}
+    date_from = parse_date(date_from)
+    date_to = parse_date(date_to)
+    if date_from:
+        condition['$gte'] = date_from
+    if date_to:
+        condition['$lte'] = date_to
+    return condition
+
+def build_courier_query(filters):
+    """Запрос MongoDB по фильтрам списка посылок"""
+    query = {}
+
+    if filters.get('status') in COURIER_STATUSES:
+        query['status'] = filters['status']
+    # ФИО ищем по началу нормализованного ключа: такой запрос использует индекс
+    if filters.get('sender'):
+        query['sender.name_key'] = prefix_query(filters['sender'])
+    if filters.get('receiver'):
+        query['receiver.name_key'] = prefix_query(filters['receiver'])
+    if filters.get('tracking'):
+        # Трек-номер ищем по префиксу: такой запрос использует уникальный индекс
+        query['tracking_number'] = {'$regex': '^' + re.escape(filters['tracking'].upper())}
+
+    dispatch_date = date_range(filters.get('date_from'), filters.get('date_to'))
+    if dispatch_date:
+        query['dates.dispatch_date'] = dispatch_date
+
+    return query
+
+# Статусы и категории, которые можно выбрать в фильтре списка курсов
+COURSE_STATUSES = ['Запланирован', 'Набор', 'В процессе', 'Завершен', 'Отменен']
+COURSE_CATEGORIES = ['Технический', 'Гуманитарный', 'Управленческий', 'Общий']
+
+# Параметры фильтра списка курсов (совпадают с полями формы в courses_list.html)
+COURSE_FILTER_FIELDS = ['status', 'teacher', 'code', 'category', 'date_from', 'date_to']
+
+# Поля, которые выводятся в карточках списка курсов
+COURSE_LIST_PROJECTION = {
+    'course_name': 1,
+    'course_code': 1,
+    'status': 1,
+    'teacher.name': 1,
+    'teacher.department': 1,
+    'dates.start_date': 1,
+    'dates.end_date': 1,
+    'hours': 1,
+    'price': 1,
+    'employees.name': 1,
+    'employees.position': 1,
+    'employees.department': 1,
+    'description': 1,
+    'created_at': 1
+}
+
+def build_course_query(filters):
+    """Запрос MongoDB по фильтрам списка курсов"""
+    query = {}
+
+    if filters.get('status') in COURSE_STATUSES:
+        query['status'] = filters['status']
+    if filters.get('category') in COURSE_CATEGORIES:
+        query['category'] = filters['category']
+    if filters.get('teacher'):
+        query['teacher.name_key'] = prefix_query(filters['teacher'])
+    if filters.get('code'):
+        # Код курса ищем по префиксу: такой запрос использует уникальный индекс
+        query['course_code'] = {'$regex': '^' + re.escape(filters['code'].upper())}
+
+    start_date = date_range(filters.get('date_from'), filters.get('date_to'))
+    if start_date:
+        query['dates.start_date'] = start_date
+
+    return query
@@ -0,0 +1,194 @@
+from datetime import datetime
+import csv
+import json
+import time
+from pymongo.errors import BulkWriteError
+import stats
+from documents import build_parcel, build_course
+from sequences import generate_tracking_number, generate_course_code
+from validation import validate_courier_batch, validate_course_batch
+
+# Размер пакета документов для одного insert_many
+IMPORT_BATCH_SIZE = 1000
+
+# Сколько ошибок по строкам возвращать в отчете (всего ошибок - error_count)
+MAX_REPORTED_ERRORS = 1000
+
+# Поддерживаемые форматы файлов импорта
+IMPORT_FORMATS = ['csv', 'ndjson']
+
+# Поля-флажки формы: в файле импорта допускаются и другие варианты "да"
+CHECKBOX_FIELDS = ['fragile', 'insured']
+CHECKBOX_TRUE = {'on', '1', 'true', 'yes', 'да'}
+
+def new_course(row):
+    course = build_course(row)
+    course['current_participants'] = 0
+    return course
+
+# Импорт по типу документов: проверка пакета строк, сборка документа, уникальное поле
+# и его генератор (при совпадении значение генерируется заново) и статистика
+IMPORTERS = {
+    'courier': {
+        'validate': validate_courier_batch,
+        'build': build_parcel,
+        'key': 'tracking_number',
+        'generate': generate_tracking_number,
+        'apply_stats': stats.apply_courier_changes
+    },
+    'courses': {
+        'validate': validate_course_batch,
+        'build': new_course,
+        'key': 'course_code',
+        'generate': generate_course_code,
+        'apply_stats': stats.apply_course_changes
+    }
+}
+
+def read_rows(stream, file_format):
+    """Строки файла импорта: (номер строки, данные или None, ошибка или None).
+
+    stream - текстовый поток. CSV - первая строка с названиями полей формы,
+    NDJSON - по одному JSON-объекту с теми же полями в строке.
+    """
+    if file_format == 'csv':
+        # Номер строки файла с учетом строки заголовка
+        for number, row in enumerate(csv.DictReader(stream), start=2):
+            yield number, row, None
+        return
+
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield number, None, f'Неверный JSON: {e}'
+            continue
+        if not isinstance(row, dict):
+            yield number, None, 'Строка должна содержать JSON-объект'
+            continue
+        yield number, row, None
+
+def normalize_row(row):
+    """Значения строки в виде, в котором их присылает форма (строки, флажки - 'on')"""
+    form = {}
+    for field, value in row.items():
+        if field is None:
+            continue
+        if isinstance(value, bool):
+            value = 'on' if value else ''
+        form[field] = '' if value is None else str(value).strip()
+    for field in CHECKBOX_FIELDS:
+        if form.get(field, '').lower() in CHECKBOX_TRUE:
+            form[field] = 'on'
+    return form
+
+def detect_format(filename, file_format=None):
+    """Формат файла импорта: заданный явно или по расширению (None, если не распознан)"""
+    if not file_format and filename and '.' in filename:
+        file_format = filename.rsplit('.', 1)[1].lower()
+        if file_format in ('jsonl', 'json'):
+            file_format = 'ndjson'
+    return file_format if file_format in IMPORT_FORMATS else None
+
+class ImportReport:
+    """Итоги импорта: число строк, вставленных документов и ошибки по строкам"""
+
+    def __init__(self, max_errors=MAX_REPORTED_ERRORS):
+        self.max_errors = max_errors
+        self.total = 0
+        self.inserted = 0
+        self.error_count = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.seconds = 0
+
+    def add_error(self, row_number, messages):
+        self.error_count += 1
+        if self.max_errors is None or len(self.errors) < self.max_errors:
+            self.errors.append({'row': row_number, 'errors': messages})
+
+    def to_dict(self):
+        return {
+            'total': self.total,
+            'inserted': self.inserted,
+            'error_count': self.error_count,
+            'errors': self.errors,
+            'seconds': round(self.seconds, 3),
+            'rows_per_sec': round(self.total / self.seconds) if self.seconds else 0
+        }
+
+def insert_batch(collection, importer, batch, report, attempts=3):
+    """Вставка пакета [(номер строки, документ), ...] одним неупорядоченным insert_many"""
+    try:
+        collection.insert_many([document for row_number, document in batch], ordered=False)
+        inserted = batch
+    except BulkWriteError as e:
+        failed = {error['index']: error for error in e.details.get('writeErrors', [])}
+        inserted = [item for index, item in enumerate(batch) if index not in failed]
+        retry = []
+        for index, error in failed.items():
+            row_number, document = batch[index]
+            duplicate_key = error.get('code') == 11000 and importer['key'] in (error.get('keyPattern') or error.get('errmsg', ''))
+            if duplicate_key and attempts > 1:
+                # Совпал сгенерированный трек-номер или код курса - генерируем новый
+                document[importer['key']] = importer['generate'](collection.database)
+                retry.append((row_number, document))
+            else:
+                report.add_error(row_number, [error.get('errmsg', 'Ошибка записи')])
+        if retry:
+            insert_batch(collection, importer, retry, report, attempts - 1)
+
+    if inserted:
+        report.inserted += len(inserted)
+        importer['apply_stats'](collection.database, [(None, document) for row_number, document in inserted])
+
+def import_rows(collection, kind, rows, batch_size=IMPORT_BATCH_SIZE, max_errors=MAX_REPORTED_ERRORS):
+    """Импорт строк read_rows в коллекцию (kind - 'courier' или 'courses').
+
+    Строки проверяются пакетами по batch_size теми же правилами, что и форма
+    добавления, корректные документы записываются тем же пакетом. Возвращает
+    ImportReport с ошибками по номерам строк (не больше max_errors, None - все).
+    """
+    importer = IMPORTERS[kind]
+    report = ImportReport(max_errors)
+    pending = []
+
+    for row_number, row, error in rows:
+        report.total += 1
+        if error:
+            report.add_error(row_number, [error])
+            continue
+        pending.append((row_number, normalize_row(row)))
+        if len(pending) >= batch_size:
+            import_batch(collection, importer, pending, report)
+            pending = []
+
+    if pending:
+        import_batch(collection, importer, pending, report)
+    report.seconds = time.perf_counter() - report.started
+    return report
+
+def import_batch(collection, importer, pending, report):
+    """Проверка и запись пакета строк [(номер строки, данные формы), ...]"""
+    batch = []
+    results = importer['validate']([form for row_number, form in pending])
+    for (row_number, form), validation_result in zip(pending, results):
+        if not validation_result['valid']:
+            report.add_error(row_number, validation_result['errors'])
+            continue
+        try:
+            document = importer['build'](form)
+        except KeyError as e:
+            report.add_error(row_number, [f'Не заполнено поле {e.args[0]}'])
+            continue
+        except ValueError as e:
+            report.add_error(row_number, [str(e)])
+            continue
+        document[importer['key']] = importer['generate'](collection.database)
+        document['created_at'] = datetime.now()
+        batch.append((row_number, document))
+
+    if batch:
+        insert_batch(collection, importer, batch, report)
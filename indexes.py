@@ -0,0 +1,93 @@
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+# Реестр индексов: коллекция -> индексы.
+# Составные индексы повторяют условие и сортировку отчетов из reports.py и
+# списков (фильтр по статусу/категории + сортировка created_at, _id). Отчеты
+# выполняются отдельными запросами и используют эти индексы; отчеты внутри
+# $facet (full_scan в reports.py) индексы не используют.
+INDEXES = {
+    'courier_deliveries': [
+        IndexModel([('tracking_number', ASCENDING)], unique=True),
+        # Отдельного индекса status нет: условие по статусу используют составные
+        # индексы с префиксом status (в существующей базе status_1 - в 'extra' check_indexes)
+        IndexModel([('dates.dispatch_date', DESCENDING)]),
+        IndexModel([('dates.delivery_date', ASCENDING)]),
+        # Список посылок и отчет 'all'
+        IndexModel([('created_at', DESCENDING), ('_id', DESCENDING)]),
+        # Список посылок с фильтром по статусу
+        IndexModel([('status', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)]),
+        # Отчет heavy_parcels
+        IndexModel([('parcel.weight', DESCENDING)]),
+        # Отчет in_transit
+        IndexModel([('status', ASCENDING), ('dates.delivery_date', ASCENDING)]),
+        # Статистика по курьерам (пересчет courier_rollup)
+        IndexModel([('courier.name', ASCENDING)]),
+        # Поиск по началу ФИО (documents.normalize_name)
+        IndexModel([('sender.name_key', ASCENDING)]),
+        IndexModel([('receiver.name_key', ASCENDING)]),
+        IndexModel([('courier.name_key', ASCENDING)])
+    ],
+    'qualification_courses': [
+        IndexModel([('course_code', ASCENDING)], unique=True),
+        IndexModel([('status', ASCENDING)]),
+        IndexModel([('dates.start_date', DESCENDING)]),
+        # Список курсов и отчет 'all'
+        IndexModel([('created_at', DESCENDING), ('_id', DESCENDING)]),
+        # Список курсов с фильтром по статусу или категории
+        IndexModel([('status', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)]),
+        IndexModel([('category', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)]),
+        # Отчет long_courses
+        IndexModel([('hours', DESCENDING)]),
+        # Отчет upcoming_courses
+        IndexModel([('status', ASCENDING), ('dates.start_date', ASCENDING)]),
+        # Статистика по отделам (пересчет department_rollup)
+        IndexModel([('employees.department', ASCENDING)]),
+        # Поиск по началу ФИО (documents.normalize_name)
+        IndexModel([('teacher.name_key', ASCENDING)]),
+        IndexModel([('employees.name_key', ASCENDING)])
+    ]
+}
+
+def index_name(model):
+    """Имя индекса из описания IndexModel"""
+    return model.document['name']
+
+def ensure_indexes(db):
+    """Создание всех индексов реестра.
+
+    Повторный вызов безопасен: уже существующие индексы MongoDB пропускает.
+    Возвращает список ошибок (например, индекс с тем же именем, но другими параметрами).
+    """
+    errors = []
+    for collection_name, models in INDEXES.items():
+        try:
+            db[collection_name].create_indexes(models)
+        except OperationFailure as e:
+            errors.append(f'{collection_name}: {e}')
+    return errors
+
+def check_indexes(db):
+    """Сравнение индексов в базе с реестром.
+
+    Для каждой коллекции возвращает отсутствующие индексы, индексы вне
+    реестра и индексы без обращений с момента запуска сервера ($indexStats).
+    """
+    report = {}
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        declared = {index_name(model) for model in models}
+        existing = set(collection.index_information())
+
+        try:
+            usage = {item['name']: item['accesses']['ops']
+                     for item in collection.aggregate([{'$indexStats': {}}])}
+        except OperationFailure:
+            usage = {}
+
+        report[collection_name] = {
+            'missing': sorted(declared - existing),
+            'extra': sorted(existing - declared - {'_id_'}),
+            'unused': sorted(name for name, ops in usage.items() if ops == 0 and name != '_id_')
+        }
+    return report
@@ -0,0 +1,260 @@
+from contextlib import contextmanager
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+# Состояния задачи экспорта
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL NOT NULL,
+    available_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    expires_at REAL
+)
+'''
+
+def render_report(params, path):
+    """Рендер отчета в файл path (выполняется в отдельном процессе).
+
+    Процесс открывает собственное подключение к MongoDB (params['mongo_uri']
+    и params['client_options'] приходят из worker_params очереди) и строит
+    отчет целиком (до params['max_rows'] строк), а не первые 20 строк.
+    """
+    from pymongo import MongoClient
+    import reports
+    from export import export_to_docx, export_to_pdf_stream, PDF_STREAM_BATCH_SIZE
+
+    client = MongoClient(params['mongo_uri'], **params.get('client_options', {}))
+    try:
+        collection_name = {'courier': 'courier_deliveries', 'courses': 'qualification_courses'}[params['report_type']]
+        collection = client[params['database']][collection_name]
+        if params['format'] == 'pdf':
+            # PDF пишется постранично, строки читаются из курсора пакетами
+            cursor = reports.report_cursor(collection, params['report_type'], params['report_name'],
+                                           max_rows=params['max_rows'], batch_size=PDF_STREAM_BATCH_SIZE)
+            export_to_pdf_stream(cursor, params['report_type'], params['report_name'], path)
+            return
+        reports_data = reports.generate_report(collection, params['report_type'], params['report_name'],
+                                               max_rows=params['max_rows'])
+        data = export_to_docx(reports_data, params['report_type'], params['report_name'], max_rows=params['max_rows'])
+    finally:
+        client.close()
+    if not data:
+        raise RuntimeError('Не удалось построить файл отчета')
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def attempt_path(path, pid):
+    """Временный файл попытки, выполняемой процессом pid"""
+    return f'{path}.{pid}.tmp'
+
+def run_job(render, params, path):
+    """Точка входа процесса: результат во временный файл, ошибка - в файл .error"""
+    tmp_path = attempt_path(path, os.getpid())
+    try:
+        render(params, tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        with open(f'{path}.error', 'w', encoding='utf-8') as f:
+            f.write(traceback.format_exc(limit=5))
+        raise SystemExit(1)
+
+class JobQueue:
+    """Очередь фоновых задач экспорта с хранением состояния в SQLite.
+
+    Каждая попытка выполняется в отдельном процессе, поэтому задачу,
+    превысившую timeout, можно остановить. Одновременно выполняется не более
+    max_workers задач (ограничение общее для всех процессов, использующих
+    одну базу SQLite). Неудачные попытки повторяются до max_attempts раз,
+    готовые файлы и задачи удаляются через result_ttl секунд.
+
+    worker_params добавляются к параметрам задачи только при запуске
+    процесса: они не записываются в базу очереди и не возвращаются get
+    (адрес MongoDB может содержать учетные данные).
+    """
+
+    def __init__(self, database, results_dir, render=render_report, max_workers=2, timeout=300,
+                 max_attempts=3, retry_delay=5, result_ttl=3600, poll_interval=0.5, worker_params=None):
+        self.database = database
+        self.results_dir = results_dir
+        self.render = render
+        self.worker_params = worker_params or {}
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self._processes = {}
+        self._thread = None
+        self._pid = None
+        self._mutex = threading.Lock()
+        # spawn: дочерний процесс не наследует потоки и подключения веб-процесса
+        self._context = multiprocessing.get_context('spawn')
+        os.makedirs(results_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.database, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def result_path(self, job_id):
+        return os.path.join(self.results_dir, job_id)
+
+    def submit(self, params):
+        """Постановка задачи в очередь, возвращает ее идентификатор"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('INSERT INTO jobs (id, params, status, created_at, available_at) VALUES (?, ?, ?, ?, ?)',
+                         (job_id, json.dumps(params), QUEUED, now, now))
+        self.start()
+        return job_id
+
+    def get(self, job_id):
+        """Состояние задачи (словарь) или None, если задачи нет или срок ее хранения истек"""
+        self.start()
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None or (row['expires_at'] and row['expires_at'] < time.time()):
+            return None
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        return job
+
+    def start(self):
+        """Запуск потока-диспетчера (один на процесс, перезапускается после fork)"""
+        with self._mutex:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._processes = {}
+            self._thread = threading.Thread(target=self._run, name='export-jobs', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Ошибка диспетчера задач экспорта: {e}")
+            time.sleep(self.poll_interval)
+
+    def run_once(self):
+        """Один шаг диспетчера: завершенные попытки, зависшие задачи, запуск новых, очистка"""
+        self._reap()
+        self._recover_stale()
+        while self._claim_and_start():
+            pass
+        self._expire()
+
+    def _finish(self, conn, job_id, attempts, error):
+        now = time.time()
+        if error is None:
+            conn.execute('UPDATE jobs SET status = ?, error = NULL, finished_at = ?, expires_at = ? WHERE id = ?',
+                         (DONE, now, now + self.result_ttl, job_id))
+        elif attempts < self.max_attempts:
+            conn.execute('UPDATE jobs SET status = ?, error = ?, available_at = ? WHERE id = ?',
+                         (QUEUED, error, now + self.retry_delay * attempts, job_id))
+        else:
+            conn.execute('UPDATE jobs SET status = ?, error = ?, finished_at = ?, expires_at = ? WHERE id = ?',
+                         (FAILED, error, now, now + self.result_ttl, job_id))
+
+    def _reap(self):
+        """Проверка попыток, запущенных этим процессом"""
+        for job_id, (process, started_at, attempts) in list(self._processes.items()):
+            error = None
+            if process.is_alive():
+                if time.time() - started_at <= self.timeout:
+                    continue
+                process.terminate()
+                process.join(5)
+                error = f'Превышено время выполнения ({self.timeout} с)'
+            elif process.exitcode != 0 or not os.path.exists(self.result_path(job_id)):
+                error_path = self.result_path(job_id) + '.error'
+                try:
+                    with open(error_path, encoding='utf-8') as f:
+                        error = f.read().strip().splitlines()[-1]
+                    os.remove(error_path)
+                except (FileNotFoundError, IndexError):
+                    error = f'Процесс завершился с кодом {process.exitcode}'
+            if error is not None:
+                # Недописанный файл прерванной или неудачной попытки
+                try:
+                    os.remove(attempt_path(self.result_path(job_id), process.pid))
+                except FileNotFoundError:
+                    pass
+            del self._processes[job_id]
+            with self._connect() as conn:
+                self._finish(conn, job_id, attempts, error)
+
+    def _recover_stale(self):
+        """Задачи, чей процесс-диспетчер завершился во время выполнения (например, перезапуск сервера)"""
+        deadline = time.time() - self.timeout - 60
+        with self._connect() as conn:
+            rows = conn.execute('SELECT id, attempts FROM jobs WHERE status = ? AND started_at < ?',
+                                (RUNNING, deadline)).fetchall()
+            for row in rows:
+                if row['id'] not in self._processes:
+                    self._finish(conn, row['id'], row['attempts'], 'Выполнение прервано')
+
+    def _claim_and_start(self):
+        """Захват следующей задачи из очереди с учетом общего ограничения параллельности"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                running = conn.execute('SELECT COUNT(*) FROM jobs WHERE status = ?', (RUNNING,)).fetchone()[0]
+                row = None
+                if running < self.max_workers:
+                    row = conn.execute('SELECT * FROM jobs WHERE status = ? AND available_at <= ? '
+                                       'ORDER BY created_at LIMIT 1', (QUEUED, now)).fetchone()
+                if row is not None:
+                    conn.execute('UPDATE jobs SET status = ?, attempts = attempts + 1, started_at = ? WHERE id = ?',
+                                 (RUNNING, now, row['id']))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        if row is None:
+            return False
+
+        params = {**json.loads(row['params']), **self.worker_params}
+        process = self._context.Process(target=run_job, args=(self.render, params, self.result_path(row['id'])),
+                                        daemon=True)
+        process.start()
+        self._processes[row['id']] = (process, now, row['attempts'] + 1)
+        return True
+
+    def _expire(self):
+        """Удаление задач и файлов с истекшим сроком хранения"""
+        with self._connect() as conn:
+            rows = conn.execute('SELECT id FROM jobs WHERE expires_at < ?', (time.time(),)).fetchall()
+            for row in rows:
+                try:
+                    os.remove(self.result_path(row['id']))
+                except FileNotFoundError:
+                    pass
+                conn.execute('DELETE FROM jobs WHERE id = ?', (row['id'],))
@@ -0,0 +1,340 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+import bisect
+import threading
+import time
+from flask import Response, before_render_template, template_rendered, request
+from pymongo import monitoring
+
+# Метрики процесса в формате Prometheus (/metrics). У каждого процесса
+# (воркера gunicorn) свои значения - Prometheus собирает их с каждого.
+
+# Границы корзин гистограмм длительности (секунды)
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Границы корзин числа документов в ответе MongoDB
+DOCUMENT_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+# Квантили, которые дополнительно выводятся по гистограммам длительности
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Реестр метрик: имя -> (тип, описание, границы корзин для гистограмм)
+METRICS = {
+    'http_request_duration_seconds': ('histogram', 'Время обработки запроса по маршруту', DURATION_BUCKETS),
+    'mongo_command_duration_seconds': ('histogram', 'Время выполнения команды MongoDB', DURATION_BUCKETS),
+    'mongo_command_documents': ('histogram', 'Число документов в ответе команды MongoDB', DOCUMENT_BUCKETS),
+    'mongo_command_failures_total': ('counter', 'Число команд MongoDB, завершившихся ошибкой', None),
+    'template_render_duration_seconds': ('histogram', 'Время рендера шаблона Jinja', DURATION_BUCKETS),
+    'export_render_duration_seconds': ('histogram', 'Время построения файла экспорта', DURATION_BUCKETS),
+    'mongo_pool_max_size': ('gauge', 'Наибольший размер пула соединений MongoDB (maxPoolSize)', None),
+    'mongo_pool_connections': ('gauge', 'Открытые соединения пула MongoDB', None),
+    'mongo_pool_checked_out': ('gauge', 'Соединения пула MongoDB, занятые командами', None),
+    'mongo_pool_wait_seconds': ('histogram', 'Ожидание свободного соединения пула MongoDB', DURATION_BUCKETS),
+    'mongo_pool_checkout_failures_total': ('counter', 'Неудачные попытки получить соединение пула MongoDB', None)
+}
+
+# Маршрут и затраты текущего запроса (для меток команд MongoDB и заголовка Server-Timing)
+current_request = ContextVar('metrics_request', default=None)
+
+class Histogram:
+    """Гистограмма с накопительными корзинами (как в Prometheus)"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Оценка квантиля по корзинам (линейная интерполяция, как histogram_quantile)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if cumulative + count >= rank and count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+class Registry:
+    """Значения метрик процесса по наборам меток"""
+
+    def __init__(self, metrics=METRICS):
+        self.metrics = metrics
+        self._values = {name: {} for name in metrics}
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._values[name]
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self.metrics[name][2])
+            histogram.observe(value)
+
+    def inc(self, name, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._values[name]
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._values[name][tuple(sorted(labels.items()))] = value
+
+    def quantile(self, name, q, **labels):
+        with self._lock:
+            histogram = self._values[name].get(tuple(sorted(labels.items())))
+            return histogram.quantile(q) if histogram else None
+
+    def render(self):
+        """Текст метрик в формате Prometheus"""
+        lines = []
+        with self._lock:
+            for name, (metric_type, description, buckets) in self.metrics.items():
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                series = self._values[name]
+                for key, value in sorted(series.items()):
+                    labels = dict(key)
+                    if metric_type != 'histogram':
+                        lines.append(f'{name}{format_labels(labels)} {value}')
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(buckets, value.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{format_labels({**labels, "le": bound})} {cumulative}')
+                    lines.append(f'{name}_bucket{format_labels({**labels, "le": "+Inf"})} {value.count}')
+                    lines.append(f'{name}_sum{format_labels(labels)} {value.sum:.6f}')
+                    lines.append(f'{name}_count{format_labels(labels)} {value.count}')
+                if name.endswith('_seconds') and series:
+                    lines.append(f'# HELP {name}_quantile Оценка квантилей {name} по корзинам')
+                    lines.append(f'# TYPE {name}_quantile gauge')
+                    for key, value in sorted(series.items()):
+                        for q in QUANTILES:
+                            lines.append(f'{name}_quantile{format_labels({**dict(key), "quantile": q})} '
+                                         f'{value.quantile(q):.6f}')
+        return '\n'.join(lines) + '\n'
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    values = ','.join(f'{key}="{escape_label(value)}"' for key, value in labels.items())
+    return '{' + values + '}'
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+registry = Registry()
+
+def add_timing(name, seconds):
+    """Время этапа текущего запроса для заголовка Server-Timing"""
+    state = current_request.get()
+    if state is not None:
+        # Потоки отчетов запроса (generate_reports) добавляют время одновременно
+        with state['lock']:
+            state['timings'][name] = state['timings'].get(name, 0) + seconds
+
+@contextmanager
+def timer(name, stage, **labels):
+    """Замер блока кода: гистограмма name и этап stage в Server-Timing"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        registry.observe(name, seconds, **labels)
+        add_timing(stage, seconds)
+
+# ========== КОМАНДЫ MONGODB ==========
+
+def command_collection(event):
+    """Коллекция команды (для getMore - поле collection, для служебных команд - пусто)"""
+    if event.command_name == 'getMore':
+        return event.command.get('collection', '')
+    value = event.command.get(event.command_name)
+    return value if isinstance(value, str) else ''
+
+def reply_documents(reply):
+    """Число документов в ответе команды"""
+    cursor = reply.get('cursor')
+    if isinstance(cursor, dict):
+        return len(cursor.get('firstBatch') or cursor.get('nextBatch') or [])
+    return reply.get('n', 0) if isinstance(reply.get('n'), int) else 0
+
+class CommandMetrics(monitoring.CommandListener):
+    """Время, число документов и маршрут каждой команды MongoDB.
+
+    Передается в MongoClient(event_listeners=[...]). События приходят в потоке,
+    выполняющем команду, поэтому маршрут берется из контекста запроса;
+    потоки отчетов получают копию этого контекста (generate_reports) и
+    маршрут своего запроса, команды вне запроса (CLI, фоновые потоки) -
+    route="-".
+    """
+
+    def __init__(self):
+        self._started = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        state = current_request.get()
+        with self._lock:
+            self._started[(event.connection_id, event.request_id)] = {
+                'command': event.command_name,
+                'collection': command_collection(event),
+                'database': event.database_name,
+                'route': state['route'] if state else '-'
+            }
+
+    def _finish(self, event):
+        with self._lock:
+            return self._started.pop((event.connection_id, event.request_id), None)
+
+    def succeeded(self, event):
+        started = self._finish(event)
+        if started is None:
+            return
+        seconds = event.duration_micros / 1e6
+        labels = {'command': started['command'], 'collection': started['collection'], 'route': started['route']}
+        registry.observe('mongo_command_duration_seconds', seconds, **labels)
+        registry.observe('mongo_command_documents', reply_documents(event.reply), **labels)
+        add_timing('mongo', seconds)
+
+    def failed(self, event):
+        started = self._finish(event)
+        if started is None:
+            return
+        registry.inc('mongo_command_failures_total', command=started['command'],
+                     collection=started['collection'], route=started['route'])
+        add_timing('mongo', event.duration_micros / 1e6)
+
+command_listener = CommandMetrics()
+
+# ========== ПУЛ СОЕДИНЕНИЙ MONGODB ==========
+
+def pool_address(event):
+    host, port = event.address
+    return f'{host}:{port}'
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Размер и занятость пула соединений, время ожидания свободного соединения.
+
+    События получения соединения приходят в потоке, который его ждет, поэтому
+    начало ожидания хранится в данных потока.
+    """
+
+    def __init__(self):
+        self._waiting = threading.local()
+
+    def pool_created(self, event):
+        registry.set('mongo_pool_max_size', event.options.get('maxPoolSize', 100), address=pool_address(event))
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        registry.inc('mongo_pool_connections', address=pool_address(event))
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        registry.inc('mongo_pool_connections', -1, address=pool_address(event))
+
+    def connection_check_out_started(self, event):
+        self._waiting.started = time.perf_counter()
+
+    def _waited(self, event):
+        started = getattr(self._waiting, 'started', None)
+        self._waiting.started = None
+        if started is not None:
+            registry.observe('mongo_pool_wait_seconds', time.perf_counter() - started, address=pool_address(event))
+
+    def connection_check_out_failed(self, event):
+        self._waited(event)
+        registry.inc('mongo_pool_checkout_failures_total', address=pool_address(event), reason=event.reason)
+
+    def connection_checked_out(self, event):
+        self._waited(event)
+        registry.inc('mongo_pool_checked_out', address=pool_address(event))
+
+    def connection_checked_in(self, event):
+        registry.inc('mongo_pool_checked_out', -1, address=pool_address(event))
+
+pool_listener = PoolMetrics()
+
+# ========== ЗАПРОСЫ FLASK ==========
+
+def server_timing(timings):
+    """Значение заголовка Server-Timing (миллисекунды)"""
+    return ', '.join(f'{name};dur={seconds * 1000:.1f}' for name, seconds in timings.items())
+
+def init_app(app):
+    """Замер запросов и шаблонов, маршрут /metrics.
+
+    Заголовок Server-Timing (total, mongo, template, export) добавляется,
+    если в запросе есть заголовок X-Server-Timing: 1 или включен
+    METRICS_SERVER_TIMING.
+    """
+    @app.before_request
+    def start_request_timer():
+        rule = request.url_rule.rule if request.url_rule else 'unmatched'
+        current_request.set({'route': rule, 'started': time.perf_counter(), 'timings': {}, 'recorded': False,
+                             'lock': threading.Lock()})
+
+    @app.after_request
+    def record_request(response):
+        state = current_request.get()
+        if state is None or state['recorded']:
+            return response
+        state['recorded'] = True
+        seconds = time.perf_counter() - state['started']
+        registry.observe('http_request_duration_seconds', seconds, route=state['route'],
+                         method=request.method, status=response.status_code)
+        if app.config.get('METRICS_SERVER_TIMING') or request.headers.get('X-Server-Timing') == '1':
+            response.headers['Server-Timing'] = server_timing({'total': seconds, **state['timings']})
+        return response
+
+    @app.teardown_request
+    def finish_request(error=None):
+        state = current_request.get()
+        if state is not None and not state['recorded']:
+            # Необработанное исключение: after_request не вызывался
+            registry.observe('http_request_duration_seconds', time.perf_counter() - state['started'],
+                             route=state['route'], method=request.method, status=500)
+        current_request.set(None)
+
+    def start_template(sender, template, context, **extra):
+        state = current_request.get()
+        if state is not None:
+            state.setdefault('templates', []).append(time.perf_counter())
+
+    def finish_template(sender, template, context, **extra):
+        state = current_request.get()
+        if state is None or not state.get('templates'):
+            return
+        seconds = time.perf_counter() - state['templates'].pop()
+        registry.observe('template_render_duration_seconds', seconds, template=template.name or '-')
+        add_timing('template', seconds)
+
+    # weak=False: обработчики - локальные функции, без сильной ссылки их удалит сборщик мусора
+    before_render_template.connect(start_template, app, weak=False)
+    template_rendered.connect(finish_template, app, weak=False)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
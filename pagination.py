@@ -0,0 +1,88 @@
+from datetime import datetime
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+import base64
+
+# Размер страницы по умолчанию и максимальный размер страницы
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 100
+
+def get_per_page(value):
+    """Размер страницы из параметра запроса (с ограничением сверху)"""
+    try:
+        per_page = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PER_PAGE
+    return max(1, min(per_page, MAX_PER_PAGE))
+
+def encode_cursor(document):
+    """Курсор страницы по паре (created_at, _id) документа"""
+    created_at = document.get('created_at')
+    raw = f"{created_at.isoformat() if created_at else ''}|{document['_id']}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """Разбор курсора. Возвращает (created_at, _id) или None для неверного курсора"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        created_at, object_id = raw.split('|', 1)
+        return (datetime.fromisoformat(created_at) if created_at else None, ObjectId(object_id))
+    except (ValueError, InvalidId, UnicodeError):
+        return None
+
+def keyset_condition(position, direction):
+    """Условие выборки документов после (direction=-1) или до (direction=1) позиции курсора"""
+    created_at, object_id = position
+    op = '$lt' if direction < 0 else '$gt'
+    return {'$or': [
+        {'created_at': {op: created_at}},
+        {'created_at': created_at, '_id': {op: object_id}}
+    ]}
+
+def paginate(collection, query, projection=None, after=None, before=None, per_page=DEFAULT_PER_PAGE):
+    """Keyset-пагинация по (created_at, _id) от новых документов к старым.
+
+    Возвращает словарь с документами страницы и курсорами соседних страниц.
+    Время ответа не зависит от номера страницы: каждая страница - это
+    один запрос по индексу created_at/_id с limit, без skip.
+    """
+    after_position = decode_cursor(after)
+    before_position = decode_cursor(before)
+
+    if before_position:
+        position, direction = before_position, 1
+    else:
+        position, direction = after_position, -1
+
+    conditions = [query] if query else []
+    if position:
+        conditions.append(keyset_condition(position, direction))
+    if not conditions:
+        find_query = {}
+    elif len(conditions) == 1:
+        find_query = conditions[0]
+    else:
+        find_query = {'$and': conditions}
+
+    # Берем на один документ больше, чтобы узнать, есть ли следующая страница
+    items = list(collection.find(find_query, projection)
+                 .sort([('created_at', direction), ('_id', direction)])
+                 .limit(per_page + 1))
+    has_more = len(items) > per_page
+    items = items[:per_page]
+
+    if direction > 0:
+        # Страница "назад" читается в обратном порядке
+        items.reverse()
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, position is not None
+
+    return {
+        'items': items,
+        'per_page': per_page,
+        'next_cursor': encode_cursor(items[-1]) if items and has_next else None,
+        'prev_cursor': encode_cursor(items[0]) if items and has_prev else None
+    }
@@ -1,121 +1,303 @@
 from pymongo import MongoClient
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+import stats
+from documents import prefix_query, DELIVERED_STATUS
 
-def generate_reports(courier_collection, courses_collection):
-    """Генерация отчетов"""
-    
-    reports_data = {}
-    
-    # 1. Отчет по курьерской доставке
-    reports_data['courier_reports'] = {
-        # Все посылки с весом более 5 кг
-        'heavy_parcels': list(courier_collection.find({
-            'parcel.weight': {'$gt': 5}
-        }).sort('parcel.weight', -1).limit(100)),
-        
-        # Посылки в процессе доставки
-        'in_transit': list(courier_collection.find({
-            'status': {'$in': ['В пути', 'Обработка', 'В пункте выдачи']}
-        }).sort('dates.delivery_date', 1).limit(100)),
-        
-        # Посылки за последние 7 дней
-        'last_week': list(courier_collection.find({
-            'dates.dispatch_date': {
-                '$gte': (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-            }
-        }).sort('dates.dispatch_date', -1).limit(100)),
-        
-        # Посылки от определенного отправителя (пример)
-        'by_sender': list(courier_collection.find({
-            'sender.full_name': {'$regex': 'Иванов', '$options': 'i'}
-        }).limit(50)),
-        
-        # Статистика по курьерам
-        'courier_stats': list(courier_collection.aggregate([
-            {'$match': {'courier.name': {'$ne': None, '$ne': ''}}},
-            {'$group': {
-                '_id': '$courier.name',
-                'count': {'$sum': 1},
-                'total_weight': {'$sum': '$parcel.weight'},
-                'total_cost': {'$sum': '$delivery_cost'}
-            }},
-            {'$sort': {'count': -1}},
-            {'$limit': 20}
-        ])),
-        
-        # Все посылки (ограниченное количество)
-        'all': list(courier_collection.find().sort('created_at', -1).limit(50))
-    }
-    
-    # 2. Отчет по курсам повышения квалификации
-    reports_data['courses_reports'] = {
-        # Предстоящие курсы
-        'upcoming_courses': list(courses_collection.find({
+# Статусы посылок, которые считаются "в процессе доставки"
+IN_TRANSIT_STATUSES = stats.IN_TRANSIT_STATUSES
+
+# Статусы предстоящих курсов
+UPCOMING_COURSE_STATUSES = ['Запланирован', 'Набор']
+
+# Реестр отчетов: (тип отчета, имя отчета) -> функция, возвращающая конвейер агрегации
+REPORTS = {}
+
+# Отчеты, которые читают не исходную коллекцию, а предрасчитанную статистику (stats.py)
+REPORT_SOURCES = {}
+
+# Отчеты без подходящего индекса: они читают всю коллекцию и считаются вместе одним $facet.
+# Остальные отчеты выполняются отдельными запросами - внутри $facet индексы не используются
+FULL_SCAN_REPORTS = set()
+
+# Ключ раздела reports_data для каждого типа отчета
+REPORT_SECTIONS = {
+    'courier': 'courier_reports',
+    'courses': 'courses_reports'
+}
+
+def report(report_type, report_name, source=None, full_scan=False):
+    """Декоратор регистрации отчета в реестре.
+
+    source - имя коллекции предрасчитанной статистики, по которой строится
+    отчет (по умолчанию отчет строится по исходной коллекции). full_scan -
+    условие отчета не поддержано индексом из indexes.py.
+    """
+    def decorator(func):
+        REPORTS[(report_type, report_name)] = func
+        if source:
+            REPORT_SOURCES[(report_type, report_name)] = source
+        if full_scan:
+            FULL_SCAN_REPORTS.add((report_type, report_name))
+        return func
+    return decorator
+
+# ---------- Отчеты по курьерской доставке ----------
+
+@report('courier', 'heavy_parcels')
+def heavy_parcels_pipeline():
+    """Все посылки с весом более 5 кг"""
+    return [
+        {'$match': {'parcel.weight': {'$gt': 5}}},
+        {'$sort': {'parcel.weight': -1}},
+        {'$limit': 100}
+    ]
+
+@report('courier', 'in_transit')
+def in_transit_pipeline():
+    """Посылки в процессе доставки"""
+    return [
+        {'$match': {'status': {'$in': IN_TRANSIT_STATUSES}}},
+        {'$sort': {'dates.delivery_date': 1}},
+        {'$limit': 100}
+    ]
+
+@report('courier', 'last_week')
+def last_week_pipeline():
+    """Посылки за последние 7 дней"""
+    week_ago = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
+    return [
+        {'$match': {'dates.dispatch_date': {'$gte': week_ago}}},
+        {'$sort': {'dates.dispatch_date': -1}},
+        {'$limit': 100}
+    ]
+
+@report('courier', 'by_sender')
+def by_sender_pipeline():
+    """Посылки от определенного отправителя (пример)"""
+    return [
+        {'$match': {'sender.name_key': prefix_query('Иванов')}},
+        {'$limit': 50}
+    ]
+
+@report('courier', 'courier_stats', source=stats.COURIER_ROLLUP)
+def courier_stats_pipeline():
+    """Статистика по курьерам (по предрасчитанным итогам курьеров)"""
+    return [
+        {'$match': {'count': {'$gt': 0}}},
+        {'$sort': {'count': -1}},
+        {'$limit': 20}
+    ]
+
+@report('courier', 'all')
+def all_parcels_pipeline():
+    """Все посылки (ограниченное количество)"""
+    return [
+        {'$sort': {'created_at': -1}},
+        {'$limit': 50}
+    ]
+
+# ---------- Отчеты по курсам ----------
+
+@report('courses', 'upcoming_courses')
+def upcoming_courses_pipeline():
+    """Предстоящие курсы"""
+    return [
+        {'$match': {
             'dates.start_date': {'$gte': datetime.now().strftime('%Y-%m-%d')},
-            'status': {'$in': ['Запланирован', 'Набор']}
-        }).sort('dates.start_date', 1).limit(100)),
-        
-        # Курсы с количеством часов более 40
-        'long_courses': list(courses_collection.find({
-            'hours': {'$gt': 40}
-        }).sort('hours', -1).limit(100)),
-        
-        # Курсы определенного преподавателя
-        'by_teacher': list(courses_collection.find({
-            'teacher.name': {'$regex': 'Петров', '$options': 'i'}
-        }).limit(50)),
-        
-        # Курсы с заполненными группами (3 сотрудника)
-        'full_courses': list(courses_collection.find({
-            'employees.2': {'$exists': True}
-        }).limit(100)),
-        
-        # Статистика по отделам
-        'department_stats': list(courses_collection.aggregate([
-            {'$unwind': '$employees'},
-            {'$group': {
-                '_id': '$employees.department',
-                'employee_count': {'$sum': 1},
-                'course_count': {'$addToSet': '$course_name'}
-            }},
-            {'$project': {
-                'department': '$_id',
-                'employee_count': 1,
-                'course_count': {'$size': '$course_count'}
-            }},
-            {'$sort': {'employee_count': -1}},
-            {'$limit': 20}
-        ])),
-        
-        # Все курсы (ограниченное количество)
-        'all': list(courses_collection.find().sort('created_at', -1).limit(50))
-    }
-    
-    # 3. Общая статистика
-    reports_data['general_stats'] = {
-        'total_parcels': courier_collection.count_documents({}),
-        'total_courses': courses_collection.count_documents({}),
-        'parcels_in_transit': courier_collection.count_documents({
-            'status': {'$in': ['В пути', 'Обработка', 'В пункте выдачи']}
-        }),
-        'upcoming_courses_count': courses_collection.count_documents({
-            'dates.start_date': {'$gte': datetime.now().strftime('%Y-%m-%d')}
-        }),
-        'total_delivery_cost': list(courier_collection.aggregate([
-            {'$group': {
-                '_id': None,
-                'total': {'$sum': '$delivery_cost'}
-            }}
-        ]))[0]['total'] if list(courier_collection.aggregate([{'$group': {'_id': None, 'total': {'$sum': '$delivery_cost'}}}])) else 0,
-        'total_course_price': list(courses_collection.aggregate([
-            {'$group': {
-                '_id': None,
-                'total': {'$sum': '$price'}
-            }}
-        ]))[0]['total'] if list(courses_collection.aggregate([{'$group': {'_id': None, 'total': {'$sum': '$price'}}}])) else 0
-    }
-    
-    return reports_data
+            'status': {'$in': UPCOMING_COURSE_STATUSES}
+        }},
+        {'$sort': {'dates.start_date': 1}},
+        {'$limit': 100}
+    ]
+
+@report('courses', 'long_courses')
+def long_courses_pipeline():
+    """Курсы с количеством часов более 40"""
+    return [
+        {'$match': {'hours': {'$gt': 40}}},
+        {'$sort': {'hours': -1}},
+        {'$limit': 100}
+    ]
+
+@report('courses', 'by_teacher')
+def by_teacher_pipeline():
+    """Курсы определенного преподавателя"""
+    return [
+        {'$match': {'teacher.name_key': prefix_query('Петров')}},
+        {'$limit': 50}
+    ]
+
+@report('courses', 'full_courses', full_scan=True)
+def full_courses_pipeline():
+    """Курсы с заполненными группами (3 сотрудника)"""
+    return [
+        {'$match': {'employees.2': {'$exists': True}}},
+        {'$limit': 100}
+    ]
+
+@report('courses', 'department_stats', source=stats.DEPARTMENT_ROLLUP)
+def department_stats_pipeline():
+    """Статистика по отделам (по предрасчитанным итогам отдел/курс)"""
+    return [
+        {'$match': {'employee_count': {'$gt': 0}}},
+        {'$group': {
+            '_id': '$_id.department',
+            'employee_count': {'$sum': '$employee_count'},
+            'course_count': {'$sum': 1}
+        }},
+        {'$project': {
+            'department': '$_id',
+            'employee_count': 1,
+            'course_count': 1
+        }},
+        {'$sort': {'employee_count': -1}},
+        {'$limit': 20}
+    ]
+
+@report('courses', 'all')
+def all_courses_pipeline():
+    """Все курсы (ограниченное количество)"""
+    return [
+        {'$sort': {'created_at': -1}},
+        {'$limit': 50}
+    ]
+
+def report_pipelines(report_type):
+    """Конвейеры отчетов одного типа, которые читают всю исходную коллекцию (для $facet)"""
+    return {name: build() for (rtype, name), build in REPORTS.items()
+            if rtype == report_type and (rtype, name) in FULL_SCAN_REPORTS}
+
+def limit_pipeline(pipeline, max_rows):
+    """Конвейер с ограничением max_rows вместо собственного $limit отчета"""
+    return [stage for stage in pipeline if '$limit' not in stage] + [{'$limit': max_rows}]
+
+def report_cursor(collection, report_type, report_name, max_rows=None, batch_size=None):
+    """Курсор с документами одного отчета из реестра (max_rows - другое ограничение числа строк)"""
+    source = REPORT_SOURCES.get((report_type, report_name))
+    if source:
+        stats.ensure_stats(collection.database)
+        collection = collection.database[source]
+    pipeline = REPORTS[(report_type, report_name)]()
+    if max_rows:
+        pipeline = limit_pipeline(pipeline, max_rows)
+    if batch_size:
+        return collection.aggregate(pipeline, batchSize=batch_size)
+    return collection.aggregate(pipeline)
+
+def run_report(collection, report_type, report_name, max_rows=None):
+    """Выполнение одного отчета из реестра"""
+    return list(report_cursor(collection, report_type, report_name, max_rows))
+
+def generate_report(collection, report_type, report_name, max_rows=None):
+    """Расчет одного отчета из реестра.
+
+    Выполняет только запрос запрошенного отчета и возвращает reports_data
+    с единственным отчетом (того же вида, что и generate_reports), либо None,
+    если такого отчета нет.
+    """
+    if (report_type, report_name) not in REPORTS:
+        return None
+    data = run_report(collection, report_type, report_name, max_rows)
+    return {REPORT_SECTIONS[report_type]: {report_name: data}}
+
+def run_facet(collection, pipelines):
+    """Расчет нескольких отчетов коллекции одной агрегацией $facet.
+
+    Коллекция читается один раз вместо отдельного запроса на каждый отчет.
+    Стадии внутри $facet не используют индексы, поэтому так считаются только
+    отчеты, которые и по отдельности прочитали бы всю коллекцию.
+    """
+    if not pipelines:
+        return {}
+    result = list(collection.aggregate([{'$facet': pipelines}]))
+    result = result[0] if result else {}
+    return {name: result.get(name, []) for name in pipelines}
+
+def collection_reports(collection, report_type):
+    """Все отчеты одного типа: отчеты без индекса - одним $facet, отчеты по индексам
+    и по предрасчитанной статистике - отдельными небольшими запросами"""
+    result = run_facet(collection, report_pipelines(report_type))
+    for rtype, name in REPORTS:
+        if rtype == report_type and name not in result:
+            result[name] = run_report(collection, rtype, name)
+    return {name: result[name] for rtype, name in REPORTS if rtype == report_type}
+
+def general_stats(courier_collection, courses_collection):
+    """Общая статистика: счетчики из stats.py и число предстоящих курсов"""
+    general = stats.get_general_stats(courier_collection.database)
+    # Зависит от текущей даты, поэтому считается запросом по индексу dates.start_date
+    general['upcoming_courses_count'] = courses_collection.count_documents({
+        'dates.start_date': {'$gte': datetime.now().strftime('%Y-%m-%d')}
+    })
+    return general
+
+def generate_reports(courier_collection, courses_collection):
+    """Генерация отчетов.
+
+    Отчеты по индексам выполняются отдельными запросами, отчеты без индекса -
+    одной агрегацией $facet на коллекцию. Отчеты по посылкам, по курсам и
+    общая статистика считаются параллельно.
+    """
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        # Контекст запроса (маршрут для метрик команд MongoDB) передается в потоки
+        courier_future = executor.submit(copy_context().run, collection_reports, courier_collection, 'courier')
+        courses_future = executor.submit(copy_context().run, collection_reports, courses_collection, 'courses')
+        general_future = executor.submit(copy_context().run, general_stats, courier_collection, courses_collection)
+
+        return {
+            # 1. Отчет по курьерской доставке
+            'courier_reports': courier_future.result(),
+            # 2. Отчет по курсам повышения квалификации
+            'courses_reports': courses_future.result(),
+            # 3. Общая статистика
+            'general_stats': general_future.result()
+        }
+
+def courier_summary(courier_collection, query=None):
+    """Сводка по посылкам, подходящим под фильтр: количество, вес, в доставке и доставлено.
+
+    Как и courses_summary, считается одной агрегацией по всему фильтру,
+    а не по документам текущей страницы списка.
+    """
+    result = list(courier_collection.aggregate([
+        {'$match': query or {}},
+        {'$group': {
+            '_id': None,
+            'total_parcels': {'$sum': 1},
+            'total_weight': {'$sum': '$parcel.weight'},
+            'in_transit': {'$sum': {'$cond': [{'$in': ['$status', IN_TRANSIT_STATUSES]}, 1, 0]}},
+            'delivered': {'$sum': {'$cond': [{'$eq': ['$status', DELIVERED_STATUS]}, 1, 0]}}
+        }}
+    ]))
+    if not result:
+        return {'total_parcels': 0, 'total_weight': 0, 'in_transit': 0, 'delivered': 0}
+    summary = result[0]
+    summary.pop('_id', None)
+    return summary
+
+def courses_summary(courses_collection, query=None):
+    """Сводка по курсам, подходящим под фильтр: количество, часы и участники.
+
+    Считается одной агрегацией на стороне MongoDB ($size по массиву сотрудников),
+    а не перебором всех документов в Python.
+    """
+    result = list(courses_collection.aggregate([
+        {'$match': query or {}},
+        {'$group': {
+            '_id': None,
+            'total_courses': {'$sum': 1},
+            'upcoming_courses': {'$sum': {'$cond': [{'$in': ['$status', UPCOMING_COURSE_STATUSES]}, 1, 0]}},
+            'total_hours': {'$sum': '$hours'},
+            'total_employees': {'$sum': {'$size': {'$ifNull': ['$employees', []]}}}
+        }}
+    ]))
+    if not result:
+        return {'total_courses': 0, 'upcoming_courses': 0, 'total_hours': 0, 'total_employees': 0}
+    summary = result[0]
+    summary.pop('_id', None)
+    return summary
 
 if __name__ == '__main__':
     # Тестирование модуля
@@ -0,0 +1,132 @@
+from datetime import datetime
+import os
+import string
+import threading
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+# Коллекция счетчиков: {_id: 'имя:период', value: последний выданный номер}
+SEQUENCES_COLLECTION = 'sequences'
+
+# Сколько номеров процесс получает из MongoDB за один запрос
+SEQUENCE_BLOCK_SIZE = 100
+
+# Число попыток вставки при совпадении уникального поля
+INSERT_ATTEMPTS = 5
+
+TRACKING_ALPHABET = string.digits + string.ascii_uppercase
+TRACKING_WIDTH = 8
+# Множитель, взаимно простой с 36 ** 8: номер дня перемешивается без совпадений,
+# поэтому соседние трек-номера не идут подряд
+TRACKING_MULTIPLIER = 1073741827
+
+COURSE_ALPHABET = string.ascii_uppercase
+COURSE_WIDTH = 3
+
+class SequencePool:
+    """Счетчики номеров по периодам, выдаваемые блоками.
+
+    Блок из block_size номеров резервируется одним атомарным $inc в MongoDB,
+    дальше номера выдаются из памяти процесса без обращения к базе. Разные
+    процессы получают непересекающиеся блоки, поэтому номера не повторяются
+    (неиспользованный остаток блока при перезапуске процесса пропускается).
+    После fork блоки родительского процесса сбрасываются.
+    """
+
+    def __init__(self, collection, block_size=SEQUENCE_BLOCK_SIZE):
+        self.collection = collection
+        self.block_size = block_size
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        # имя счетчика -> [период, следующий номер, последний номер блока]
+        self._blocks = {}
+
+    def next_value(self, name, period):
+        """Следующий номер счетчика name в периоде period (начиная с 1)"""
+        if self._pid != os.getpid():
+            self._reset()
+        with self._lock:
+            block = self._blocks.get(name)
+            if block is None or block[0] != period or block[1] > block[2]:
+                end = self._allocate(f'{name}:{period}')
+                block = self._blocks[name] = [period, end - self.block_size + 1, end]
+            value = block[1]
+            block[1] += 1
+            return value
+
+    def _allocate(self, key):
+        """Резервирование блока номеров, возвращает последний номер блока"""
+        try:
+            document = self.collection.find_one_and_update(
+                {'_id': key}, {'$inc': {'value': self.block_size}},
+                upsert=True, return_document=ReturnDocument.AFTER)
+        except DuplicateKeyError:
+            # Счетчик периода одновременно создал другой процесс - теперь он существует
+            document = self.collection.find_one_and_update(
+                {'_id': key}, {'$inc': {'value': self.block_size}}, return_document=ReturnDocument.AFTER)
+        return document['value']
+
+pools = {}
+pools_lock = threading.Lock()
+# Размер блока для новых пулов (set_block_size)
+default_block_size = SEQUENCE_BLOCK_SIZE
+
+def set_block_size(block_size):
+    """Размер блока пулов, которые будут созданы (пул создается при первой выдаче номера)"""
+    global default_block_size
+    default_block_size = block_size
+
+def get_pool(db, block_size=None):
+    """Общий для процесса пул счетчиков базы db (block_size учитывается при создании)"""
+    with pools_lock:
+        key = (id(db.client), db.name)
+        pool = pools.get(key)
+        if pool is None:
+            pool = pools[key] = SequencePool(db[SEQUENCES_COLLECTION], block_size or default_block_size)
+        return pool
+
+def encode(value, alphabet, width):
+    """Число в строку из символов alphabet, дополненную слева до width символов"""
+    chars = []
+    while value:
+        value, digit = divmod(value, len(alphabet))
+        chars.append(alphabet[digit])
+    return ''.join(reversed(chars)).rjust(width, alphabet[0])
+
+def generate_tracking_number(db):
+    """Трек-номер: TRK, дата и перемешанный номер посылки за день"""
+    timestamp = datetime.now().strftime('%Y%m%d')
+    value = get_pool(db).next_value('tracking_number', timestamp)
+    value = value * TRACKING_MULTIPLIER % len(TRACKING_ALPHABET) ** TRACKING_WIDTH
+    return f"TRK{timestamp}{encode(value, TRACKING_ALPHABET, TRACKING_WIDTH)}"
+
+def generate_course_code(db):
+    """Код курса: COURSE, год и месяц, номер курса за месяц буквами (AAB, AAC, ...)"""
+    timestamp = datetime.now().strftime('%y%m')
+    value = get_pool(db).next_value('course_code', timestamp)
+    return f"COURSE{timestamp}{encode(value, COURSE_ALPHABET, COURSE_WIDTH)}"
+
+def insert_unique(collection, document, field, generate, attempts=INSERT_ATTEMPTS):
+    """Вставка документа с новым значением уникального поля field.
+
+    Значение уже может быть занято документом, созданным до появления
+    счетчиков (случайные коды), - тогда берется следующий номер.
+    """
+    for attempt in range(attempts):
+        document[field] = generate(collection.database)
+        try:
+            return collection.insert_one(document)
+        except DuplicateKeyError as e:
+            document.pop('_id', None)
+            if not duplicate_field(e, field) or attempt == attempts - 1:
+                raise
+
+def duplicate_field(error, field):
+    """Совпадение именно по полю field (а не по другому уникальному индексу)"""
+    key_pattern = (error.details or {}).get('keyPattern')
+    if key_pattern:
+        return field in key_pattern
+    return field in str(error)
@@ -0,0 +1,80 @@
+from datetime import datetime
+import stats
+import reports
+from database import synced_reads
+from documents import build_parcel, build_course, actual_delivery_date, update_changed_fields
+from sequences import insert_unique, generate_tracking_number, generate_course_code
+
+# Запись посылок и курсов, общая для HTML-страниц и JSON API.
+# Данные формы должны быть уже проверены (validation.py).
+
+def create_parcel(collection, form):
+    """Добавление посылки, возвращает сохраненный документ"""
+    parcel = build_parcel(form)
+    parcel['created_at'] = datetime.now()
+    insert_unique(collection, parcel, 'tracking_number', generate_tracking_number)
+    stats.apply_courier_change(collection.database, None, parcel)
+    return parcel
+
+def update_parcel(collection, parcel, form, version):
+    """Сохранение измененных полей посылки (результат - как у update_changed_fields)"""
+    # Если статус изменился на "Доставлено", устанавливается фактическая дата доставки
+    update_data = build_parcel(form, actual_delivery_date(parcel, form['status']))
+    changes = update_changed_fields(collection, parcel, update_data, version)
+    if changes:
+        stats.apply_courier_change(collection.database, parcel, {**parcel, **update_data})
+    return changes
+
+def delete_parcel(collection, parcel_id):
+    """Удаление посылки, возвращает удаленный документ или None"""
+    deleted = collection.find_one_and_delete({'_id': parcel_id})
+    if deleted:
+        stats.apply_courier_change(collection.database, deleted, None)
+    return deleted
+
+def create_course(collection, form):
+    """Добавление курса, возвращает сохраненный документ"""
+    course = build_course(form)
+    course['current_participants'] = 0
+    course['created_at'] = datetime.now()
+    insert_unique(collection, course, 'course_code', generate_course_code)
+    stats.apply_course_change(collection.database, None, course)
+    return course
+
+def update_course(collection, course, form, version):
+    """Сохранение измененных полей курса (результат - как у update_changed_fields)"""
+    # current_participants форма не меняет, поэтому оно не перезаписывается
+    update_data = build_course(form)
+    changes = update_changed_fields(collection, course, update_data, version)
+    if changes:
+        stats.apply_course_change(collection.database, course, {**course, **update_data})
+    return changes
+
+def delete_course(collection, course_id):
+    """Удаление курса, возвращает удаленный документ или None"""
+    deleted = collection.find_one_and_delete({'_id': course_id})
+    if deleted:
+        stats.apply_course_change(collection.database, deleted, None)
+    return deleted
+
+def single_report(report_cache, collections, report_type, report_name):
+    """Один отчет через кэш отчетов (None для неизвестного отчета).
+
+    collections - {'courier': коллекция посылок, 'courses': коллекция курсов}.
+    """
+    if report_type not in collections:
+        return None
+
+    # Версия данных в ключе кэша читается до compute, а synced_reads дожидается на
+    # вторичном узле всех записей до начала расчета - в том числе той, что увеличила версию
+    def compute():
+        with synced_reads(collections[report_type].name):
+            return reports.generate_report(collections[report_type], report_type, report_name)
+    return report_cache.get_or_compute(f'report:{report_type}:{report_name}', [report_type], compute)
+
+def all_reports(report_cache, collections):
+    """Все отчеты страницы отчетов через кэш (при промахе - не старше основного узла)"""
+    def compute():
+        with synced_reads(collections['courier'].name):
+            return reports.generate_reports(collections['courier'], collections['courses'])
+    return report_cache.get_or_compute('reports', ['courier', 'courses'], compute)
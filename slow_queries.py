@@ -0,0 +1,296 @@
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from pymongo import monitoring
+from metrics import current_request
+
+logger = logging.getLogger(__name__)
+
+# Команды, для которых MongoDB умеет explain
+EXPLAINABLE_COMMANDS = {'find', 'aggregate', 'count', 'distinct', 'update', 'delete', 'findAndModify'}
+# Поля команды, которые описывают запрос (служебные - lsid, $db, $clusterTime и т.п. - отбрасываются)
+COMMAND_FIELDS = {
+    'find': ('filter', 'sort', 'projection', 'hint', 'skip', 'limit', 'collation'),
+    'aggregate': ('pipeline', 'hint', 'collation'),
+    'count': ('query', 'hint', 'skip', 'limit', 'collation'),
+    'distinct': ('key', 'query', 'collation'),
+    'update': ('updates',),
+    'delete': ('deletes',),
+    'findAndModify': ('query', 'sort', 'update', 'remove', 'upsert', 'new', 'fields', 'hint', 'collation')
+}
+# Коллекция для сводки медленных запросов всех процессов
+SLOW_QUERIES_COLLECTION = 'slow_queries'
+# Сколько разных форм запросов хранится в памяти процесса
+MAX_SHAPES = 500
+# Повторный explain формы не чаще одного раза за интервал (секунды) - видно смену плана
+EXPLAIN_INTERVAL = 600
+# Стадии плана, которые читают коллекцию или индекс
+SCAN_STAGES = ('COLLSCAN', 'IXSCAN', 'IDHACK', 'COUNT_SCAN', 'DISTINCT_SCAN', 'EOF')
+
+def explain_command(command_name, command):
+    """Команда без служебных полей, пригодная для explain"""
+    explained = {command_name: command[command_name]}
+    for field in COMMAND_FIELDS[command_name]:
+        if field in command:
+            explained[field] = command[field]
+    if command_name == 'aggregate':
+        # Без cursor команда aggregate не принимается (исходный cursor с batchSize не нужен)
+        explained['cursor'] = {}
+    return explained
+
+def value_shape(value):
+    """Форма значения: ключи и операторы сохраняются, значения заменяются на '?'"""
+    if isinstance(value, dict):
+        return {key: value_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        # $in: [...] и подобные - форма не зависит от числа элементов
+        shapes = []
+        for item in value:
+            shape = value_shape(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    return '?'
+
+def query_shape(command_name, command):
+    """Форма запроса: команда, коллекция и структура фильтра/сортировки/конвейера без значений"""
+    shape = {'command': command_name, 'collection': command[command_name]}
+    for field in COMMAND_FIELDS[command_name]:
+        if field not in command:
+            continue
+        if field in ('sort', 'projection', 'fields', 'hint', 'key'):
+            # Поля и направления сортировки определяют план, их значения не скрываются
+            shape[field] = command[field]
+        elif field == 'updates' or field == 'deletes':
+            shape[field] = [value_shape(statement.get('q')) for statement in command[field]]
+        else:
+            shape[field] = value_shape(command[field])
+    return shape
+
+def shape_key(shape):
+    return hashlib.sha1(json.dumps(shape, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+
+def find_planner_stats(explain):
+    """queryPlanner и executionStats из ответа explain (у aggregate они могут быть внутри $cursor)"""
+    if 'queryPlanner' in explain:
+        return explain['queryPlanner'], explain.get('executionStats', {})
+    for stage in explain.get('stages', []):
+        cursor = stage.get('$cursor')
+        if cursor and 'queryPlanner' in cursor:
+            return cursor['queryPlanner'], cursor.get('executionStats', {})
+    for shard in (explain.get('shards') or {}).values():
+        return find_planner_stats(shard)
+    return {}, {}
+
+def plan_stages(plan):
+    """Стадии выигравшего плана сверху вниз, например ['FETCH', 'IXSCAN']"""
+    stages = []
+    pending = [plan] if plan else []
+    while pending:
+        node = pending.pop(0)
+        if 'queryPlan' in node:
+            # План движка SBE
+            node = node['queryPlan']
+        if node.get('stage'):
+            stages.append(node['stage'] + (f" {node['indexName']}" if node.get('indexName') else ''))
+        if 'inputStage' in node:
+            pending.append(node['inputStage'])
+        pending.extend(node.get('inputStages', []))
+    return stages
+
+def summarize_explain(explain):
+    """docsExamined, keysExamined, nReturned и стадии плана из explain('executionStats')"""
+    planner, execution = find_planner_stats(explain)
+    stages = plan_stages(planner.get('winningPlan', {}))
+    scans = [stage for stage in stages if stage.split(' ')[0] in SCAN_STAGES]
+    return {
+        'stages': stages,
+        'plan': ', '.join(scans) or (stages[-1] if stages else ''),
+        'collscan': any(stage == 'COLLSCAN' for stage in stages),
+        'docs_examined': execution.get('totalDocsExamined'),
+        'keys_examined': execution.get('totalKeysExamined'),
+        'n_returned': execution.get('nReturned'),
+        'execution_ms': execution.get('executionTimeMillis')
+    }
+
+class SlowQueryLog(monitoring.CommandListener):
+    """Поиск медленных команд MongoDB и их explain('executionStats').
+
+    Команда дольше threshold_ms попадает в сводку по форме запроса (фильтр
+    и конвейер без значений). Для новой формы (и повторно раз в
+    EXPLAIN_INTERVAL секунд) отдельный поток выполняет explain: в сводку
+    записываются стадии плана и docsExamined/keysExamined/nReturned, в лог -
+    предупреждение, если план новый или изменился. При store=True сводка
+    также копится в коллекции slow_queries (общая для всех процессов).
+
+    Пока threshold_ms не задан, обработчики событий ничего не делают.
+    """
+
+    def __init__(self):
+        self.threshold_ms = None
+        self.database = None
+        self.store = False
+        self._commands = {}
+        self._summaries = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=100)
+        self._thread = None
+        self._pid = None
+
+    def configure(self, database, threshold_ms, store=False):
+        """Включение режима (threshold_ms=None или 0 - выключен). database - любая БД клиента"""
+        self.database = database
+        self.threshold_ms = threshold_ms or None
+        self.store = store
+
+    def started(self, event):
+        if self.threshold_ms is None or event.command_name not in EXPLAINABLE_COMMANDS:
+            return
+        if event.command.get(event.command_name) == SLOW_QUERIES_COLLECTION:
+            return
+        state = current_request.get()
+        with self._lock:
+            self._commands[(event.connection_id, event.request_id)] = (
+                event.database_name, event.command, state['route'] if state else '-')
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+    def _finish(self, event):
+        with self._lock:
+            started = self._commands.pop((event.connection_id, event.request_id), None)
+        threshold_ms = self.threshold_ms
+        if started is None or threshold_ms is None or event.duration_micros < threshold_ms * 1000:
+            return
+        database_name, command, route = started
+        self.record(database_name, event.command_name, command, event.duration_micros / 1000, route)
+
+    def record(self, database_name, command_name, command, duration_ms, route='-'):
+        """Учет медленной команды в сводке и, если нужно, постановка explain в очередь"""
+        shape = query_shape(command_name, command)
+        key = shape_key(shape)
+        now = time.time()
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None:
+                if len(self._summaries) >= MAX_SHAPES:
+                    # Вытесняется форма, которая дольше всех не встречалась
+                    oldest = min(self._summaries, key=lambda k: self._summaries[k]['last_seen'])
+                    del self._summaries[oldest]
+                summary = self._summaries[key] = {
+                    'shape_id': key, 'shape': shape, 'database': database_name, 'routes': [],
+                    'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'first_seen': now, 'last_seen': now,
+                    'explain': None, 'explained_at': None, 'explain_pending': False
+                }
+            summary['count'] += 1
+            summary['total_ms'] += duration_ms
+            summary['max_ms'] = max(summary['max_ms'], duration_ms)
+            summary['last_seen'] = now
+            if route not in summary['routes']:
+                summary['routes'].append(route)
+            explain_due = (not summary['explain_pending'] and
+                           (summary['explained_at'] is None or now - summary['explained_at'] >= EXPLAIN_INTERVAL))
+            if explain_due:
+                summary['explain_pending'] = True
+        if explain_due:
+            self._enqueue((key, database_name, command_name, command, duration_ms))
+        elif self.store:
+            self._enqueue((key, database_name, None, None, duration_ms))
+
+    def _enqueue(self, task):
+        self._start()
+        try:
+            self._queue.put_nowait(task)
+        except queue.Full:
+            # Очередь переполнена - explain будет при следующей медленной команде этой формы
+            if task[2] is not None:
+                with self._lock:
+                    if task[0] in self._summaries:
+                        self._summaries[task[0]]['explain_pending'] = False
+
+    def _start(self):
+        """Поток explain (один на процесс, перезапускается после fork)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='slow-queries', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            task = self._queue.get()
+            try:
+                self.process(*task)
+            except Exception as e:
+                logger.warning('Ошибка обработки медленного запроса: %s', e)
+            finally:
+                self._queue.task_done()
+
+    def process(self, key, database_name, command_name, command, duration_ms):
+        """explain команды (в потоке slow-queries, не в обработчике события) и запись сводки"""
+        explain = None
+        if command_name is not None:
+            try:
+                result = self.database.client[database_name].command(
+                    'explain', explain_command(command_name, command), verbosity='executionStats')
+                explain = summarize_explain(result)
+            except Exception as e:
+                explain = {'error': str(e)}
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None:
+                return
+            if command_name is not None:
+                previous = summary['explain']
+                summary['explain'] = explain
+                summary['explained_at'] = time.time()
+                summary['explain_pending'] = False
+            summary = dict(summary)
+        if command_name is not None and (previous is None or previous.get('plan') != explain.get('plan')):
+            logger.warning('Медленный запрос %s.%s (%.1f мс, маршруты %s): план %s, docsExamined=%s, '
+                           'keysExamined=%s, nReturned=%s, форма %s',
+                           database_name, summary['shape']['collection'], duration_ms, ', '.join(summary['routes']),
+                           explain.get('plan') or explain.get('error'), explain.get('docs_examined'),
+                           explain.get('keys_examined'), explain.get('n_returned'),
+                           json.dumps(summary['shape'], ensure_ascii=False, default=str))
+        if self.store:
+            self._store(summary, duration_ms, explain)
+
+    def _store(self, summary, duration_ms, explain):
+        """Сводка формы в коллекции slow_queries (счетчики складываются из всех процессов)"""
+        # Форма - строкой JSON: операторы ($in, $match) нельзя сохранять как имена полей через update
+        update = {
+            '$setOnInsert': {'shape': json.dumps(summary['shape'], ensure_ascii=False, sort_keys=True, default=str),
+                             'collection': summary['shape']['collection'], 'database': summary['database']},
+            '$inc': {'count': 1, 'total_ms': duration_ms},
+            '$max': {'max_ms': duration_ms, 'last_seen': summary['last_seen']},
+            '$addToSet': {'routes': {'$each': summary['routes']}}
+        }
+        if explain is not None:
+            update['$set'] = {'explain': explain, 'explained_at': summary['explained_at']}
+        self.database[SLOW_QUERIES_COLLECTION].update_one({'_id': summary['shape_id']}, update, upsert=True)
+
+    def summaries(self):
+        """Сводка медленных запросов процесса, самые затратные формы первыми"""
+        with self._lock:
+            items = [dict(summary, routes=list(summary['routes'])) for summary in self._summaries.values()]
+        for item in items:
+            item['avg_ms'] = round(item['total_ms'] / item['count'], 1)
+            del item['explain_pending']
+        return sorted(items, key=lambda item: item['total_ms'], reverse=True)
+
+    def wait(self, timeout=5):
+        """Ожидание обработки очереди explain (для CLI и проверок)"""
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.01)
+
+slow_query_log = SlowQueryLog()
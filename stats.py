@@ -0,0 +1,253 @@
+from datetime import datetime
+from pymongo import UpdateOne, ReplaceOne
+import threading
+
+# Статусы посылок, которые считаются "в процессе доставки"
+IN_TRANSIT_STATUSES = ['В пути', 'Обработка', 'В пункте выдачи']
+
+# Коллекции с предрасчитанной статистикой
+COUNTERS = 'stats_counters'
+COURIER_ROLLUP = 'courier_rollup'
+DEPARTMENT_ROLLUP = 'department_rollup'
+
+# Первичный расчет статистики выполняется одним потоком процесса
+rebuild_lock = threading.Lock()
+
+# Точность сравнения денежных сумм и веса при проверке согласованности
+TOLERANCE = 0.01
+
+def courier_counters(parcel):
+    """Вклад посылки в общие счетчики"""
+    if not parcel:
+        return {'total_parcels': 0, 'parcels_in_transit': 0, 'total_delivery_cost': 0}
+    return {
+        'total_parcels': 1,
+        'parcels_in_transit': 1 if parcel.get('status') in IN_TRANSIT_STATUSES else 0,
+        'total_delivery_cost': parcel.get('delivery_cost', 0) or 0
+    }
+
+def courier_rollup_entry(parcel):
+    """Вклад посылки в статистику курьера: (имя курьера, показатели) или None"""
+    if not parcel:
+        return None
+    name = (parcel.get('courier') or {}).get('name')
+    if name in (None, ''):
+        return None
+    return name, {
+        'count': 1,
+        'total_weight': (parcel.get('parcel') or {}).get('weight', 0) or 0,
+        'total_cost': parcel.get('delivery_cost', 0) or 0
+    }
+
+def course_counters(course):
+    """Вклад курса в общие счетчики"""
+    if not course:
+        return {'total_courses': 0, 'total_course_price': 0}
+    return {'total_courses': 1, 'total_course_price': course.get('price', 0) or 0}
+
+def department_rollup_entries(course):
+    """Вклад курса в статистику отделов: {(отдел, название курса): число сотрудников}"""
+    entries = {}
+    if not course:
+        return entries
+    for employee in course.get('employees', []):
+        key = (employee.get('department'), course.get('course_name'))
+        entries[key] = entries.get(key, 0) + 1
+    return entries
+
+def subtract(new, old):
+    """Разница показателей, без нулевых значений"""
+    delta = {}
+    for field in set(new) | set(old):
+        value = new.get(field, 0) - old.get(field, 0)
+        if value:
+            delta[field] = value
+    return delta
+
+def apply_courier_change(db, old, new):
+    """Обновление статистики после добавления (old=None), изменения или удаления (new=None) посылки.
+
+    Все изменения выполняются атомарными $inc, поэтому одновременные
+    записи из разных запросов не теряют обновления друг друга.
+    """
+    apply_courier_changes(db, [(old, new)])
+
+def apply_courier_changes(db, changes):
+    """Обновление статистики после пакета изменений посылок [(old, new), ...].
+
+    Вклады всех изменений складываются, поэтому пакет из любого числа
+    посылок дает не больше двух запросов к базе.
+    """
+    delta = {}
+    rollup = {}
+    removed = False
+    for old, new in changes:
+        for field, value in subtract(courier_counters(new), courier_counters(old)).items():
+            delta[field] = delta.get(field, 0) + value
+        for entry, sign in ((courier_rollup_entry(old), -1), (courier_rollup_entry(new), 1)):
+            if entry:
+                name, values = entry
+                inc = rollup.setdefault(name, {})
+                for field, value in values.items():
+                    inc[field] = inc.get(field, 0) + sign * value
+        removed = removed or bool(old)
+
+    delta = subtract(delta, {})
+    if delta:
+        db[COUNTERS].update_one({'_id': 'courier'}, {'$inc': delta}, upsert=True)
+
+    operations = []
+    for name, inc in rollup.items():
+        inc = subtract(inc, {})
+        if inc:
+            operations.append(UpdateOne({'_id': name}, {'$inc': inc}, upsert=True))
+    if operations:
+        db[COURIER_ROLLUP].bulk_write(operations, ordered=False)
+        if removed:
+            db[COURIER_ROLLUP].delete_many({'count': {'$lte': 0}})
+
+def apply_course_change(db, old, new):
+    """Обновление статистики после добавления (old=None), изменения или удаления (new=None) курса"""
+    apply_course_changes(db, [(old, new)])
+
+def apply_course_changes(db, changes):
+    """Обновление статистики после пакета изменений курсов [(old, new), ...]"""
+    delta = {}
+    rollup = {}
+    removed = False
+    for old, new in changes:
+        for field, value in subtract(course_counters(new), course_counters(old)).items():
+            delta[field] = delta.get(field, 0) + value
+        for key, count in subtract(department_rollup_entries(new), department_rollup_entries(old)).items():
+            rollup[key] = rollup.get(key, 0) + count
+        removed = removed or bool(old)
+
+    delta = subtract(delta, {})
+    if delta:
+        db[COUNTERS].update_one({'_id': 'courses'}, {'$inc': delta}, upsert=True)
+
+    operations = [UpdateOne({'_id': {'department': department, 'course_name': course_name}},
+                            {'$inc': {'employee_count': count}}, upsert=True)
+                  for (department, course_name), count in subtract(rollup, {}).items()]
+    if operations:
+        db[DEPARTMENT_ROLLUP].bulk_write(operations, ordered=False)
+        if removed:
+            db[DEPARTMENT_ROLLUP].delete_many({'employee_count': {'$lte': 0}})
+
+def compute_stats(db):
+    """Полный пересчет статистики по исходным коллекциям"""
+    courier_collection = db['courier_deliveries']
+    courses_collection = db['qualification_courses']
+
+    courier_totals = list(courier_collection.aggregate([
+        {'$group': {
+            '_id': None,
+            'total_parcels': {'$sum': 1},
+            'parcels_in_transit': {'$sum': {'$cond': [{'$in': ['$status', IN_TRANSIT_STATUSES]}, 1, 0]}},
+            'total_delivery_cost': {'$sum': '$delivery_cost'}
+        }}
+    ]))
+    courses_totals = list(courses_collection.aggregate([
+        {'$group': {
+            '_id': None,
+            'total_courses': {'$sum': 1},
+            'total_course_price': {'$sum': '$price'}
+        }}
+    ]))
+    courier_rollup = list(courier_collection.aggregate([
+        {'$match': {'courier.name': {'$nin': [None, '']}}},
+        {'$group': {
+            '_id': '$courier.name',
+            'count': {'$sum': 1},
+            'total_weight': {'$sum': '$parcel.weight'},
+            'total_cost': {'$sum': '$delivery_cost'}
+        }}
+    ]))
+    department_rollup = list(courses_collection.aggregate([
+        {'$unwind': '$employees'},
+        {'$group': {
+            '_id': {'department': '$employees.department', 'course_name': '$course_name'},
+            'employee_count': {'$sum': 1}
+        }}
+    ]))
+
+    courier = courier_totals[0] if courier_totals else courier_counters(None)
+    courses = courses_totals[0] if courses_totals else course_counters(None)
+    courier['_id'] = 'courier'
+    courses['_id'] = 'courses'
+    return {
+        COUNTERS: [courier, courses],
+        COURIER_ROLLUP: courier_rollup,
+        DEPARTMENT_ROLLUP: department_rollup
+    }
+
+def rebuild_stats(db):
+    """Пересчет предрасчитанной статистики с нуля.
+
+    Записи, сделанные во время пересчета, могут в него не попасть:
+    запускайте при остановленной записи и проверяйте результат check_stats.
+    """
+    computed = compute_stats(db)
+    for name, documents in computed.items():
+        # Замена по _id вместо очистки коллекции: повторный или одновременный
+        # пересчет не приводит к ошибкам дублирования ключа
+        if documents:
+            db[name].bulk_write([ReplaceOne({'_id': doc['_id']}, doc, upsert=True) for doc in documents],
+                                ordered=False)
+        keep = [doc['_id'] for doc in documents] + (['meta'] if name == COUNTERS else [])
+        db[name].delete_many({'_id': {'$nin': keep}})
+    db[COUNTERS].update_one({'_id': 'meta'}, {'$set': {'rebuilt_at': datetime.now()}}, upsert=True)
+    return {name: len(documents) for name, documents in computed.items()}
+
+def check_stats(db):
+    """Сравнение предрасчитанной статистики с полным пересчетом.
+
+    Возвращает список расхождений (пустой, если статистика согласована).
+    """
+    problems = []
+    computed = compute_stats(db)
+    for name, documents in computed.items():
+        expected = {str(doc['_id']): doc for doc in documents}
+        stored = {str(doc['_id']): doc for doc in db[name].find({'_id': {'$ne': 'meta'}})}
+        for key in sorted(set(expected) | set(stored)):
+            expected_doc = expected.get(key, {})
+            stored_doc = stored.get(key, {})
+            for field in set(expected_doc) | set(stored_doc):
+                if field == '_id':
+                    continue
+                expected_value = expected_doc.get(field, 0) or 0
+                stored_value = stored_doc.get(field, 0) or 0
+                if abs(expected_value - stored_value) > TOLERANCE:
+                    problems.append(f'{name} {key} {field}: сохранено {stored_value}, ожидается {expected_value}')
+    return problems
+
+def ensure_stats(db):
+    """Первичный расчет статистики, если она еще ни разу не строилась.
+
+    Дальше счетчики поддерживаются apply_*_change отдельной записью $inc
+    после записи самого документа (без транзакции). Если процесс упадет
+    между этими записями, счетчики разойдутся с данными до проверки
+    (flask stats-check) и пересчета (flask stats-rebuild).
+    """
+    if db[COUNTERS].find_one({'_id': 'meta'}) is None:
+        with rebuild_lock:
+            if db[COUNTERS].find_one({'_id': 'meta'}) is None:
+                rebuild_stats(db)
+
+def get_general_stats(db):
+    """Общие счетчики посылок и курсов без сканирования коллекций"""
+    counters = {doc['_id']: doc for doc in db[COUNTERS].find({'_id': {'$in': ['courier', 'courses', 'meta']}})}
+    if 'meta' not in counters:
+        # Статистика еще ни разу не строилась - считаем ее один раз полностью
+        ensure_stats(db)
+        return get_general_stats(db)
+
+    courier = counters.get('courier', {})
+    courses = counters.get('courses', {})
+    return {
+        'total_parcels': courier.get('total_parcels', 0),
+        'total_courses': courses.get('total_courses', 0),
+        'parcels_in_transit': courier.get('parcels_in_transit', 0),
+        'total_delivery_cost': courier.get('total_delivery_cost', 0),
+        'total_course_price': courses.get('total_course_price', 0)
+    }
@@ -0,0 +1,109 @@
+from datetime import datetime
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
+import stats
+from documents import actual_delivery_date, VERSION_FIELD
+
+# Максимальное число посылок в одном запросе
+MAX_BULK_ITEMS = 1000
+
+# Поля посылки, нужные для смены статуса и обновления статистики
+STATUS_PROJECTION = {
+    'tracking_number': 1,
+    'status': 1,
+    'dates.actual_delivery_date': 1,
+    'courier.name': 1,
+    'parcel.weight': 1,
+    'delivery_cost': 1
+}
+
+# Результаты по отдельным посылкам
+UPDATED = 'updated'
+UNCHANGED = 'unchanged'
+NOT_FOUND = 'not_found'
+CONFLICT = 'conflict'
+DUPLICATE = 'duplicate'
+
+def parse_item(item):
+    """Условие поиска посылки по ObjectId или трек-номеру"""
+    item = str(item).strip()
+    if ObjectId.is_valid(item):
+        return '_id', ObjectId(item)
+    return 'tracking_number', item.upper()
+
+def find_parcels(collection, keys):
+    """Посылки по списку ключей parse_item одним запросом: {(поле, значение): посылка}"""
+    ids = [value for field, value in keys if field == '_id']
+    tracking_numbers = [value for field, value in keys if field == 'tracking_number']
+    found = {}
+    query = {'$or': [{'_id': {'$in': ids}}, {'tracking_number': {'$in': tracking_numbers}}]}
+    for parcel in collection.find(query, STATUS_PROJECTION):
+        found[('_id', parcel['_id'])] = parcel
+        found[('tracking_number', parcel.get('tracking_number'))] = parcel
+    return found
+
+def update_statuses(collection, items, status):
+    """Смена статуса списка посылок (ObjectId или трек-номера) одним bulk_write.
+
+    Меняются только status, updated_at и, при переходе в "Доставлено",
+    dates.actual_delivery_date. Обновление выполняется только если статус
+    посылки не изменился с момента чтения, иначе посылка получает результат
+    conflict. Возвращает результаты по каждому элементу items в том же порядке.
+    """
+    keys = [parse_item(item) for item in items]
+    parcels = find_parcels(collection, keys)
+    now = datetime.now()
+
+    results = []
+    operations = []
+    changes = {}
+    for item, key in zip(items, keys):
+        parcel = parcels.get(key)
+        result = {'item': item}
+        results.append(result)
+        if parcel is None:
+            result['result'] = NOT_FOUND
+            continue
+
+        result['id'] = str(parcel['_id'])
+        result['tracking_number'] = parcel.get('tracking_number')
+        if parcel['_id'] in changes:
+            result['result'] = DUPLICATE
+            continue
+        if parcel.get('status') == status:
+            result['result'] = UNCHANGED
+            changes[parcel['_id']] = None
+            continue
+
+        update = {'status': status, 'updated_at': now}
+        delivered = actual_delivery_date(parcel, status)
+        if delivered != (parcel.get('dates') or {}).get('actual_delivery_date'):
+            update['dates.actual_delivery_date'] = delivered
+        # Версия увеличивается, чтобы открытая форма редактирования не перезаписала новый статус
+        operations.append(UpdateOne({'_id': parcel['_id'], 'status': parcel.get('status')},
+                                    {'$set': update, '$inc': {VERSION_FIELD: 1}}))
+        changes[parcel['_id']] = parcel
+        result['result'] = UPDATED
+
+    updated_ids = {parcel_id for parcel_id, parcel in changes.items() if parcel is not None}
+    if operations:
+        write_result = collection.bulk_write(operations, ordered=False)
+        if write_result.matched_count < len(operations):
+            # Часть посылок изменилась после чтения - находим реально обновленные
+            updated_ids = {parcel['_id'] for parcel in collection.find(
+                {'_id': {'$in': list(updated_ids)}, 'updated_at': now, 'status': status}, {'_id': 1})}
+            for result in results:
+                if result['result'] == UPDATED and ObjectId(result['id']) not in updated_ids:
+                    result['result'] = CONFLICT
+
+        stats.apply_courier_changes(collection.database, [
+            (changes[parcel_id], {**changes[parcel_id], 'status': status}) for parcel_id in updated_ids])
+
+    return results
+
+def summarize(results):
+    """Число посылок по каждому результату"""
+    summary = {}
+    for result in results:
+        summary[result['result']] = summary.get(result['result'], 0) + 1
+    return summary
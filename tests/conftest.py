@@ -0,0 +1,16 @@
+import os
+import sys
+
+import mongomock
+import pytest
+
+# Модули приложения лежат в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def mongo_client():
+    return mongomock.MongoClient()
+
+@pytest.fixture
+def db(mongo_client):
+    return mongo_client['documents_test']
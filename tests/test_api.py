@@ -0,0 +1,124 @@
+from flask import Flask
+import pytest
+
+import database
+from api import api
+from cache import MemoryBackend, ReportCache
+from tracking import TrackingCache
+from test_stats import parcel_form, course_form
+
+@pytest.fixture
+def app(mongo_client):
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    app.extensions['report_cache'] = ReportCache(MemoryBackend())
+    app.extensions['tracking_cache'] = TrackingCache()
+    database.connection.use_client(mongo_client)
+    yield app
+    database.connection.configure(database.MONGO_URI, database.MONGO_DB)
+
+@pytest.fixture
+def test_client(app):
+    return app.test_client()
+
+@pytest.fixture
+def parcel(test_client):
+    response = test_client.post('/api/v1/parcels', json=parcel_form())
+    assert response.status_code == 201
+    return response.get_json()
+
+def test_get_by_tracking_number_or_id(test_client, parcel):
+    response = test_client.get(f'/api/v1/parcels/{parcel["tracking_number"].lower()}')
+    assert response.status_code == 200
+    assert response.get_json()['_id'] == parcel['_id']
+    assert test_client.get(f'/api/v1/parcels/{parcel["_id"]}').get_json()['tracking_number'] == \
+        parcel['tracking_number']
+
+@pytest.mark.parametrize('path', ['/api/v1/parcels', '/api/v1/parcels/{tracking_number}', '/api/v1/courses'])
+def test_matching_etag_returns_304(test_client, parcel, path):
+    path = path.format(tracking_number=parcel['tracking_number'])
+    response = test_client.get(path)
+    assert response.status_code == 200 and response.headers['ETag']
+
+    cached = test_client.get(path, headers={'If-None-Match': response.headers['ETag']})
+    assert cached.status_code == 304
+    assert cached.data == b''
+    assert test_client.get(path, headers={'If-None-Match': '"other"'}).status_code == 200
+
+def test_etag_changes_after_update(test_client, parcel):
+    path = f'/api/v1/parcels/{parcel["tracking_number"]}'
+    etag = test_client.get(path).headers['ETag']
+    test_client.patch(path, json={'status': 'Доставлено'})
+    assert test_client.get(path, headers={'If-None-Match': etag}).status_code == 200
+
+def test_patch_keeps_other_fields_and_increments_version(test_client, parcel):
+    response = test_client.patch(f'/api/v1/parcels/{parcel["tracking_number"]}',
+                                 json={'status': 'Обработка', 'weight': 4, 'version': 0})
+    assert response.status_code == 200
+    updated = response.get_json()
+    assert updated['status'] == 'Обработка'
+    assert updated['parcel']['weight'] == 4.0
+    assert updated['version'] == 1
+    for field in ('sender', 'receiver', 'courier', 'tracking_number', 'delivery_cost', 'dates'):
+        assert updated[field] == parcel[field]
+    assert updated['parcel']['dimensions'] == parcel['parcel']['dimensions']
+
+def test_patch_without_changes_keeps_version(test_client, parcel):
+    response = test_client.patch(f'/api/v1/parcels/{parcel["_id"]}', json={'status': parcel['status']})
+    assert response.status_code == 200
+    assert response.get_json().get('version', 0) == 0
+
+def test_stale_version_is_a_conflict(test_client, parcel):
+    path = f'/api/v1/parcels/{parcel["tracking_number"]}'
+    assert test_client.patch(path, json={'status': 'Обработка', 'version': 0}).status_code == 200
+
+    response = test_client.patch(path, json={'status': 'Отменено', 'version': 0})
+    assert response.status_code == 409
+    assert response.get_json()['version'] == 1
+    assert test_client.get(path).get_json()['status'] == 'Обработка'
+
+def test_put_replaces_all_fields(test_client):
+    course = test_client.post('/api/v1/courses', json=course_form()).get_json()
+    response = test_client.put(f'/api/v1/courses/{course["course_code"]}',
+                               json=course_form(price='20000', employee_2_name='', employee_2_position=''))
+    assert response.status_code == 200
+    updated = response.get_json()
+    assert updated['price'] == 20000.0
+    assert [employee['name'] for employee in updated['employees']] == ['Козлов']
+    assert updated['version'] == 1
+
+@pytest.mark.parametrize('method, fields', [
+    ('post', {'weight': '-1'}),
+    ('post', {'courier_phone': '123'}),
+    ('patch', {'dispatch_date': '2000-01-01'}),
+    ('put', {'receiver_name': ''})
+])
+def test_validation_errors_are_422(test_client, parcel, method, fields):
+    if method == 'post':
+        response = test_client.post('/api/v1/parcels', json=parcel_form(**fields))
+    elif method == 'patch':
+        response = test_client.patch(f'/api/v1/parcels/{parcel["_id"]}', json=fields)
+    else:
+        response = test_client.put(f'/api/v1/parcels/{parcel["_id"]}', json=parcel_form(**fields))
+    assert response.status_code == 422
+    assert response.get_json()['errors']
+    assert test_client.get('/api/v1/parcels').get_json()['items'][0]['status'] == parcel['status']
+
+def test_body_must_be_json_object(test_client, parcel):
+    assert test_client.post('/api/v1/parcels', json=[1]).status_code == 400
+    assert test_client.patch(f'/api/v1/parcels/{parcel["_id"]}', data='x').status_code == 400
+
+@pytest.mark.parametrize('method', ['get', 'patch', 'put', 'delete'])
+def test_unknown_tracking_number_is_404(test_client, parcel, method):
+    response = getattr(test_client, method)('/api/v1/parcels/TRK00000000UNKNOWN', json={'status': 'Обработка'})
+    assert response.status_code == 404
+    assert test_client.get('/api/v1/track/TRK00000000UNKNOWN').status_code == 404
+    assert test_client.get('/api/v1/unknown').status_code == 404
+
+def test_delete(test_client, parcel):
+    path = f'/api/v1/parcels/{parcel["tracking_number"]}'
+    assert test_client.get(f'/api/v1/track/{parcel["tracking_number"]}').status_code == 200
+    assert test_client.delete(path).status_code == 204
+    assert test_client.get(path).status_code == 404
+    # Удаление сбрасывает и кэш отслеживания
+    assert test_client.get(f'/api/v1/track/{parcel["tracking_number"]}').status_code == 404
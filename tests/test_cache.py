@@ -0,0 +1,132 @@
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+import threading
+import time
+
+import fakeredis
+import pytest
+
+from cache import ArtifactCache, MemoryBackend, RedisBackend, ReportCache, create_backend
+
+@pytest.fixture(params=['memory', 'redis'])
+def backend(request):
+    if request.param == 'memory':
+        return MemoryBackend(max_size=16)
+    return RedisBackend(fakeredis.FakeRedis(), lock_timeout=5)
+
+def test_create_backend():
+    assert isinstance(create_backend(None), MemoryBackend)
+    assert not MemoryBackend.shared and RedisBackend.shared
+
+def test_value_cached_until_collection_invalidated(backend):
+    cache = ReportCache(backend, ttl=60)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {'calls': len(calls)}
+
+    assert cache.get_or_compute('reports', ['courier', 'courses'], compute) == {'calls': 1}
+    assert cache.get_or_compute('reports', ['courier', 'courses'], compute) == {'calls': 1}
+    assert cache.invalidate('courses') == 1
+    assert cache.data_version('courses') == 1
+    assert cache.get_or_compute('reports', ['courier', 'courses'], compute) == {'calls': 2}
+
+def test_invalidation_only_affects_dependent_keys(backend):
+    cache = ReportCache(backend, ttl=60)
+    cache.get_or_compute('courier', ['courier'], lambda: 'old courier')
+    cache.get_or_compute('courses', ['courses'], lambda: 'old courses')
+    cache.invalidate('courier')
+    assert cache.get_or_compute('courier', ['courier'], lambda: 'new courier') == 'new courier'
+    assert cache.get_or_compute('courses', ['courses'], lambda: 'new courses') == 'old courses'
+
+def test_versions_shared_between_redis_backends():
+    server = fakeredis.FakeServer()
+    first = ReportCache(RedisBackend(fakeredis.FakeRedis(server=server)))
+    second = ReportCache(RedisBackend(fakeredis.FakeRedis(server=server)))
+    first.get_or_compute('reports', ['courier'], lambda: 'old')
+    # Запись в другом процессе сбрасывает кэш и этого процесса
+    second.invalidate('courier')
+    assert first.get_or_compute('reports', ['courier'], lambda: 'new') == 'new'
+
+def test_none_is_not_cached(backend):
+    cache = ReportCache(backend)
+    assert cache.get_or_compute('missing', ['courier'], lambda: None) is None
+    assert cache.get_or_compute('missing', ['courier'], lambda: 'found') == 'found'
+
+def test_stampede_lock_computes_once(backend):
+    cache = ReportCache(backend, ttl=60)
+    calls = []
+    started = threading.Barrier(8)
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return 'report'
+
+    def request():
+        started.wait()
+        return cache.get_or_compute('reports', ['courier'], compute)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: request(), range(8)))
+    assert results == ['report'] * 8
+    assert len(calls) == 1
+
+def test_memory_backend_ttl_and_lru(monkeypatch):
+    backend = MemoryBackend(max_size=2)
+    backend.set('a', 1, ttl=10)
+    backend.set('b', 2, ttl=10)
+    assert backend.get('a') == 1
+    backend.set('c', 3, ttl=10)
+    # 'b' дольше всех не использовался
+    assert backend.get('b') is None
+    assert backend.get('a') == 1
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 11)
+    assert backend.get('a') is None
+    # Счетчики версий не вытесняются вместе с записями
+    backend.incr_counter('version:courier')
+    assert backend.get_counter('version:courier') == 1
+
+def test_artifact_cache_in_memory_limits_bytes():
+    cache = ArtifactCache(max_bytes=10, ttl=60)
+    cache.put('a', b'12345')
+    cache.put('b', b'12345')
+    assert cache.get('a') == b'12345'
+    cache.put('c', b'12345')
+    assert cache.get('b') is None
+    assert cache.get('a') == b'12345'
+    cache.put('big', b'x' * 11)
+    assert cache.get('big') is None
+
+def test_artifact_cache_directory_shared_between_processes(tmp_path):
+    first = ArtifactCache(max_bytes=10, ttl=60, directory=str(tmp_path))
+    second = ArtifactCache(max_bytes=10, ttl=60, directory=str(tmp_path))
+    first.put('pdf:courier:all:v1', b'12345')
+    assert second.get('pdf:courier:all:v1') == b'12345'
+
+    # Размер считается по всему каталогу: два процесса вместе не превышают max_bytes
+    second.put('docx:courier:all:v1', b'67890')
+    first.get('pdf:courier:all:v1')
+    second.put('pdf:courses:all:v1', b'abcde')
+    assert sum(path.stat().st_size for path in tmp_path.iterdir()) <= 10
+    assert first.get('docx:courier:all:v1') is None
+    assert second.get('pdf:courier:all:v1') == b'12345'
+
+def test_artifact_cache_directory_removes_expired_files(tmp_path):
+    writer = ArtifactCache(ttl=60, directory=str(tmp_path))
+    writer.put('pdf:courier:all:v1', b'old')
+    stale_tmp = tmp_path / 'interrupted.123.tmp'
+    stale_tmp.write_bytes(b'partial')
+    old = time.time() - 120
+    for path in tmp_path.iterdir():
+        os.utime(path, (old, old))
+    assert writer.get('pdf:courier:all:v1') is None
+
+    # Устаревшие файлы другого процесса удаляются при следующей записи или запуске
+    ArtifactCache(ttl=60, directory=str(tmp_path)).put('pdf:courses:all:v1', b'new')
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        hashlib.sha1(b'pdf:courses:all:v1').hexdigest()]
@@ -0,0 +1,211 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+
+from bson import Int64, Timestamp
+from flask import Flask, jsonify
+import pytest
+
+import database
+import services
+from cache import MemoryBackend, ReportCache
+from database import CAUSAL_SESSION_KEY, PRIMARY, SECONDARY, CLIENT_OPTIONS
+
+class FakeSession:
+    """causal-сессия: запоминает переданное время, после записи и чтения с основного узла получает новое"""
+
+    def __init__(self, client):
+        self.client = client
+        self.advanced = {}
+        self.operation_time = None
+        self.cluster_time = None
+        self.ended = False
+
+    def advance_cluster_time(self, cluster_time):
+        self.advanced['cluster_time'] = cluster_time
+
+    def advance_operation_time(self, operation_time):
+        self.advanced['operation_time'] = operation_time
+
+    def operate(self):
+        self.client.clock += 1
+        self.operation_time = Timestamp(1700000000, self.client.clock)
+        self.cluster_time = {'clusterTime': self.operation_time,
+                             'signature': {'hash': b'\0' * 20, 'keyId': Int64(7)}}
+
+    def end_session(self):
+        self.ended = True
+
+class FakeCollection:
+    """Коллекция mongomock, которая принимает session и записывает режим чтения каждого вызова"""
+
+    def __init__(self, client, collection, read_preference=None):
+        self._client = client
+        self._collection = collection
+        self.read_preference = read_preference
+
+    def with_options(self, read_preference):
+        return FakeCollection(self._client, self._collection, read_preference)
+
+    def __getattr__(self, attr):
+        method = getattr(self._collection, attr)
+        if not callable(method):
+            return method
+
+        def call(*args, session=None, **kwargs):
+            mode = self.read_preference.mongos_mode if self.read_preference else None
+            self._client.calls.append((attr, mode, session))
+            if session is not None and (attr in database.WRITE_METHODS or mode == PRIMARY):
+                session.operate()
+            return method(*args, **kwargs)
+        return call
+
+class FakeDatabase:
+    def __init__(self, client, db):
+        self._client = client
+        self._db = db
+
+    def __getitem__(self, name):
+        return FakeCollection(self._client, self._db[name])
+
+class FakeClient:
+    def __init__(self, mongo_client):
+        self._mongo_client = mongo_client
+        self.calls = []
+        self.sessions = []
+        self.clock = 0
+
+    def __getitem__(self, name):
+        return FakeDatabase(self, self._mongo_client[name])
+
+    def start_session(self, causal_consistency):
+        assert causal_consistency
+        session = FakeSession(self)
+        self.sessions.append(session)
+        return session
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def client(mongo_client):
+    return FakeClient(mongo_client)
+
+@pytest.fixture
+def app(client):
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.config.update({key: None for key in CLIENT_OPTIONS})
+    app.config.update({
+        'MONGO_URI': database.MONGO_URI,
+        'MONGO_DB': 'documents_test',
+        'MONGO_SECONDARY_READS': True,
+        'MONGO_MAX_STALENESS_SECONDS': 30,
+        'MONGO_READ_ROUTES': {'list_items': SECONDARY, 'reports': SECONDARY, 'all_reports': SECONDARY}
+    })
+    items = database.db['items']
+    report_cache = ReportCache(MemoryBackend())
+
+    @app.route('/items', methods=['POST'])
+    def add_item():
+        items.insert_one({'name': 'item'})
+        return jsonify({})
+
+    @app.route('/items')
+    def list_items():
+        return jsonify(len(list(items.find({}, {'_id': 0}))))
+
+    @app.route('/reports')
+    def reports():
+        def count():
+            return items.count_documents({})
+        with database.synced_reads('items'):
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                threaded = executor.submit(copy_context().run, count).result()
+            return jsonify({'count': count(), 'threaded': threaded})
+
+    @app.route('/all-reports')
+    def all_reports():
+        services.all_reports(report_cache, {'courier': database.db['courier_deliveries'],
+                                            'courses': database.db['qualification_courses']})
+        return jsonify({})
+
+    database.init_app(app)
+    database.connection.use_client(client)
+    yield app
+    database.connection.configure_reads(False)
+    database.connection.configure(database.MONGO_URI, database.MONGO_DB)
+
+def test_parse_read_routes():
+    assert database.parse_read_routes('list=secondary, view=primary,bad=other,=primary') == {
+        'list': SECONDARY, 'view': PRIMARY}
+    assert database.parse_read_routes(None) == {}
+
+def test_max_staleness_not_below_mongodb_minimum(app):
+    assert database.connection.max_staleness_seconds == database.MIN_MAX_STALENESS_SECONDS
+
+def test_route_modes_and_request_session(app, client):
+    with app.test_client() as test_client:
+        assert test_client.get('/items').status_code == 200
+    assert client.calls == [('find', 'secondaryPreferred', client.sessions[0])]
+    assert client.sessions[0].ended
+    assert client.sessions[0].advanced == {}
+
+def test_causal_token_propagation(app, client):
+    with app.test_client() as test_client:
+        test_client.post('/items')
+        write_session = client.sessions[0]
+        with test_client.session_transaction() as flask_session:
+            assert CAUSAL_SESSION_KEY in flask_session
+
+        test_client.get('/items')
+        read_session = client.sessions[1]
+    # Время записи передается сессии следующего запроса, в том числе Int64 keyId подписи
+    assert read_session.advanced == {'operation_time': write_session.operation_time,
+                                     'cluster_time': write_session.cluster_time}
+    assert isinstance(read_session.advanced['cluster_time']['signature']['keyId'], Int64)
+    assert client.calls[-1] == ('find', 'secondaryPreferred', read_session)
+
+def test_read_without_write_keeps_token(app, client):
+    with app.test_client() as test_client:
+        test_client.post('/items')
+        with test_client.session_transaction() as flask_session:
+            token = flask_session[CAUSAL_SESSION_KEY]
+        test_client.get('/items')
+        with test_client.session_transaction() as flask_session:
+            assert flask_session[CAUSAL_SESSION_KEY] == token
+
+def test_synced_reads_in_request_and_report_threads(app, client):
+    with app.test_client() as test_client:
+        assert test_client.get('/reports').get_json() == {'count': 0, 'threaded': 0}
+    request_session, thread_session = client.sessions
+    # Время основного узла берется одним коротким чтением, отчеты читаются с вторичного
+    assert client.calls[0] == ('find_one', 'primary', request_session)
+    assert sorted(client.calls[1:], key=lambda call: call[2] is thread_session) == [
+        ('count_documents', 'secondaryPreferred', request_session),
+        ('count_documents', 'secondaryPreferred', thread_session)]
+    # Поток отчета читает в своей сессии, которая дожидается того же времени
+    assert thread_session.advanced == {'operation_time': request_session.operation_time,
+                                       'cluster_time': request_session.cluster_time}
+    assert request_session.ended and thread_session.ended
+
+def test_report_cache_reads_use_route_preference(app, client):
+    with app.test_client() as test_client:
+        test_client.get('/all-reports')
+        calls = list(client.calls)
+        # Повторный запрос берет отчеты из кэша
+        test_client.get('/all-reports')
+    assert client.calls == calls
+    assert calls[0] == ('find_one', 'primary', client.sessions[0])
+    assert {mode for attr, mode, session in calls[1:]} == {'secondaryPreferred'}
+    assert all(session is not None for attr, mode, session in calls)
+
+def test_report_cache_on_primary_route_is_not_synced(app, client):
+    app.config['MONGO_READ_ROUTES']['all_reports'] = PRIMARY
+    with app.test_client() as test_client:
+        test_client.get('/all-reports')
+    assert client.calls
+    assert {(attr == 'find_one', mode) for attr, mode, session in client.calls} == {(False, 'primary')}
+
+def test_without_request_reads_use_default_collection(app, client):
+    database.db['items'].find_one({})
+    assert client.calls == [('find_one', None, None)]
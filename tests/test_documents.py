@@ -0,0 +1,63 @@
+from documents import changed_fields, document_version, form_version, update_changed_fields
+
+def test_changed_fields_compares_nested_documents_by_field():
+    document = {'status': 'В пути', 'parcel': {'weight': 2.0, 'fragile': False},
+                'employees': [{'name': 'Иванов'}], 'note': None}
+    update = {'status': 'В пути', 'parcel': {'weight': 2.5, 'fragile': False},
+              'employees': [{'name': 'Иванов'}, {'name': 'Петров'}], 'courier': {'name': 'Сидоров'}}
+    assert changed_fields(document, update) == {
+        'parcel.weight': 2.5,
+        'employees': [{'name': 'Иванов'}, {'name': 'Петров'}],
+        'courier': {'name': 'Сидоров'}
+    }
+    assert changed_fields(document, {'status': 'В пути', 'parcel': {'weight': 2.0}}) == {}
+
+def test_form_version():
+    assert form_version({'version': '3'}, {'version': 5}) == 3
+    assert form_version({}, {'version': 5}) == 5
+    assert form_version({'version': 'x'}, {}) == 0
+
+def test_update_writes_only_changes_and_increments_version(db):
+    collection = db['courier_deliveries']
+    collection.insert_one({'_id': 1, 'status': 'В пути', 'parcel': {'weight': 2.0, 'width': 10}, 'version': 2})
+    document = collection.find_one({'_id': 1})
+
+    changes = update_changed_fields(collection, document, {'status': 'Доставлено', 'parcel': {'weight': 2.0}}, 2)
+    assert set(changes) == {'status', 'updated_at'}
+    saved = collection.find_one({'_id': 1})
+    assert saved['status'] == 'Доставлено'
+    assert saved['parcel'] == {'weight': 2.0, 'width': 10}
+    assert document_version(saved) == 3
+
+def test_update_without_changes_does_not_write(db):
+    collection = db['courier_deliveries']
+    collection.insert_one({'_id': 1, 'status': 'В пути', 'version': 1})
+    document = collection.find_one({'_id': 1})
+    assert update_changed_fields(collection, document, {'status': 'В пути'}, 1) == {}
+    assert collection.find_one({'_id': 1}) == document
+
+def test_stale_form_version_is_a_conflict(db):
+    collection = db['courier_deliveries']
+    collection.insert_one({'_id': 1, 'status': 'В пути', 'version': 4})
+    document = collection.find_one({'_id': 1})
+    assert update_changed_fields(collection, document, {'status': 'Доставлено'}, 3) is None
+    assert collection.find_one({'_id': 1})['status'] == 'В пути'
+
+def test_concurrent_update_is_a_conflict(db):
+    collection = db['courier_deliveries']
+    collection.insert_one({'_id': 1, 'status': 'В пути', 'version': 1})
+    first = collection.find_one({'_id': 1})
+    second = collection.find_one({'_id': 1})
+    assert update_changed_fields(collection, first, {'status': 'Доставлено'}, 1)
+    # Второй пользователь открыл ту же версию, но документ уже изменен
+    assert update_changed_fields(collection, second, {'status': 'Отменено'}, 1) is None
+    saved = collection.find_one({'_id': 1})
+    assert saved['status'] == 'Доставлено' and saved['version'] == 2
+
+def test_document_without_version_field(db):
+    collection = db['courier_deliveries']
+    collection.insert_one({'_id': 1, 'status': 'В пути'})
+    document = collection.find_one({'_id': 1})
+    assert document_version(document) == 0
+    assert update_changed_fields(collection, document, {'status': 'Доставлено'}, 0)
+    assert collection.find_one({'_id': 1})['version'] == 1
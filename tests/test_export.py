@@ -0,0 +1,40 @@
+from reportlab.platypus import TableStyle
+import pytest
+
+from export import TableStream
+
+HEADER = ['№', 'Название']
+STYLE = TableStyle([('GRID', (0, 0), (-1, -1), 0.5, (0, 0, 0))])
+
+def make_stream(count):
+    return TableStream(HEADER, ([str(i), f'строка {i}'] for i in range(count)), [40, 200], STYLE)
+
+def measured(stream, width=300):
+    stream._measure(width, 1000)
+    return stream.header_height, stream.row_height
+
+@pytest.mark.parametrize('fits', [1, 2, 5])
+def test_split_part_fits_frame(fits):
+    stream = make_stream(20)
+    header_height, row_height = measured(stream)
+    height = header_height + row_height * (fits + 0.5)
+    table, rest = stream.split(300, height)
+    assert len(table._cellvalues) == fits + 1
+    assert table.wrap(300, height)[1] <= height
+    assert rest is stream
+
+def test_split_keeps_all_rows_in_order():
+    stream = make_stream(7)
+    header_height, row_height = measured(stream)
+    rows = []
+    parts = [stream]
+    while parts[-1] is stream:
+        parts = stream.split(300, header_height + row_height * 3.5)
+        rows.extend(row[0] for row in parts[0]._cellvalues[1:])
+    assert rows == [str(i) for i in range(7)]
+    assert stream.wrap(300, 100) == (0, 0)
+
+def test_split_without_room_for_a_row():
+    stream = make_stream(3)
+    header_height, row_height = measured(stream)
+    assert stream.split(300, header_height + row_height * 0.5) == []
@@ -0,0 +1,115 @@
+import csv
+import io
+
+from pymongo.errors import BulkWriteError
+import pytest
+
+import importer
+import stats
+from importer import import_rows, read_rows
+from test_stats import parcel_form, course_form
+
+class ImportCollection:
+    """Коллекция с уникальными полями: ошибки insert_many как у MongoDB (keyPattern в writeErrors)"""
+
+    def __init__(self, collection, unique):
+        self._collection = collection
+        self.database = collection.database
+        self.unique = unique
+        self.batches = []
+
+    def insert_many(self, documents, ordered=True):
+        self.batches.append(len(documents))
+        errors = []
+        for index, document in enumerate(documents):
+            field = next((field for field in self.unique
+                          if self._collection.find_one({field: document.get(field)})), None)
+            if field:
+                errors.append({'index': index, 'code': 11000, 'keyPattern': {field: 1},
+                               'errmsg': f'E11000 duplicate key error dup key: {field}'})
+            else:
+                self._collection.insert_one(document)
+        if errors:
+            raise BulkWriteError({'writeErrors': errors, 'nInserted': len(documents) - len(errors)})
+
+def csv_rows(forms):
+    stream = io.StringIO()
+    writer = csv.DictWriter(stream, fieldnames=list(forms[0]))
+    writer.writeheader()
+    writer.writerows(forms)
+    stream.seek(0)
+    return read_rows(stream, 'csv')
+
+def generator(values):
+    """Генератор уникального поля, выдающий заданные значения по очереди"""
+    values = iter(values)
+    return lambda db: next(values)
+
+@pytest.fixture
+def collection(db):
+    stats.ensure_stats(db)
+    return db['courier_deliveries']
+
+def test_validation_errors_have_file_row_numbers(collection):
+    forms = [parcel_form(), parcel_form(weight='-1'), parcel_form(), parcel_form(courier_phone='123')]
+    report = import_rows(collection, 'courier', csv_rows(forms))
+    assert (report.total, report.inserted, report.error_count) == (4, 2, 2)
+    # Первая строка CSV - заголовок
+    assert [error['row'] for error in report.errors] == [3, 5]
+    assert all(error['errors'] for error in report.errors)
+
+def test_ndjson_row_numbers_skip_blank_lines(collection):
+    stream = io.StringIO('{"weight": 1}\n\nnot json\n[1]\n')
+    report = import_rows(collection, 'courier', read_rows(stream, 'ndjson'))
+    errors = {error['row']: error['errors'] for error in report.errors}
+    assert sorted(errors) == [1, 3, 4]
+    assert errors[3][0].startswith('Неверный JSON')
+    assert errors[4] == ['Строка должна содержать JSON-объект']
+
+def test_batches_split_by_batch_size(db, collection):
+    wrapped = ImportCollection(collection, ['tracking_number'])
+    report = import_rows(wrapped, 'courier', csv_rows([parcel_form() for _ in range(7)]), batch_size=3)
+    assert wrapped.batches == [3, 3, 1]
+    assert report.inserted == 7
+    assert collection.count_documents({}) == 7
+    assert stats.check_stats(db) == []
+
+def test_duplicate_key_regenerates_only_failed_documents(db, collection, monkeypatch):
+    collection.insert_one({'tracking_number': 'TAKEN'})
+    stats.rebuild_stats(db)
+    monkeypatch.setitem(importer.IMPORTERS['courier'], 'generate',
+                        generator(['A', 'TAKEN', 'B', 'TAKEN', 'C', 'D']))
+    wrapped = ImportCollection(collection, ['tracking_number'])
+
+    report = import_rows(wrapped, 'courier', csv_rows([parcel_form() for _ in range(4)]))
+    # Повторно вставляются только две строки с занятым номером, им выдаются C и D
+    assert wrapped.batches == [4, 2]
+    assert (report.inserted, report.error_count) == (4, 0)
+    numbers = sorted(doc['tracking_number'] for doc in collection.find({'status': {'$exists': True}}))
+    assert numbers == ['A', 'B', 'C', 'D']
+    assert stats.check_stats(db) == []
+
+def test_duplicate_after_attempts_or_other_index_is_an_error(db, monkeypatch):
+    courses = db['qualification_courses']
+    courses.insert_one({'course_code': 'TAKEN', 'course_name': 'Занято'})
+    stats.ensure_stats(db)
+    monkeypatch.setitem(importer.IMPORTERS['courses'], 'generate', generator(['TAKEN', 'X', 'TAKEN', 'TAKEN']))
+    wrapped = ImportCollection(courses, ['course_code', 'course_name'])
+
+    forms = [course_form(), course_form(course_name='Занято')]
+    report = import_rows(wrapped, 'courses', csv_rows(forms))
+    assert report.inserted == 0
+    # Первая строка получает занятый код при каждой из трех попыток, совпадение
+    # второй по другому уникальному полю не исправить новым кодом - без повторов
+    assert wrapped.batches == [2, 1, 1]
+    assert sorted(error['row'] for error in report.errors) == [2, 3]
+    assert stats.check_stats(db) == []
+
+def test_course_stats_match_inserted_documents(db):
+    stats.ensure_stats(db)
+    forms = [course_form(), course_form(course_name='Основы SQL', employee_2_name='', employee_2_position=''),
+             course_form(hours='x')]
+    report = import_rows(db['qualification_courses'], 'courses', csv_rows(forms), batch_size=2)
+    assert (report.inserted, report.error_count) == (2, 1)
+    assert db['stats_counters'].find_one({'_id': 'courses'})['total_courses'] == 2
+    assert stats.check_stats(db) == []
@@ -0,0 +1,103 @@
+import json
+import os
+import time
+
+import pytest
+
+from jobs import DONE, FAILED, QUEUED, JobQueue
+
+# Функции рендера выполняются в отдельном процессе (spawn), поэтому объявлены в модуле
+
+def render_params(params, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(params, f)
+
+def render_flaky(params, path):
+    marker = params['marker']
+    if not os.path.exists(marker):
+        open(marker, 'w').close()
+        raise RuntimeError('первая попытка')
+    render_params(params, path)
+
+def render_failing(params, path):
+    raise ValueError('отчет не построен')
+
+def render_slow(params, path):
+    with open(path, 'w') as f:
+        f.write('часть файла')
+    time.sleep(30)
+
+def wait_for(queue, job_id, statuses, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job is not None and job['status'] in statuses:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f'задача не перешла в {statuses}: {queue.get(job_id)}')
+
+@pytest.fixture
+def make_queue(tmp_path):
+    def make(render, **options):
+        options = {'retry_delay': 0, 'poll_interval': 0.05, **options}
+        return JobQueue(str(tmp_path / 'jobs.sqlite3'), str(tmp_path / 'results'), render=render, **options)
+    return make
+
+def test_job_done_and_worker_params_not_stored(make_queue, tmp_path):
+    queue = make_queue(render_params, worker_params={'mongo_uri': 'mongodb://user:secret@db/'})
+    job_id = queue.submit({'report_type': 'courier', 'report_name': 'all'})
+    job = wait_for(queue, job_id, {DONE})
+    assert job['attempts'] == 1
+    assert job['params'] == {'report_type': 'courier', 'report_name': 'all'}
+    with open(queue.result_path(job_id), encoding='utf-8') as f:
+        assert json.load(f)['mongo_uri'] == 'mongodb://user:secret@db/'
+    with open(tmp_path / 'jobs.sqlite3', 'rb') as f:
+        assert b'secret' not in f.read()
+
+def test_failed_attempt_is_retried(make_queue, tmp_path):
+    queue = make_queue(render_flaky, max_attempts=3)
+    job_id = queue.submit({'marker': str(tmp_path / 'marker')})
+    job = wait_for(queue, job_id, {DONE})
+    assert job['attempts'] == 2
+    assert job['error'] is None
+
+def test_job_fails_after_max_attempts(make_queue):
+    queue = make_queue(render_failing, max_attempts=2)
+    job_id = queue.submit({})
+    job = wait_for(queue, job_id, {FAILED})
+    assert job['attempts'] == 2
+    assert job['error'] == 'ValueError: отчет не построен'
+    assert not os.path.exists(queue.result_path(job_id) + '.error')
+
+def test_timeout_terminates_attempt_and_removes_partial_file(make_queue):
+    queue = make_queue(render_slow, timeout=1, max_attempts=1)
+    job_id = queue.submit({})
+    job = wait_for(queue, job_id, {FAILED})
+    assert job['error'] == 'Превышено время выполнения (1 с)'
+    assert os.listdir(queue.results_dir) == []
+
+def test_timed_out_attempt_is_queued_again(make_queue):
+    queue = make_queue(render_slow, timeout=1, max_attempts=2, retry_delay=60)
+    job_id = queue.submit({})
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job['error']:
+            break
+        time.sleep(0.05)
+    # Следующая попытка - через retry_delay * число попыток
+    assert job['status'] == QUEUED
+    assert job['attempts'] == 1
+    assert job['available_at'] > time.time() + 30
+
+def test_results_expire(make_queue):
+    queue = make_queue(render_params, result_ttl=0.5)
+    job_id = queue.submit({})
+    wait_for(queue, job_id, {DONE})
+    path = queue.result_path(job_id)
+    assert os.path.exists(path)
+    deadline = time.time() + 10
+    while os.path.exists(path) and time.time() < deadline:
+        time.sleep(0.05)
+    assert queue.get(job_id) is None
+    assert not os.path.exists(path)
@@ -0,0 +1,37 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+import threading
+
+from flask import Flask
+
+import metrics
+
+def test_timings_from_report_threads_are_summed():
+    token = metrics.current_request.set({'route': '/reports', 'timings': {}, 'lock': threading.Lock()})
+    try:
+        def add():
+            for _ in range(1000):
+                metrics.add_timing('mongo', 0.001)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            for future in [executor.submit(copy_context().run, add) for _ in range(4)]:
+                future.result()
+        assert round(metrics.current_request.get()['timings']['mongo'], 6) == 4.0
+    finally:
+        metrics.current_request.reset(token)
+
+def test_server_timing_header():
+    app = Flask(__name__)
+    app.config['METRICS_SERVER_TIMING'] = False
+
+    @app.route('/report')
+    def report():
+        with metrics.timer('export_render_duration_seconds', 'export', format='pdf', report='test'):
+            pass
+        return 'ok'
+
+    metrics.init_app(app)
+    client = app.test_client()
+    assert 'Server-Timing' not in client.get('/report').headers
+    header = client.get('/report', headers={'X-Server-Timing': '1'}).headers['Server-Timing']
+    assert [part.split(';')[0] for part in header.split(', ')] == ['total', 'export']
+    assert 'http_request_duration_seconds_bucket{' in metrics.registry.render()
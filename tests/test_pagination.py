@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+import pytest
+
+from pagination import decode_cursor, encode_cursor, get_per_page, paginate
+
+@pytest.fixture
+def collection(db):
+    collection = db['courier_deliveries']
+    created_at = datetime(2024, 5, 1, 12, 0)
+    # Пары документов с одинаковым created_at: порядок внутри пары задает _id
+    collection.insert_many([{'n': n, 'status': 'В пути' if n % 3 else 'Доставлено',
+                             'created_at': created_at + timedelta(minutes=n // 2)} for n in range(25)])
+    return collection
+
+def newest_first(collection, query=None):
+    return [doc['n'] for doc in collection.find(query or {}).sort([('created_at', -1), ('_id', -1)])]
+
+def test_cursor_round_trip():
+    document = {'_id': ObjectId(), 'created_at': datetime(2024, 5, 1, 12, 30, 15, 123000)}
+    assert decode_cursor(encode_cursor(document)) == (document['created_at'], document['_id'])
+    legacy = {'_id': ObjectId()}
+    assert decode_cursor(encode_cursor(legacy)) == (None, legacy['_id'])
+
+@pytest.mark.parametrize('cursor', [None, '', 'не base64', 'fHh4', encode_cursor({'_id': 'x'})])
+def test_invalid_cursor_is_ignored(cursor):
+    assert decode_cursor(cursor) is None
+
+def test_per_page_limits():
+    assert get_per_page(None) == 20
+    assert get_per_page('5') == 5
+    assert get_per_page('0') == 1
+    assert get_per_page('1000') == 100
+
+def test_pages_forward_and_back(collection):
+    expected = newest_first(collection)
+    pages = []
+    page = paginate(collection, {}, per_page=10)
+    assert page['prev_cursor'] is None
+    while True:
+        pages.append([doc['n'] for doc in page['items']])
+        if not page['next_cursor']:
+            break
+        page = paginate(collection, {}, after=page['next_cursor'], per_page=10)
+    assert [n for items in pages for n in items] == expected
+    assert [len(items) for items in pages] == [10, 10, 5]
+
+    # Назад от последней страницы - те же документы, что и при движении вперед
+    back = paginate(collection, {}, before=page['prev_cursor'], per_page=10)
+    assert [doc['n'] for doc in back['items']] == pages[1]
+    assert back['next_cursor'] and back['prev_cursor']
+    first = paginate(collection, {}, before=back['prev_cursor'], per_page=10)
+    assert [doc['n'] for doc in first['items']] == pages[0]
+    assert first['prev_cursor'] is None
+
+def test_pages_with_filter_and_projection(collection):
+    query = {'status': 'Доставлено'}
+    page = paginate(collection, query, projection={'n': 1, 'created_at': 1}, per_page=5)
+    second = paginate(collection, query, projection={'n': 1, 'created_at': 1}, after=page['next_cursor'], per_page=5)
+    assert [doc['n'] for doc in page['items'] + second['items']] == newest_first(collection, query)
+    assert second['next_cursor'] is None
+    assert set(page['items'][0]) == {'_id', 'n', 'created_at'}
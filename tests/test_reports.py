@@ -0,0 +1,49 @@
+import reports
+
+def test_courier_summary_covers_whole_filter(db):
+    collection = db['courier_deliveries']
+    collection.insert_many([
+        {'status': 'В пути', 'parcel': {'weight': 1.5}},
+        {'status': 'В пункте выдачи', 'parcel': {'weight': 2.0}},
+        {'status': 'Доставлено', 'parcel': {'weight': 3.25}},
+        {'status': 'Отменено', 'parcel': {'weight': 10}}
+    ])
+    assert reports.courier_summary(collection) == {
+        'total_parcels': 4, 'total_weight': 16.75, 'in_transit': 2, 'delivered': 1}
+    assert reports.courier_summary(collection, {'status': 'Доставлено'}) == {
+        'total_parcels': 1, 'total_weight': 3.25, 'in_transit': 0, 'delivered': 1}
+    assert reports.courier_summary(collection, {'status': 'Принято'}) == {
+        'total_parcels': 0, 'total_weight': 0, 'in_transit': 0, 'delivered': 0}
+
+class RecordingCollection:
+    """Коллекция, которая запоминает конвейеры aggregate"""
+
+    def __init__(self, collection):
+        self._collection = collection
+        self.pipelines = []
+
+    def aggregate(self, pipeline, **kwargs):
+        self.pipelines.append(pipeline)
+        return self._collection.aggregate(pipeline, **kwargs)
+
+    def __getattr__(self, attr):
+        return getattr(self._collection, attr)
+
+def test_only_full_scan_reports_use_facet(db):
+    courses = db['qualification_courses']
+    courses.insert_many([{'hours': hours, 'status': 'Набор', 'employees': [{}] * (hours % 4),
+                          'dates': {'start_date': '2999-01-01'}, 'created_at': hours} for hours in range(30, 50)])
+    recording = RecordingCollection(courses)
+    result = reports.collection_reports(recording, 'courses')
+
+    facets = [pipeline[0]['$facet'] for pipeline in recording.pipelines if '$facet' in pipeline[0]]
+    assert [set(facet) for facet in facets] == [{'full_courses'}]
+    assert list(result) == [name for rtype, name in reports.REPORTS if rtype == 'courses']
+    for name in ('long_courses', 'upcoming_courses', 'full_courses'):
+        assert result[name] == reports.run_report(courses, 'courses', name)
+    assert len(result['full_courses']) == 5
+
+def test_collection_without_full_scan_reports_skips_facet(db):
+    recording = RecordingCollection(db['courier_deliveries'])
+    reports.collection_reports(recording, 'courier')
+    assert not any('$facet' in pipeline[0] for pipeline in recording.pipelines)
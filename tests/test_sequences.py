@@ -0,0 +1,88 @@
+from datetime import datetime
+import re
+
+from pymongo.errors import DuplicateKeyError
+import pytest
+
+import sequences
+from sequences import (COURSE_ALPHABET, TRACKING_ALPHABET, SequencePool, encode, generate_course_code,
+                       generate_tracking_number, insert_unique)
+
+@pytest.fixture(autouse=True)
+def fresh_pools(monkeypatch):
+    monkeypatch.setattr(sequences, 'pools', {})
+
+def test_encode():
+    assert encode(0, TRACKING_ALPHABET, 8) == '00000000'
+    assert encode(35, TRACKING_ALPHABET, 8) == '0000000Z'
+    assert encode(36, TRACKING_ALPHABET, 3) == '010'
+    assert encode(1, COURSE_ALPHABET, 3) == 'AAB'
+    assert encode(26, COURSE_ALPHABET, 3) == 'ABA'
+
+def test_tracking_numbers_are_unique_and_formatted(db):
+    numbers = [generate_tracking_number(db) for _ in range(500)]
+    day = datetime.now().strftime('%Y%m%d')
+    assert all(re.fullmatch(f'TRK{day}[0-9A-Z]{{8}}', number) for number in numbers)
+    assert len(set(numbers)) == len(numbers)
+    # Номер дня перемешан: соседние трек-номера отличаются не только последним символом
+    assert all(current[:-1] != following[:-1] for current, following in zip(numbers, numbers[1:]))
+
+def test_course_codes_follow_counter(db):
+    month = datetime.now().strftime('%y%m')
+    assert [generate_course_code(db) for _ in range(3)] == [f'COURSE{month}AAB', f'COURSE{month}AAC',
+                                                            f'COURSE{month}AAD']
+
+def test_pools_allocate_disjoint_blocks(db):
+    first = SequencePool(db['sequences'], block_size=10)
+    second = SequencePool(db['sequences'], block_size=10)
+    values = [first.next_value('n', 'p') for _ in range(3)] + [second.next_value('n', 'p') for _ in range(3)]
+    values += [first.next_value('n', 'p') for _ in range(10)]
+    assert values[:6] == [1, 2, 3, 11, 12, 13]
+    assert len(set(values)) == len(values)
+    assert db['sequences'].find_one({'_id': 'n:p'})['value'] == 30
+
+def test_new_period_starts_from_one(db):
+    pool = SequencePool(db['sequences'], block_size=5)
+    assert [pool.next_value('n', '2401'), pool.next_value('n', '2401'), pool.next_value('n', '2402')] == [1, 2, 1]
+
+class UniqueCollection:
+    """Коллекция с уникальным полем: ошибка вставки как у MongoDB (keyPattern в details)"""
+
+    def __init__(self, db, field, taken, index_field=None):
+        self.database = db
+        self.field = field
+        self.taken = set(taken)
+        self.index_field = index_field or field
+        self.inserted = []
+
+    def insert_one(self, document):
+        if document[self.field] in self.taken:
+            raise DuplicateKeyError('E11000 duplicate key error', 11000, {'keyPattern': {self.index_field: 1}})
+        self.taken.add(document[self.field])
+        self.inserted.append(document)
+
+def test_insert_unique_skips_taken_values(db):
+    month = datetime.now().strftime('%y%m')
+    # Код, выданный до появления счетчиков
+    collection = UniqueCollection(db, 'course_code', [f'COURSE{month}AAB'])
+    course = {'title': 'Курс'}
+    insert_unique(collection, course, 'course_code', generate_course_code)
+    assert course['course_code'] == f'COURSE{month}AAC'
+    assert collection.inserted == [course]
+
+def test_insert_unique_gives_up_after_attempts(db):
+    collection = UniqueCollection(db, 'course_code', ['TAKEN'])
+    with pytest.raises(DuplicateKeyError):
+        insert_unique(collection, {}, 'course_code', lambda db: 'TAKEN', attempts=3)
+
+def test_other_unique_index_is_not_retried(db):
+    # Совпадение по другому уникальному индексу новым номером не исправить
+    collection = UniqueCollection(db, 'course_code', ['CODE'], index_field='tracking_number')
+    calls = []
+
+    def generate(db):
+        calls.append(1)
+        return 'CODE'
+    with pytest.raises(DuplicateKeyError):
+        insert_unique(collection, {}, 'course_code', generate)
+    assert len(calls) == 1
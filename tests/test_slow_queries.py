@@ -0,0 +1,130 @@
+from datetime import datetime
+
+from bson import ObjectId
+
+from slow_queries import explain_command, query_shape, shape_key, summarize_explain
+
+FIND = {
+    'find': 'courier_deliveries',
+    'filter': {'status': {'$in': ['В пути', 'Обработка']}, 'courier.name_key': {'$regex': '^сид'},
+               'created_at': {'$lt': datetime(2024, 1, 1)}, '_id': ObjectId('65a000000000000000000001')},
+    'sort': {'created_at': -1, '_id': -1},
+    'projection': {'tracking_number': 1, 'status': 1},
+    'limit': 21,
+    'lsid': {'id': 'session'},
+    '$db': 'documents_db'
+}
+
+AGGREGATE = {
+    'aggregate': 'qualification_courses',
+    'pipeline': [
+        {'$match': {'status': 'Набор', 'price': {'$gte': 1000, '$lte': 5000}}},
+        {'$unwind': '$employees'},
+        {'$group': {'_id': '$employees.department', 'count': {'$sum': 1}}},
+        {'$sort': {'count': -1}},
+        {'$limit': 10}
+    ],
+    'cursor': {'batchSize': 101},
+    '$db': 'documents_db'
+}
+
+def test_find_shape_replaces_values_and_keeps_operators():
+    assert query_shape('find', FIND) == {
+        'command': 'find',
+        'collection': 'courier_deliveries',
+        'filter': {'status': {'$in': ['?']}, 'courier.name_key': {'$regex': '?'},
+                   'created_at': {'$lt': '?'}, '_id': '?'},
+        # Поля сортировки и проекции определяют план и не скрываются
+        'sort': {'created_at': -1, '_id': -1},
+        'projection': {'tracking_number': 1, 'status': 1},
+        'limit': '?'
+    }
+
+def test_aggregate_shape():
+    assert query_shape('aggregate', AGGREGATE) == {
+        'command': 'aggregate',
+        'collection': 'qualification_courses',
+        'pipeline': [
+            {'$match': {'status': '?', 'price': {'$gte': '?', '$lte': '?'}}},
+            {'$unwind': '?'},
+            {'$group': {'_id': '?', 'count': {'$sum': '?'}}},
+            {'$sort': {'count': '?'}},
+            {'$limit': '?'}
+        ]
+    }
+
+def test_same_shape_for_different_values():
+    other = {**FIND, 'filter': {'status': {'$in': ['Доставлено']}, 'courier.name_key': {'$regex': '^ива'},
+                                'created_at': {'$lt': datetime(2025, 6, 1)},
+                                '_id': ObjectId('65a000000000000000000002')}, 'limit': 51}
+    assert shape_key(query_shape('find', other)) == shape_key(query_shape('find', FIND))
+    changed = {**FIND, 'filter': {'status': {'$nin': ['Доставлено']}}}
+    assert shape_key(query_shape('find', changed)) != shape_key(query_shape('find', FIND))
+
+def test_update_and_delete_shapes():
+    update = {'update': 'courier_deliveries', 'ordered': False,
+              'updates': [{'q': {'_id': 1, 'status': 'В пути'}, 'u': {'$set': {'status': 'Доставлено'}}},
+                          {'q': {'_id': 2, 'status': 'Обработка'}, 'u': {'$set': {'status': 'Доставлено'}}}]}
+    assert query_shape('update', update) == {'command': 'update', 'collection': 'courier_deliveries',
+                                             'updates': [{'_id': '?', 'status': '?'}] * 2}
+    delete = {'delete': 'courier_rollup', 'deletes': [{'q': {'count': {'$lte': 0}}, 'limit': 0}]}
+    assert query_shape('delete', delete)['deletes'] == [{'count': {'$lte': '?'}}]
+
+def test_explain_command_drops_service_fields():
+    assert explain_command('find', FIND) == {key: FIND[key] for key in ('find', 'filter', 'sort', 'projection', 'limit')}
+    assert explain_command('aggregate', AGGREGATE) == {'aggregate': 'qualification_courses',
+                                                       'pipeline': AGGREGATE['pipeline'], 'cursor': {}}
+
+def test_summarize_collscan():
+    explain = {
+        'queryPlanner': {'winningPlan': {
+            'stage': 'SORT', 'inputStage': {'stage': 'COLLSCAN', 'filter': {'status': {'$eq': 'В пути'}}}}},
+        'executionStats': {'nReturned': 20, 'totalDocsExamined': 100000, 'totalKeysExamined': 0,
+                           'executionTimeMillis': 85}
+    }
+    assert summarize_explain(explain) == {
+        'stages': ['SORT', 'COLLSCAN'],
+        'plan': 'COLLSCAN',
+        'collscan': True,
+        'docs_examined': 100000,
+        'keys_examined': 0,
+        'n_returned': 20,
+        'execution_ms': 85
+    }
+
+def test_summarize_ixscan():
+    explain = {
+        'queryPlanner': {'winningPlan': {'stage': 'LIMIT', 'inputStage': {
+            'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN', 'indexName': 'status_1_created_at_-1'}}}},
+        'executionStats': {'nReturned': 21, 'totalDocsExamined': 21, 'totalKeysExamined': 21,
+                           'executionTimeMillis': 1}
+    }
+    summary = summarize_explain(explain)
+    assert summary['stages'] == ['LIMIT', 'FETCH', 'IXSCAN status_1_created_at_-1']
+    assert summary['plan'] == 'IXSCAN status_1_created_at_-1'
+    assert not summary['collscan']
+    assert (summary['docs_examined'], summary['n_returned']) == (21, 21)
+
+def test_summarize_aggregate_with_cursor_stage_and_or_plan():
+    explain = {'stages': [
+        {'$cursor': {
+            'queryPlanner': {'winningPlan': {'stage': 'OR', 'inputStages': [
+                {'stage': 'IXSCAN', 'indexName': 'status_1'}, {'stage': 'COLLSCAN'}]}},
+            'executionStats': {'nReturned': 5, 'totalDocsExamined': 500, 'totalKeysExamined': 3}}},
+        {'$group': {'_id': '$status'}}
+    ]}
+    summary = summarize_explain(explain)
+    assert summary['plan'] == 'IXSCAN status_1, COLLSCAN'
+    assert summary['collscan']
+    assert (summary['docs_examined'], summary['keys_examined'], summary['n_returned']) == (500, 3, 5)
+    assert summary['execution_ms'] is None
+
+def test_summarize_sbe_and_sharded_plans():
+    sbe = {'queryPlanner': {'winningPlan': {'queryPlan': {'stage': 'IXSCAN', 'indexName': 'tracking_number_1'}}},
+           'executionStats': {'nReturned': 1, 'totalDocsExamined': 1}}
+    assert summarize_explain(sbe)['plan'] == 'IXSCAN tracking_number_1'
+    sharded = {'shards': {'shard0': {'queryPlanner': {'winningPlan': {'stage': 'COLLSCAN'}},
+                                     'executionStats': {'nReturned': 0, 'totalDocsExamined': 10}}}}
+    assert summarize_explain(sharded)['collscan']
+    assert summarize_explain({}) == {'stages': [], 'plan': '', 'collscan': False, 'docs_examined': None,
+                                     'keys_examined': None, 'n_returned': None, 'execution_ms': None}
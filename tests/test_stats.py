@@ -0,0 +1,127 @@
+from datetime import date, timedelta
+
+import pytest
+
+import services
+import stats
+from stats import COUNTERS, COURIER_ROLLUP, DEPARTMENT_ROLLUP
+
+def days(count):
+    return (date.today() + timedelta(days=count)).isoformat()
+
+def parcel_form(**fields):
+    """Данные формы посылки, проходящие проверку validation.py"""
+    form = {
+        'sender_name': 'Иванов Иван', 'sender_address': 'Москва', 'sender_passport_series': '1234',
+        'sender_passport_number': '567890', 'sender_birth_date': '1980-01-01', 'sender_gender': 'М',
+        'receiver_name': 'Петров Петр', 'receiver_address': 'Казань', 'receiver_passport_series': '4321',
+        'receiver_passport_number': '098765', 'receiver_birth_date': '1985-05-05', 'receiver_gender': 'М',
+        'weight': '2.5', 'length': '10', 'width': '20', 'height': '30',
+        'courier_name': 'Сидоров', 'courier_phone': '+79990000000',
+        'dispatch_date': days(1), 'delivery_date': days(5),
+        'status': 'В пути', 'delivery_cost': '300'
+    }
+    form.update(fields)
+    return form
+
+def course_form(**fields):
+    """Данные формы курса, проходящие проверку validation.py"""
+    form = {
+        'course_name': 'Python', 'teacher_name': 'Смирнов', 'teacher_department': 'ИТ',
+        'start_date': days(10), 'end_date': days(40), 'hours': '36', 'price': '15000',
+        'status': 'Набор', 'category': 'Программирование',
+        'employee_1_name': 'Козлов', 'employee_1_position': 'Инженер', 'employee_1_department': 'ИТ',
+        'employee_2_name': 'Орлова', 'employee_2_position': 'Аналитик', 'employee_2_department': 'Финансы'
+    }
+    form.update(fields)
+    return form
+
+def stored(db, name):
+    return {str(doc['_id']): doc for doc in db[name].find({'_id': {'$ne': 'meta'}})}
+
+def assert_consistent(db):
+    """Счетчики и сводки совпадают с полным пересчетом"""
+    assert stats.check_stats(db) == []
+    computed = stats.compute_stats(db)
+    for name in (COUNTERS, COURIER_ROLLUP, DEPARTMENT_ROLLUP):
+        # Сводки без документов (count = 0) удаляются, а не остаются с нулями
+        assert set(stored(db, name)) == {str(doc['_id']) for doc in computed[name]}
+
+@pytest.fixture
+def stats_db(db):
+    stats.ensure_stats(db)
+    return db
+
+def test_parcel_add_edit_delete(stats_db):
+    collection = stats_db['courier_deliveries']
+    first = services.create_parcel(collection, parcel_form())
+    services.create_parcel(collection, parcel_form(courier_name='Васильев', weight='1', status='Доставлено'))
+    assert_consistent(stats_db)
+    assert stored(stats_db, COUNTERS)['courier']['parcels_in_transit'] == 1
+
+    # Смена статуса, стоимости и курьера переносит вклад посылки между сводками
+    parcel = collection.find_one({'_id': first['_id']})
+    assert services.update_parcel(collection, parcel, parcel_form(status='Доставлено', delivery_cost='500'), 0)
+    assert_consistent(stats_db)
+    parcel = collection.find_one({'_id': first['_id']})
+    assert services.update_parcel(collection, parcel, parcel_form(status='Доставлено', delivery_cost='500',
+                                                                  courier_name='Васильев'), 1)
+    assert_consistent(stats_db)
+    assert set(stored(stats_db, COURIER_ROLLUP)) == {'Васильев'}
+
+    services.delete_parcel(collection, first['_id'])
+    assert_consistent(stats_db)
+    assert stored(stats_db, COURIER_ROLLUP)['Васильев']['count'] == 1
+
+def test_course_add_edit_delete(stats_db):
+    collection = stats_db['qualification_courses']
+    course = services.create_course(collection, course_form())
+    services.create_course(collection, course_form(course_name='SQL', employee_2_name=''))
+    assert_consistent(stats_db)
+
+    # Перевод сотрудника в другой отдел и изменение цены
+    saved = collection.find_one({'_id': course['_id']})
+    assert services.update_course(collection, saved, course_form(employee_2_department='ИТ', price='20000'), 0)
+    assert_consistent(stats_db)
+    departments = {(doc['_id']['department'], doc['_id']['course_name']): doc['employee_count']
+                   for doc in stats_db[DEPARTMENT_ROLLUP].find()}
+    assert departments == {('ИТ', 'Python'): 2, ('ИТ', 'SQL'): 1}
+
+    services.delete_course(collection, course['_id'])
+    assert_consistent(stats_db)
+
+def test_batch_changes(stats_db):
+    collection = stats_db['courier_deliveries']
+    parcels = [services.create_parcel(collection, parcel_form(courier_name=name))
+               for name in ('Сидоров', 'Сидоров', 'Васильев')]
+
+    # Пакет: два изменения одного курьера, удаление и новая посылка
+    changes = []
+    for parcel in parcels[:2]:
+        updated = {**parcel, 'status': 'Доставлено', 'courier': {**parcel['courier'], 'name': 'Алексеев'}}
+        collection.replace_one({'_id': parcel['_id']}, updated)
+        changes.append((parcel, updated))
+    collection.delete_one({'_id': parcels[2]['_id']})
+    changes.append((parcels[2], None))
+    added = {**parcels[2], '_id': 'new', 'tracking_number': 'NEW'}
+    collection.insert_one(added)
+    changes.append((None, added))
+    stats.apply_courier_changes(stats_db, changes)
+
+    assert_consistent(stats_db)
+    assert set(stored(stats_db, COURIER_ROLLUP)) == {'Алексеев', 'Васильев'}
+
+def test_check_stats_reports_drift(stats_db):
+    services.create_parcel(stats_db['courier_deliveries'], parcel_form())
+    assert stats.check_stats(stats_db) == []
+
+    stats_db[COUNTERS].update_one({'_id': 'courier'}, {'$inc': {'total_parcels': 1}})
+    stats_db[COURIER_ROLLUP].update_one({'_id': 'Сидоров'}, {'$set': {'total_cost': 0}})
+    assert sorted(stats.check_stats(stats_db)) == [
+        'courier_rollup Сидоров total_cost: сохранено 0, ожидается 300.0',
+        'stats_counters courier total_parcels: сохранено 2, ожидается 1'
+    ]
+
+    # Полный пересчет устраняет расхождения
+    stats.rebuild_stats(stats_db)
+    assert stats.check_stats(stats_db) == []
@@ -0,0 +1,80 @@
+from datetime import datetime
+
+import pytest
+
+import services
+import stats
+from status_updates import update_statuses, summarize, UPDATED, UNCHANGED, NOT_FOUND, DUPLICATE, CONFLICT
+from test_stats import parcel_form
+
+class ConcurrentCollection:
+    """Коллекция, в которой статус посылки меняется между чтением и bulk_write"""
+
+    def __init__(self, collection, parcel, status):
+        self._collection = collection
+        self.parcel = parcel
+        self.status = status
+
+    def __getattr__(self, attr):
+        return getattr(self._collection, attr)
+
+    def bulk_write(self, operations, **kwargs):
+        # Другой запрос успевает изменить статус и статистику
+        services.update_parcel(self._collection, self.parcel, parcel_form(status=self.status), 0)
+        return self._collection.bulk_write(operations, **kwargs)
+
+@pytest.fixture
+def collection(db):
+    stats.ensure_stats(db)
+    return db['courier_deliveries']
+
+@pytest.fixture
+def parcels(collection):
+    return [services.create_parcel(collection, parcel_form(courier_name=name))
+            for name in ('Сидоров', 'Васильев', 'Алексеев')]
+
+def results(items):
+    return [item['result'] for item in items]
+
+def test_update_results(collection, parcels):
+    collection.update_one({'_id': parcels[2]['_id']}, {'$set': {'status': 'Обработка'}})
+    stats.rebuild_stats(collection.database)
+    items = [parcels[0]['tracking_number'].lower(), str(parcels[0]['_id']), str(parcels[1]['_id']),
+             parcels[2]['tracking_number'], 'TRK-UNKNOWN']
+
+    updated = update_statuses(collection, items, 'Обработка')
+    assert results(updated) == [UPDATED, DUPLICATE, UPDATED, UNCHANGED, NOT_FOUND]
+    assert updated[0]['item'] == items[0] and updated[0]['id'] == str(parcels[0]['_id'])
+    assert updated[4] == {'item': 'TRK-UNKNOWN', 'result': NOT_FOUND}
+    assert summarize(updated) == {UPDATED: 2, DUPLICATE: 1, UNCHANGED: 1, NOT_FOUND: 1}
+
+    saved = collection.find_one({'_id': parcels[0]['_id']})
+    assert saved['status'] == 'Обработка'
+    assert saved['version'] == 1
+    assert saved['dates']['actual_delivery_date'] is None
+    # Статус посылки без изменений не перезаписывается
+    assert 'version' not in collection.find_one({'_id': parcels[2]['_id']})
+    assert stats.check_stats(collection.database) == []
+
+def test_delivered_sets_actual_delivery_date(collection, parcels):
+    update_statuses(collection, [parcels[0]['tracking_number']], 'Доставлено')
+    saved = collection.find_one({'_id': parcels[0]['_id']})
+    assert saved['dates']['actual_delivery_date'] == datetime.now().strftime('%Y-%m-%d')
+
+    # Уход из "Доставлено" сохраняет дату, повторная доставка ее не меняет
+    collection.update_one({'_id': parcels[0]['_id']}, {'$set': {'dates.actual_delivery_date': '2024-01-01'}})
+    update_statuses(collection, [parcels[0]['tracking_number']], 'В пункте выдачи')
+    update_statuses(collection, [parcels[0]['tracking_number']], 'В пункте выдачи')
+    assert collection.find_one({'_id': parcels[0]['_id']})['dates']['actual_delivery_date'] == '2024-01-01'
+    assert stats.check_stats(collection.database) == []
+
+def test_status_changed_after_read_is_a_conflict(collection, parcels):
+    concurrent = ConcurrentCollection(collection, parcels[0], 'Отменено')
+    updated = update_statuses(concurrent, [parcels[0]['tracking_number'], parcels[1]['tracking_number']],
+                              'Доставлено')
+    assert results(updated) == [CONFLICT, UPDATED]
+
+    # Статус другого запроса не перезаписан, а статистика учитывает только реальные изменения
+    assert collection.find_one({'_id': parcels[0]['_id']})['status'] == 'Отменено'
+    assert collection.find_one({'_id': parcels[1]['_id']})['status'] == 'Доставлено'
+    assert stats.check_stats(collection.database) == []
@@ -0,0 +1,91 @@
+import pytest
+
+from tracking import TrackingCache, normalize_tracking_number
+
+class CountingCollection:
+    """Коллекция, которая считает запросы; after_read выполняется сразу после чтения"""
+
+    def __init__(self, collection):
+        self._collection = collection
+        self.after_read = None
+        self.reads = 0
+
+    def find_one(self, *args, **kwargs):
+        self.reads += 1
+        document = self._collection.find_one(*args, **kwargs)
+        if self.after_read:
+            self.after_read()
+        return document
+
+@pytest.fixture
+def collection(db):
+    parcels = db['courier_deliveries']
+    parcels.insert_many([{'tracking_number': f'TRK2024010100000{i:03d}', 'status': 'В пути',
+                          'sender': {'passport': {'number': '123456'}}} for i in range(5)])
+    return CountingCollection(parcels)
+
+def test_normalize_tracking_number():
+    assert normalize_tracking_number(' trk20240101abcd1234 ') == 'TRK20240101ABCD1234'
+    assert normalize_tracking_number('TRK2024') is None
+    assert normalize_tracking_number(None) is None
+
+def test_cached_without_personal_data(collection):
+    cache = TrackingCache()
+    parcel = cache.get(collection, 'TRK2024010100000000')
+    assert parcel == {'tracking_number': 'TRK2024010100000000', 'status': 'В пути'}
+    assert cache.get(collection, 'TRK2024010100000000') == parcel
+    assert collection.reads == 1
+
+def test_missing_numbers_are_not_cached(collection):
+    cache = TrackingCache()
+    assert cache.get(collection, 'TRK2024010199999999') is None
+    assert cache.get(collection, 'TRK2024010199999999') is None
+    assert collection.reads == 2
+
+def test_lru_eviction(collection):
+    cache = TrackingCache(max_size=2)
+    cache.get(collection, 'TRK2024010100000000')
+    cache.get(collection, 'TRK2024010100000001')
+    # Обращение к первому номеру делает вытесняемым второй
+    cache.get(collection, 'TRK2024010100000000')
+    cache.get(collection, 'TRK2024010100000002')
+    assert collection.reads == 3
+
+    cache.get(collection, 'TRK2024010100000000')
+    assert collection.reads == 3
+    cache.get(collection, 'TRK2024010100000001')
+    assert collection.reads == 4
+
+def test_invalidate_after_update_and_delete(collection):
+    cache = TrackingCache()
+    cache.get(collection, 'TRK2024010100000000')
+    cache.get(collection, 'TRK2024010100000001')
+
+    collection._collection.update_one({'tracking_number': 'TRK2024010100000000'}, {'$set': {'status': 'Доставлено'}})
+    collection._collection.delete_one({'tracking_number': 'TRK2024010100000001'})
+    cache.invalidate('TRK2024010100000000', 'TRK2024010100000001', None)
+    assert cache.get(collection, 'TRK2024010100000000')['status'] == 'Доставлено'
+    assert cache.get(collection, 'TRK2024010100000001') is None
+    assert collection.reads == 4
+
+def test_invalidate_increments_generation():
+    cache = TrackingCache()
+    cache.invalidate()
+    cache.invalidate('TRK2024010100000000')
+    assert cache._generation == 2
+
+def test_update_during_read_is_not_cached(collection):
+    cache = TrackingCache()
+
+    def update():
+        # Посылку меняют и сбрасывают ее запись после чтения, но до сохранения в кэш
+        collection._collection.update_one({'tracking_number': 'TRK2024010100000000'},
+                                          {'$set': {'status': 'Доставлено'}})
+        cache.invalidate('TRK2024010100000000')
+    collection.after_read = update
+    assert cache.get(collection, 'TRK2024010100000000')['status'] == 'В пути'
+
+    # Прочитанное до изменения значение не сохранено
+    collection.after_read = None
+    assert cache.get(collection, 'TRK2024010100000000')['status'] == 'Доставлено'
+    assert collection.reads == 2
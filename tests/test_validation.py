@@ -0,0 +1,106 @@
+from datetime import date, timedelta
+
+import pytest
+
+from validation import validate_courier_data, validate_course_data, validate_courier_batch, validate_course_batch
+from test_stats import days, parcel_form, course_form
+
+def years_ago(count):
+    today = date.today()
+    return today.replace(year=today.year - count, day=min(today.day, 28)).isoformat()
+
+def form(build, fields):
+    """Форма с измененными полями (None - поле отсутствует)"""
+    data = build(**{field: value for field, value in fields.items() if value is not None})
+    for field, value in fields.items():
+        if value is None:
+            data.pop(field, None)
+    return data
+
+# Ожидаемые ошибки - те же, что у прежних проверок validate_*_data, написанных вручную
+PARCEL_CASES = [
+    ({}, []),
+    ({'weight': '1000', 'length': '500', 'delivery_cost': '1000000'}, []),
+    ({'weight': '0'}, ['❌ Вес должен быть больше 0 кг']),
+    ({'weight': '1000.5'}, ['❌ Вес не может превышать 1000 кг']),
+    ({'weight': 'abc'}, ['❌ Неверный формат веса']),
+    ({'weight': None}, ['❌ Вес должен быть больше 0 кг']),
+    ({'length': '-1'}, ['❌ Length должен быть больше 0 см']),
+    ({'width': '501'}, ['❌ Width не может превышать 500 см']),
+    ({'height': 'x'}, ['❌ Неверный формат height']),
+    ({'dispatch_date': days(-1)}, []),
+    ({'dispatch_date': days(-2)}, ['❌ Дата отправления не может быть в прошлом']),
+    ({'delivery_date': days(0)}, ['❌ Дата получения не может быть раньше даты отправления']),
+    ({'delivery_date': days(366)}, ['❌ Дата получения не может быть больше чем через год']),
+    ({'dispatch_date': '2024-13-01'}, ['❌ Неверный формат даты']),
+    ({'delivery_date': ''}, ['❌ Неверный формат даты']),
+    ({'delivery_cost': '-1'}, ['❌ Стоимость доставки не может быть отрицательной']),
+    ({'delivery_cost': '1000001'}, ['❌ Стоимость доставки слишком высокая']),
+    ({'delivery_cost': 'x'}, ['❌ Неверный формат стоимости доставки']),
+    ({'delivery_cost': None}, []),
+    ({'sender_passport_series': '123'}, ['❌ Серия паспорта sender должна содержать 4 цифры']),
+    ({'receiver_passport_number': '12345a'}, ['❌ Номер паспорта receiver должен содержать 6 цифр']),
+    ({'sender_birth_date': years_ago(10)}, ['❌ Возраст sender должен быть не менее 14 лет']),
+    ({'sender_birth_date': years_ago(121)}, ['❌ Некорректная дата рождения sender']),
+    ({'receiver_birth_date': days(1)}, ['❌ Возраст receiver должен быть не менее 14 лет',
+                                        '❌ Дата рождения receiver не может быть в будущем']),
+    ({'receiver_birth_date': '01.01.1990'}, ['❌ Неверный формат даты рождения receiver']),
+    ({'sender_gender': 'X'}, ['❌ Неверное значение пола sender. Допустимо: М или Ж']),
+    ({'courier_phone': '89991234567'}, []),
+    ({'courier_phone': '+7999'}, ['❌ Неверный формат телефона курьера']),
+    ({'sender_name': 'И'}, ['❌ Поле "sender_name" должно содержать минимум 2 символа']),
+    ({'receiver_name': 'Петров 2'}, ['❌ Неверный формат ФИО в поле "receiver_name"']),
+    ({'courier_name': ' '}, ['❌ Поле "courier_name" должно содержать минимум 2 символа']),
+    ({'sender_address': 'Ул.'}, ['❌ Адрес "sender_address" слишком короткий']),
+    ({'weight': '0', 'courier_phone': '', 'receiver_address': ''}, [
+        '❌ Вес должен быть больше 0 кг', '❌ Неверный формат телефона курьера',
+        '❌ Адрес "receiver_address" слишком короткий'])
+]
+
+COURSE_CASES = [
+    ({}, []),
+    ({'hours': '1000', 'price': '0', 'max_participants': '1000', 'teacher_email': 'a.b@mail.ru'}, []),
+    ({'course_name': 'Курс'}, ['❌ Название курса должно содержать минимум 5 символов']),
+    ({'hours': '0'}, ['❌ Количество часов должно быть больше 0']),
+    ({'hours': '1001'}, ['❌ Количество часов не может превышать 1000']),
+    ({'hours': '1.5'}, ['❌ Неверный формат количества часов']),
+    ({'start_date': days(-1)}, ['❌ Дата начала не может быть в прошлом']),
+    ({'end_date': days(9)}, ['❌ Дата окончания не может быть раньше даты начала']),
+    ({'end_date': days(376)}, ['❌ Длительность курса не может превышать 1 год']),
+    ({'registration_deadline': days(5)}, []),
+    ({'registration_deadline': days(11)}, ['❌ Дедлайн регистрации не может быть позже даты начала курса']),
+    ({'registration_deadline': 'скоро'}, ['❌ Неверный формат даты']),
+    ({'start_date': ''}, ['❌ Неверный формат даты']),
+    ({'teacher_name': 'С'}, ['❌ ФИО преподавателя должно содержать минимум 2 символа']),
+    ({'teacher_department': ''}, ['❌ Название отдела должно содержать минимум 2 символа']),
+    ({'price': '-1'}, ['❌ Цена не может быть отрицательной']),
+    ({'price': '1000001'}, ['❌ Цена слишком высокая']),
+    ({'price': 'x'}, ['❌ Неверный формат цены']),
+    ({'max_participants': '0'}, ['❌ Максимальное количество участников должно быть больше 0']),
+    ({'max_participants': '1001'}, ['❌ Максимальное количество участников не может превышать 1000']),
+    ({'max_participants': 'x'}, ['❌ Неверный формат максимального количества участников']),
+    ({'max_participants': None}, []),
+    ({'teacher_email': 'teacher@'}, ['❌ Неверный формат email преподавателя']),
+    ({'teacher_phone': '123'}, ['❌ Неверный формат телефона преподавателя']),
+    ({'employee_2_position': ''}, ['❌ Для сотрудника 2 указано ФИО, но не указана должность']),
+    ({'employee_2_name': ''}, ['❌ Для сотрудника 2 указана должность, но не указано ФИО']),
+    ({'employee_3_name': 'К', 'employee_3_position': 'И'}, ['❌ ФИО сотрудника 3 должно содержать минимум 2 символа',
+                                                           '❌ Должность сотрудника 3 должна содержать минимум 2 символа']),
+    ({'employee_1_email': 'kozlov'}, ['❌ Неверный формат email сотрудника 1']),
+    ({'employee_1_name': '', 'employee_1_position': '', 'employee_2_name': None, 'employee_2_position': None},
+     ['❌ Необходимо указать хотя бы одного сотрудника'])
+]
+
+@pytest.mark.parametrize('fields, errors', PARCEL_CASES)
+def test_parcel_rules(fields, errors):
+    assert validate_courier_data(form(parcel_form, fields)) == {'valid': not errors, 'errors': errors}
+
+@pytest.mark.parametrize('fields, errors', COURSE_CASES)
+def test_course_rules(fields, errors):
+    assert validate_course_data(form(course_form, fields)) == {'valid': not errors, 'errors': errors}
+
+def test_batch_matches_single_form():
+    parcels = [form(parcel_form, fields) for fields, errors in PARCEL_CASES]
+    courses = [form(course_form, fields) for fields, errors in COURSE_CASES]
+    assert validate_courier_batch(parcels) == [validate_courier_data(data) for data in parcels]
+    assert validate_course_batch(courses) == [validate_course_data(data) for data in courses]
@@ -0,0 +1,62 @@
+import re
+import threading
+from cache import MemoryBackend
+
+# Поля посылки, которые показываются при отслеживании по трек-номеру
+# (без паспортных данных и адресов)
+TRACKING_PROJECTION = {
+    '_id': 0,
+    'tracking_number': 1,
+    'status': 1,
+    'dates': 1,
+    'courier.name': 1,
+    'courier.company': 1,
+    'updated_at': 1
+}
+
+TRACKING_NUMBER_PATTERN = re.compile(r'^TRK\d{8}[A-Z0-9]{8}$')
+
+def normalize_tracking_number(value):
+    """Трек-номер в верхнем регистре или None, если строка не похожа на трек-номер"""
+    value = (value or '').strip().upper()
+    return value if TRACKING_NUMBER_PATTERN.match(value) else None
+
+def find_tracking(collection, tracking_number):
+    """Состояние посылки по трек-номеру: один запрос по уникальному индексу tracking_number"""
+    return collection.find_one({'tracking_number': tracking_number}, TRACKING_PROJECTION)
+
+class TrackingCache:
+    """Кэш состояния посылок по трек-номеру в памяти процесса (LRU с TTL).
+
+    Изменение и удаление посылки сбрасывают ее запись (invalidate). Кэш
+    у каждого процесса свой, поэтому запись, измененная через другой процесс,
+    обновится не позже чем через ttl секунд. Ненайденные трек-номера не
+    кэшируются.
+    """
+
+    def __init__(self, max_size=1024, ttl=30):
+        self.ttl = ttl
+        self.backend = MemoryBackend(max_size=max_size)
+        self._generation = 0
+        self._mutex = threading.Lock()
+
+    def get(self, collection, tracking_number):
+        """Состояние посылки из кэша или из MongoDB (None, если посылки нет)"""
+        value = self.backend.get(tracking_number)
+        if value is not None:
+            return value
+        generation = self._generation
+        value = find_tracking(collection, tracking_number)
+        with self._mutex:
+            # Посылку изменили во время чтения - прочитанное значение могло устареть
+            if value is not None and generation == self._generation:
+                self.backend.set(tracking_number, value, self.ttl)
+        return value
+
+    def invalidate(self, *tracking_numbers):
+        """Сброс записей посылок после изменения или удаления"""
+        with self._mutex:
+            self._generation += 1
+            for tracking_number in tracking_numbers:
+                if tracking_number:
+                    self.backend.delete(tracking_number)
@@ -1,243 +1,267 @@
-from datetime import datetime, date, timedelta
+from datetime import date, timedelta
+from functools import lru_cache
 import re
 
-def validate_courier_data(form_data):
-    """Валидация данных курьерской доставки"""
-    errors = []
-    
-    # Валидация веса
-    try:
-        weight = float(form_data.get('weight', 0))
-        if weight <= 0:
-            errors.append('❌ Вес должен быть больше 0 кг')
-        elif weight > 1000:
-            errors.append('❌ Вес не может превышать 1000 кг')
-    except ValueError:
-        errors.append('❌ Неверный формат веса')
-    
-    # Валидация габаритов
-    dimensions = ['length', 'width', 'height']
-    for dim in dimensions:
+# Правила проверки описываются таблицами (COURIER_SCHEMA, COURSE_SCHEMA).
+# Каждое правило - функция check(form_data, today, errors), созданная один раз
+# при импорте модуля: регулярные выражения скомпилированы заранее, а разбор
+# дат кэшируется. compile_schema собирает правила в функцию проверки формы.
+
+DATE_PATTERN = re.compile(r'^(\d{4})-(\d{1,2})-(\d{1,2})$')
+NAME_PATTERN = re.compile(r'^[А-Яа-яЁёA-Za-z\s\-\.]+$')
+PHONE_PATTERN = re.compile(r'^(\+7|8)\d{10}$')
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+PASSPORT_SERIES_PATTERN = re.compile(r'^\d{4}$')
+PASSPORT_NUMBER_PATTERN = re.compile(r'^\d{6}$')
+
+@lru_cache(maxsize=4096)
+def parse_date(value):
+    """Дата в формате ГГГГ-ММ-ДД (как datetime.strptime(value, '%Y-%m-%d').date())"""
+    match = DATE_PATTERN.fullmatch(value)
+    if not match:
+        raise ValueError(f'Неверный формат даты: {value}')
+    return date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+
+def get_text(form_data, field):
+    return (form_data.get(field) or '').strip()
+
+# ========== ПРАВИЛА ==========
+
+def number(field, convert, maximum, too_small, too_big, bad_format, default=0, positive=True):
+    """Число в диапазоне: больше 0 (positive) или не меньше 0 и не больше maximum"""
+    def check(form_data, today, errors):
         try:
-            value = float(form_data.get(dim, 0))
-            if value <= 0:
-                errors.append(f'❌ {dim.capitalize()} должен быть больше 0 см')
-            elif value > 500:
-                errors.append(f'❌ {dim.capitalize()} не может превышать 500 см')
-        except ValueError:
-            errors.append(f'❌ Неверный формат {dim}')
-    
-    # Валидация дат
-    try:
-        dispatch_date = datetime.strptime(form_data.get('dispatch_date', ''), '%Y-%m-%d').date()
-        delivery_date = datetime.strptime(form_data.get('delivery_date', ''), '%Y-%m-%d').date()
-        today = date.today()
-        
-        if dispatch_date < today - timedelta(days=1):
-            errors.append('❌ Дата отправления не может быть в прошлом')
-        if delivery_date < dispatch_date:
-            errors.append('❌ Дата получения не может быть раньше даты отправления')
-        if delivery_date > today + timedelta(days=365):
-            errors.append('❌ Дата получения не может быть больше чем через год')
-    except ValueError:
-        errors.append('❌ Неверный формат даты')
-    
-    # Валидация стоимости доставки
-    try:
-        delivery_cost = float(form_data.get('delivery_cost', 0))
-        if delivery_cost < 0:
-            errors.append('❌ Стоимость доставки не может быть отрицательной')
-        elif delivery_cost > 1000000:
-            errors.append('❌ Стоимость доставки слишком высокая')
-    except ValueError:
-        errors.append('❌ Неверный формат стоимости доставки')
-    
-    # Валидация паспортных данных отправителя
-    errors.extend(validate_passport_data(form_data, 'sender'))
-    
-    # Валидация паспортных данных получателя
-    errors.extend(validate_passport_data(form_data, 'receiver'))
-    
-    # Валидация телефона курьера
-    phone = form_data.get('courier_phone', '').strip()
-    if not validate_phone(phone):
-        errors.append('❌ Неверный формат телефона курьера')
-    
-    # Валидация ФИО
-    for field in ['sender_name', 'receiver_name', 'courier_name']:
-        name = form_data.get(field, '').strip()
-        if len(name) < 2:
-            errors.append(f'❌ Поле "{field}" должно содержать минимум 2 символа')
-        elif not re.match(r'^[А-Яа-яЁёA-Za-z\s\-\.]+$', name):
-            errors.append(f'❌ Неверный формат ФИО в поле "{field}"')
-    
-    # Валидация адресов
-    for field in ['sender_address', 'receiver_address']:
-        address = form_data.get(field, '').strip()
-        if len(address) < 5:
-            errors.append(f'❌ Адрес "{field}" слишком короткий')
-    
+            value = convert(form_data.get(field, default))
+        except (TypeError, ValueError):
+            errors.append(bad_format)
+            return
+        if value < 0 or (positive and value == 0):
+            errors.append(too_small)
+        elif value > maximum:
+            errors.append(too_big)
+    return check
+
+def text(field, min_length, too_short, pattern=None, bad_format=None):
+    """Строка не короче min_length символов, при pattern - подходящая под шаблон"""
+    def check(form_data, today, errors):
+        value = get_text(form_data, field)
+        if len(value) < min_length:
+            errors.append(too_short)
+        elif pattern is not None and not pattern.match(value):
+            errors.append(bad_format)
+    return check
+
+def matches(field, pattern, message, optional=False):
+    """Строка по шаблону (optional - пустое значение допустимо)"""
+    def check(form_data, today, errors):
+        value = get_text(form_data, field)
+        if (value or not optional) and not pattern.match(value):
+            errors.append(message)
+    return check
+
+def choice(field, values, message):
+    """Значение из списка допустимых"""
+    def check(form_data, today, errors):
+        if get_text(form_data, field) not in values:
+            errors.append(message)
+    return check
+
+def dates(fields, checks, bad_format, optional=None):
+    """Связанные даты: fields - обязательные поля, checks - [(условие ошибки, сообщение)].
+
+    Условие получает словарь разобранных дат и текущую дату. optional -
+    {поле: checks}: необязательные даты, проверяемые только если заполнены.
+    Ошибка формата любой даты прекращает проверку дат.
+    """
+    optional = optional or {}
+
+    def check(form_data, today, errors):
+        try:
+            values = {field: parse_date(form_data.get(field, '')) for field in fields}
+        except (TypeError, ValueError):
+            errors.append(bad_format)
+            return
+        for condition, message in checks:
+            if condition(values, today):
+                errors.append(message)
+        for field, field_checks in optional.items():
+            value = form_data.get(field)
+            if not value:
+                continue
+            try:
+                values[field] = parse_date(value)
+            except (TypeError, ValueError):
+                errors.append(bad_format)
+                return
+            for condition, message in field_checks:
+                if condition(values, today):
+                    errors.append(message)
+    return check
+
+def birth_date(field, too_young, too_old, in_future, bad_format):
+    """Дата рождения: возраст от 14 до 120 лет, не в будущем"""
+    def check(form_data, today, errors):
+        try:
+            value = parse_date(form_data.get(field, ''))
+        except (TypeError, ValueError):
+            errors.append(bad_format)
+            return
+        age = today.year - value.year - ((today.month, today.day) < (value.month, value.day))
+        if age < 14:
+            errors.append(too_young)
+        elif age > 120:
+            errors.append(too_old)
+        if value > today:
+            errors.append(in_future)
+    return check
+
+def passport(prefix):
+    """Паспортные данные отправителя или получателя"""
+    return [
+        matches(f'{prefix}_passport_series', PASSPORT_SERIES_PATTERN,
+                f'❌ Серия паспорта {prefix} должна содержать 4 цифры'),
+        matches(f'{prefix}_passport_number', PASSPORT_NUMBER_PATTERN,
+                f'❌ Номер паспорта {prefix} должен содержать 6 цифр'),
+        birth_date(f'{prefix}_birth_date',
+                   f'❌ Возраст {prefix} должен быть не менее 14 лет',
+                   f'❌ Некорректная дата рождения {prefix}',
+                   f'❌ Дата рождения {prefix} не может быть в будущем',
+                   f'❌ Неверный формат даты рождения {prefix}'),
+        choice(f'{prefix}_gender', ('М', 'Ж'), f'❌ Неверное значение пола {prefix}. Допустимо: М или Ж')
+    ]
+
+def employees(count):
+    """Сотрудники курса (заполняются парами ФИО и должность), хотя бы один"""
+    def check(form_data, today, errors):
+        employee_count = 0
+        for i in range(1, count + 1):
+            emp_name = get_text(form_data, f'employee_{i}_name')
+            emp_position = get_text(form_data, f'employee_{i}_position')
+
+            if emp_name and not emp_position:
+                errors.append(f'❌ Для сотрудника {i} указано ФИО, но не указана должность')
+            elif not emp_name and emp_position:
+                errors.append(f'❌ Для сотрудника {i} указана должность, но не указано ФИО')
+            elif emp_name and emp_position:
+                employee_count += 1
+                if len(emp_name) < 2:
+                    errors.append(f'❌ ФИО сотрудника {i} должно содержать минимум 2 символа')
+                if len(emp_position) < 2:
+                    errors.append(f'❌ Должность сотрудника {i} должна содержать минимум 2 символа')
+
+                emp_email = get_text(form_data, f'employee_{i}_email')
+                if emp_email and not EMAIL_PATTERN.match(emp_email):
+                    errors.append(f'❌ Неверный формат email сотрудника {i}')
+
+        if employee_count == 0:
+            errors.append('❌ Необходимо указать хотя бы одного сотрудника')
+    return check
+
+# ========== СХЕМЫ ==========
+
+COURIER_SCHEMA = [
+    number('weight', float, 1000, '❌ Вес должен быть больше 0 кг', '❌ Вес не может превышать 1000 кг',
+           '❌ Неверный формат веса'),
+    *[number(dim, float, 500, f'❌ {dim.capitalize()} должен быть больше 0 см',
+             f'❌ {dim.capitalize()} не может превышать 500 см', f'❌ Неверный формат {dim}')
+      for dim in ('length', 'width', 'height')],
+    dates(['dispatch_date', 'delivery_date'], [
+        (lambda d, today: d['dispatch_date'] < today - timedelta(days=1),
+         '❌ Дата отправления не может быть в прошлом'),
+        (lambda d, today: d['delivery_date'] < d['dispatch_date'],
+         '❌ Дата получения не может быть раньше даты отправления'),
+        (lambda d, today: d['delivery_date'] > today + timedelta(days=365),
+         '❌ Дата получения не может быть больше чем через год')
+    ], '❌ Неверный формат даты'),
+    number('delivery_cost', float, 1000000, '❌ Стоимость доставки не может быть отрицательной',
+           '❌ Стоимость доставки слишком высокая', '❌ Неверный формат стоимости доставки', positive=False),
+    *passport('sender'),
+    *passport('receiver'),
+    matches('courier_phone', PHONE_PATTERN, '❌ Неверный формат телефона курьера'),
+    *[text(field, 2, f'❌ Поле "{field}" должно содержать минимум 2 символа',
+           NAME_PATTERN, f'❌ Неверный формат ФИО в поле "{field}"')
+      for field in ('sender_name', 'receiver_name', 'courier_name')],
+    *[text(field, 5, f'❌ Адрес "{field}" слишком короткий') for field in ('sender_address', 'receiver_address')]
+]
+
+COURSE_SCHEMA = [
+    text('course_name', 5, '❌ Название курса должно содержать минимум 5 символов'),
+    number('hours', int, 1000, '❌ Количество часов должно быть больше 0',
+           '❌ Количество часов не может превышать 1000', '❌ Неверный формат количества часов'),
+    dates(['start_date', 'end_date'], [
+        (lambda d, today: d['start_date'] < today, '❌ Дата начала не может быть в прошлом'),
+        (lambda d, today: d['end_date'] < d['start_date'], '❌ Дата окончания не может быть раньше даты начала'),
+        (lambda d, today: (d['end_date'] - d['start_date']).days > 365,
+         '❌ Длительность курса не может превышать 1 год')
+    ], '❌ Неверный формат даты', optional={'registration_deadline': [
+        (lambda d, today: d['registration_deadline'] > d['start_date'],
+         '❌ Дедлайн регистрации не может быть позже даты начала курса')
+    ]}),
+    text('teacher_name', 2, '❌ ФИО преподавателя должно содержать минимум 2 символа'),
+    text('teacher_department', 2, '❌ Название отдела должно содержать минимум 2 символа'),
+    number('price', float, 1000000, '❌ Цена не может быть отрицательной', '❌ Цена слишком высокая',
+           '❌ Неверный формат цены', positive=False),
+    number('max_participants', int, 1000, '❌ Максимальное количество участников должно быть больше 0',
+           '❌ Максимальное количество участников не может превышать 1000',
+           '❌ Неверный формат максимального количества участников', default=30),
+    matches('teacher_email', EMAIL_PATTERN, '❌ Неверный формат email преподавателя', optional=True),
+    matches('teacher_phone', PHONE_PATTERN, '❌ Неверный формат телефона преподавателя', optional=True),
+    employees(3)
+]
+
+def compile_schema(schema):
+    """Функция проверки формы по схеме: (form_data, today) -> список ошибок"""
+    rules = tuple(schema)
+
+    def validate(form_data, today):
+        errors = []
+        for rule in rules:
+            rule(form_data, today, errors)
+        return errors
+    return validate
+
+courier_validator = compile_schema(COURIER_SCHEMA)
+course_validator = compile_schema(COURSE_SCHEMA)
+
+def result(errors):
     return {
         'valid': len(errors) == 0,
         'errors': errors
     }
 
-def validate_passport_data(form_data, prefix):
-    """Валидация паспортных данных"""
-    errors = []
-    
-    # Серия паспорта (4 цифры)
-    series = form_data.get(f'{prefix}_passport_series', '').strip()
-    if not re.match(r'^\d{4}$', series):
-        errors.append(f'❌ Серия паспорта {prefix} должна содержать 4 цифры')
-    
-    # Номер паспорта (6 цифр)
-    number = form_data.get(f'{prefix}_passport_number', '').strip()
-    if not re.match(r'^\d{6}$', number):
-        errors.append(f'❌ Номер паспорта {prefix} должен содержать 6 цифр')
-    
-    # Дата рождения
-    try:
-        birth_date = datetime.strptime(form_data.get(f'{prefix}_birth_date', ''), '%Y-%m-%d').date()
-        today = date.today()
-        age = today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
-        
-        if age < 14:
-            errors.append(f'❌ Возраст {prefix} должен быть не менее 14 лет')
-        elif age > 120:
-            errors.append(f'❌ Некорректная дата рождения {prefix}')
-        
-        # Проверка что дата рождения не в будущем
-        if birth_date > today:
-            errors.append(f'❌ Дата рождения {prefix} не может быть в будущем')
-    except ValueError:
-        errors.append(f'❌ Неверный формат даты рождения {prefix}')
-    
-    # Пол
-    gender = form_data.get(f'{prefix}_gender', '').strip()
-    if gender not in ['М', 'Ж']:
-        errors.append(f'❌ Неверное значение пола {prefix}. Допустимо: М или Ж')
-    
-    return errors
+# ========== ПРОВЕРКА ФОРМ ==========
+
+def validate_courier_data(form_data):
+    """Валидация данных курьерской доставки"""
+    return result(courier_validator(form_data, date.today()))
 
 def validate_course_data(form_data):
     """Валидация данных курсов повышения квалификации"""
+    return result(course_validator(form_data, date.today()))
+
+def validate_courier_batch(rows):
+    """Валидация списка форм посылок одним вызовом (результаты в том же порядке)"""
+    today = date.today()
+    return [result(courier_validator(form_data, today)) for form_data in rows]
+
+def validate_course_batch(rows):
+    """Валидация списка форм курсов одним вызовом (результаты в том же порядке)"""
+    today = date.today()
+    return [result(course_validator(form_data, today)) for form_data in rows]
+
+def validate_passport_data(form_data, prefix):
+    """Валидация паспортных данных"""
     errors = []
-    
-    # Валидация названия курса
-    course_name = form_data.get('course_name', '').strip()
-    if len(course_name) < 5:
-        errors.append('❌ Название курса должно содержать минимум 5 символов')
-    
-    # Валидация количества часов
-    try:
-        hours = int(form_data.get('hours', 0))
-        if hours <= 0:
-            errors.append('❌ Количество часов должно быть больше 0')
-        elif hours > 1000:
-            errors.append('❌ Количество часов не может превышать 1000')
-    except ValueError:
-        errors.append('❌ Неверный формат количества часов')
-    
-    # Валидация дат
-    try:
-        start_date = datetime.strptime(form_data.get('start_date', ''), '%Y-%m-%d').date()
-        end_date = datetime.strptime(form_data.get('end_date', ''), '%Y-%m-%d').date()
-        today = date.today()
-        
-        if start_date < today:
-            errors.append('❌ Дата начала не может быть в прошлом')
-        if end_date < start_date:
-            errors.append('❌ Дата окончания не может быть раньше даты начала')
-        if (end_date - start_date).days > 365:
-            errors.append('❌ Длительность курса не может превышать 1 год')
-        
-        # Проверка дедлайна регистрации
-        reg_deadline = form_data.get('registration_deadline')
-        if reg_deadline:
-            reg_date = datetime.strptime(reg_deadline, '%Y-%m-%d').date()
-            if reg_date > start_date:
-                errors.append('❌ Дедлайн регистрации не может быть позже даты начала курса')
-    except ValueError:
-        errors.append('❌ Неверный формат даты')
-    
-    # Валидация преподавателя
-    teacher_name = form_data.get('teacher_name', '').strip()
-    if len(teacher_name) < 2:
-        errors.append('❌ ФИО преподавателя должно содержать минимум 2 символа')
-    
-    # Валидация отдела преподавателя
-    teacher_department = form_data.get('teacher_department', '').strip()
-    if len(teacher_department) < 2:
-        errors.append('❌ Название отдела должно содержать минимум 2 символа')
-    
-    # Валидация цены
-    try:
-        price = float(form_data.get('price', 0))
-        if price < 0:
-            errors.append('❌ Цена не может быть отрицательной')
-        elif price > 1000000:
-            errors.append('❌ Цена слишком высокая')
-    except ValueError:
-        errors.append('❌ Неверный формат цены')
-    
-    # Валидация максимального количества участников
-    try:
-        max_participants = int(form_data.get('max_participants', 30))
-        if max_participants <= 0:
-            errors.append('❌ Максимальное количество участников должно быть больше 0')
-        elif max_participants > 1000:
-            errors.append('❌ Максимальное количество участников не может превышать 1000')
-    except ValueError:
-        errors.append('❌ Неверный формат максимального количества участников')
-    
-    # Валидация email преподавателя
-    teacher_email = form_data.get('teacher_email', '').strip()
-    if teacher_email and not validate_email(teacher_email):
-        errors.append('❌ Неверный формат email преподавателя')
-    
-    # Валидация телефона преподавателя
-    teacher_phone = form_data.get('teacher_phone', '').strip()
-    if teacher_phone and not validate_phone(teacher_phone):
-        errors.append('❌ Неверный формат телефона преподавателя')
-    
-    # Валидация сотрудников
-    employee_count = 0
-    for i in range(1, 4):
-        emp_name = form_data.get(f'employee_{i}_name', '').strip()
-        emp_position = form_data.get(f'employee_{i}_position', '').strip()
-        
-        if emp_name and not emp_position:
-            errors.append(f'❌ Для сотрудника {i} указано ФИО, но не указана должность')
-        elif not emp_name and emp_position:
-            errors.append(f'❌ Для сотрудника {i} указана должность, но не указано ФИО')
-        elif emp_name and emp_position:
-            employee_count += 1
-            if len(emp_name) < 2:
-                errors.append(f'❌ ФИО сотрудника {i} должно содержать минимум 2 символа')
-            if len(emp_position) < 2:
-                errors.append(f'❌ Должность сотрудника {i} должна содержать минимум 2 символа')
-            
-            # Валидация email сотрудника
-            emp_email = form_data.get(f'employee_{i}_email', '').strip()
-            if emp_email and not validate_email(emp_email):
-                errors.append(f'❌ Неверный формат email сотрудника {i}')
-    
-    if employee_count == 0:
-        errors.append('❌ Необходимо указать хотя бы одного сотрудника')
-    
-    return {
-        'valid': len(errors) == 0,
-        'errors': errors
-    }
+    today = date.today()
+    for rule in passport(prefix):
+        rule(form_data, today, errors)
+    return errors
 
 def validate_phone(phone):
     """Валидация номера телефона"""
     # Российские номера: +7XXXXXXXXXX или 8XXXXXXXXXX
-    pattern = r'^(\+7|8)\d{10}$'
-    return bool(re.match(pattern, phone))
+    return bool(PHONE_PATTERN.match(phone))
 
 def validate_email(email):
     """Валидация email"""
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return bool(re.match(pattern, email))
\ No newline at end of file
+    return bool(EMAIL_PATTERN.match(email))